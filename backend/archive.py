@@ -0,0 +1,187 @@
+"""Hot/cold tiering: old applications and those of closed forms leave the hot tables.
+
+Run through ``python manage.py archive [--dry-run]`` (e.g. nightly from cron).
+An archived application keeps its id and moves to ``archived_applications``
+with its answers compressed (see compression.py); its file references move to
+``archived_application_files`` and files no hot application uses anymore to
+the cold upload directory. Its searchable answers and finished jobs are
+dropped, so ``applications`` and its indexes only hold live campaigns.
+
+Single-application reads, listing, status changes, deletes, exports and file
+bundles cover both tiers; filters, full-text and CV search and the batch
+endpoints only see hot applications. Form statistics count both.
+"""
+import datetime
+import os
+from typing import Dict, NamedTuple, Optional
+
+import orjson
+from sqlalchemy import LargeBinary, String, delete, exists, func, insert, null, or_, select, type_coerce, union_all
+
+from blobs import move_to_cold
+from compression import compress, decompress
+from database import AsyncSessionLocal
+from models import (
+    Application, ApplicationFile, ArchivedApplication, ArchivedApplicationFile, Blob, Form, Job,
+)
+from pagination import keyset_page
+from search import delete_answers
+from serialization import raw_json
+
+# Applications older than this are archived (0 keeps them hot whatever their age)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 0))
+# Applications of forms closed for this long are archived whatever their age
+ARCHIVE_CLOSED_AFTER_DAYS = int(os.getenv("ARCHIVE_CLOSED_AFTER_DAYS", 30))
+ARCHIVE_BATCH_SIZE = 500
+
+
+class ArchivedRow(NamedTuple):
+    """An archived application in the column order of ``APPLICATION_COLUMNS``, for ``json_page``."""
+    id: int
+    form_id: int
+    form_data: str  # JSON text
+    status: str
+    created_at: datetime.datetime
+
+
+class TieredRow(NamedTuple):
+    id: int
+    created_at: datetime.datetime
+    form_data: dict
+
+
+def decode_tiered(rows) -> list:
+    """Rows of ``tiered_applications`` with the answers of archived ones decompressed into ``form_data``."""
+    return [
+        row if row.codec is None else TieredRow(row.id, row.created_at, orjson.loads(decompress(row.codec, row.data)))
+        for row in rows
+    ]
+
+
+def tiered_applications(form_id: int, application_ids=None):
+    """``(id, created_at, form_data, codec, data)`` of a form's hot and archived applications, oldest first.
+
+    Both sides are read in ``(form_id, created_at, id)`` index order and merged
+    by the database. ``form_data`` is set for hot rows, ``codec`` and ``data``
+    for archived ones: pass batches through ``decode_tiered``.
+    """
+    hot = select(
+        Application.id, Application.created_at, Application.form_data,
+        type_coerce(null(), String).label("codec"), type_coerce(null(), LargeBinary).label("data"),
+    ).where(Application.form_id == form_id)
+    cold = select(
+        ArchivedApplication.id, ArchivedApplication.created_at, null(), ArchivedApplication.codec,
+        ArchivedApplication.data,
+    ).where(ArchivedApplication.form_id == form_id)
+    if application_ids:
+        hot = hot.where(Application.id.in_(application_ids))
+        cold = cold.where(ArchivedApplication.id.in_(application_ids))
+    statement = union_all(hot, cold)
+    return statement.order_by(statement.selected_columns.created_at, statement.selected_columns.id)
+
+
+async def archived_page(db, form_id: int, limit: int, cursor=None, created_after=None, created_before=None):
+    """One keyset page of a form's archived applications as ``ArchivedRow``, with the look-ahead row."""
+    statement = keyset_page(
+        select(ArchivedApplication).where(ArchivedApplication.form_id == form_id),
+        ArchivedApplication, limit, cursor, created_after, created_before
+    )
+    return [
+        ArchivedRow(archived.id, archived.form_id, decompress(archived.codec, archived.data).decode(),
+                    archived.status, archived.created_at)
+        for archived in await db.scalars(statement)
+    ]
+
+
+def merge_pages(hot, cold, limit: int):
+    """The first ``limit + 1`` rows of two keyset pages, in ``(created_at, id)`` order."""
+    if not cold:
+        return hot
+    return sorted([*hot, *cold], key=lambda row: (row.created_at, row.id))[:limit + 1]
+
+
+async def find_archived(db, application_id: int, owner_id: int) -> Optional[ArchivedApplication]:
+    return await db.scalar(
+        select(ArchivedApplication)
+        .join(Form, Form.id == ArchivedApplication.form_id)
+        .where(ArchivedApplication.id == application_id, Form.creator_id == owner_id)
+    )
+
+
+def archivable(now: datetime.datetime, older_than_days: int = ARCHIVE_AFTER_DAYS,
+               closed_after_days: int = ARCHIVE_CLOSED_AFTER_DAYS, form_id: Optional[int] = None):
+    """Filter on ``Application`` selecting what the policy moves to the archive.
+
+    With ``form_id``, every application of that form, whatever the policy.
+    """
+    if form_id is not None:
+        conditions = [Application.form_id == form_id]
+    else:
+        closed = select(Form.id).where(Form.closed_at < now - datetime.timedelta(days=closed_after_days))
+        policy = [Application.form_id.in_(closed)]
+        if older_than_days > 0:
+            policy.append(Application.created_at < now - datetime.timedelta(days=older_than_days))
+        conditions = [or_(*policy)]
+    return (
+        *conditions,
+        # Their jobs still need the application; it goes with a later run
+        ~exists().where(Job.application_id == Application.id, Job.status.in_(("queued", "running"))),
+    )
+
+
+async def archive_applications(db, application_ids) -> list:
+    """Move applications to the archive in the caller's transaction; returns the blob ids they referenced."""
+    rows = (await db.execute(
+        select(Application.id, Application.form_id, raw_json(Application.form_data), Application.status,
+               Application.created_at)
+        .where(Application.id.in_(application_ids))
+    )).all()
+    archived = []
+    for row in rows:
+        # The stored JSON text is compressed as-is; drivers decoding JSON columns hand back objects
+        raw = row.form_data.encode() if isinstance(row.form_data, str) else orjson.dumps(row.form_data)
+        codec, data = compress(raw)
+        archived.append({"id": row.id, "form_id": row.form_id, "data": data, "codec": codec,
+                         "status": row.status, "created_at": row.created_at})
+    if not archived:
+        return []
+    await db.execute(insert(ArchivedApplication), archived)
+    selected = ApplicationFile.application_id.in_(application_ids)
+    await db.execute(insert(ArchivedApplicationFile).from_select(
+        ["application_id", "field_id", "blob_id", "filename"],
+        select(ApplicationFile.application_id, ApplicationFile.field_id, ApplicationFile.blob_id,
+               ApplicationFile.filename).where(selected),
+    ))
+    blob_ids = (await db.scalars(select(ApplicationFile.blob_id).where(selected).distinct())).all()
+    # Refcounts are unchanged: the references moved, they were not dropped
+    await db.execute(delete(ApplicationFile).where(selected))
+    await db.execute(delete_answers(application_ids))
+    await db.execute(delete(Job).where(Job.application_id.in_(application_ids)))
+    await db.execute(delete(Application).where(Application.id.in_(application_ids)))
+    return blob_ids
+
+
+async def archive(dry_run: bool = False, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                  closed_after_days: int = ARCHIVE_CLOSED_AFTER_DAYS, form_id: Optional[int] = None) -> Dict[str, int]:
+    """Archive what the policy selects, in batches; counts of what was (or would be) moved."""
+    criteria = archivable(datetime.datetime.utcnow(), older_than_days, closed_after_days, form_id)
+    report = {"applications": 0, "cold_files": 0}
+    async with AsyncSessionLocal() as db:
+        if dry_run:
+            report["applications"] = await db.scalar(select(func.count()).select_from(Application).where(*criteria))
+            return report
+        while True:
+            ids = (await db.scalars(
+                select(Application.id).where(*criteria).order_by(Application.id).limit(ARCHIVE_BATCH_SIZE)
+            )).all()
+            if not ids:
+                break
+            blob_ids = await archive_applications(db, ids)
+            await db.commit()
+            report["applications"] += len(ids)
+            # Files only archived applications reference anymore go to cold storage
+            cold = (await db.scalars(
+                select(Blob.id).where(Blob.id.in_(blob_ids), ~exists().where(ApplicationFile.blob_id == Blob.id))
+            )).all()
+            report["cold_files"] += move_to_cold(cold)
+    return report
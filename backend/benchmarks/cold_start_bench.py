@@ -0,0 +1,72 @@
+"""Benchmark: cold start of one API worker, from a fresh interpreter to ready.
+
+    python benchmarks/cold_start_bench.py [--runs 5]
+
+Each run starts a new interpreter against a throw-away SQLite database that
+``manage.py migrate`` prepared once, imports ``main`` and runs its lifespan
+startup, the way every uvicorn worker does. Reported per phase:
+
+* ``interpreter``: process start until ``main`` starts importing
+* ``import``: importing the app (routers, models, middleware)
+* ``warmup``: the lifespan hook (pool, schema version check, registry, job worker)
+* ``total``: process start until it exited again
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, sys, time
+launched = float(sys.argv[1])
+sys.path.insert(0, sys.argv[2])
+import main
+
+async def start():
+    async with main.lifespan(main.app):
+        pass
+
+asyncio.run(start())
+print(json.dumps({
+    "interpreter": main.IMPORT_STARTED_WALL - launched,
+    "import": main.startup_timings["import_seconds"],
+    "warmup": main.startup_timings["warmup_seconds"],
+}))
+"""
+
+
+def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="cold-start-bench-"))
+    os.makedirs("static", exist_ok=True)
+    env = dict(os.environ, DATABASE_URL="sqlite:///./bench.db", PYTHONPATH=BACKEND_DIR)
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "manage.py"), "migrate"], env=env, check=True,
+                   capture_output=True)
+    runs = []
+    for _ in range(args.runs):
+        launched = time.time()
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD, str(launched), BACKEND_DIR],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        timings["total"] = time.time() - launched
+        runs.append(timings)
+    print(json.dumps({
+        "runs": args.runs,
+        **{
+            phase: round(statistics.median(run[phase] for run in runs), 3)
+            for phase in ("interpreter", "import", "warmup", "total")
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    main(parser.parse_args())
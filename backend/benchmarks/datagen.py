@@ -0,0 +1,283 @@
+"""Synthetic data for benchmarks: users, varied forms, applications and fake PDFs.
+
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/datagen.py \\
+        [--users 20] [--forms 100] [--applications 100000] [--pdfs 200] [--days 365] [--seed 1]
+
+Run from the directory the API will run in (uploads go to ``./static``). The
+schema is migrated first, rows are bulk inserted in batches (a million
+applications take minutes, not hours) and the answers index, blob refcounts
+and statistics counters are filled in as the API would have. The same seed
+always produces the same data.
+
+Writes ``fixtures.json`` to the current directory with what load tests need: the
+users' password, every form with its owner and field config, and a sample of
+application ids per form.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZE = 5000
+PASSWORD = "benchmark-password"
+SAMPLE_SIZE = 1000
+
+FIRST_NAMES = ["Amina", "Youssef", "Sara", "Omar", "Lina", "Karim", "Nora", "Adam", "Ines", "Mehdi", "Hana", "Ali"]
+LAST_NAMES = ["Benali", "Haddad", "Smith", "Garcia", "Chen", "Kumar", "Rossi", "Dubois", "Novak", "Silva"]
+SKILLS = [
+    "python", "fastapi", "sqlalchemy", "react", "typescript", "postgresql", "docker", "kubernetes", "aws",
+    "machine learning", "data analysis", "project management", "communication", "leadership", "java", "go",
+]
+DOMAINS = ["example.com", "mail.test", "inbox.test", "corp.example"]
+
+
+# Field templates: (field_id, type name, label, options)
+FIELD_TEMPLATES = [
+    ("full_name", "Text", "Full name", None),
+    ("email", "Email", "Email", None),
+    ("phone", "Text", "Phone", None),
+    ("city", "Text", "City", None),
+    ("level", "Select", "Seniority", ["intern", "junior", "mid", "senior", "lead"]),
+    ("contract", "Select", "Contract", ["full-time", "part-time", "freelance"]),
+    ("remote", "Select", "Remote", ["yes", "no", "hybrid"]),
+    ("years", "Text", "Years of experience", None),
+    ("motivation", "LargeText", "Motivation", None),
+    ("cover_letter", "LargeText", "Cover letter", None),
+    ("cv", "PDF", "CV", None),
+    ("portfolio", "PDF", "Portfolio", None),
+]
+
+
+def fake_pdf(rng: random.Random, index: int, size: int) -> bytes:
+    """A small valid one-page PDF with CV-like text, padded to about ``size`` bytes."""
+    words = " ".join(rng.choice(SKILLS) for _ in range(40))
+    text = f"Curriculum vitae {index} {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {words}"
+    content = f"BT /F1 10 Tf 40 800 Td ({text}) Tj ET".encode()
+    padding = rng.randbytes(max(0, size - len(content) - 600))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(padding), padding),
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def field_config_for(rng: random.Random, type_ids: dict) -> list:
+    required = FIELD_TEMPLATES[:2] + [FIELD_TEMPLATES[10]]
+    optional = [template for template in FIELD_TEMPLATES if template not in required]
+    chosen = required + rng.sample(optional, rng.randint(1, len(optional)))
+    return [
+        {
+            "field_id": field_id,
+            "field_type_id": type_ids[type_name],
+            "label": label,
+            "required": field_id in ("full_name", "email", "cv"),
+            "options": options,
+        }
+        for field_id, type_name, label, options in sorted(chosen, key=FIELD_TEMPLATES.index)
+    ]
+
+
+def answer_for(rng: random.Random, field: dict, type_names: dict, pdf_ids: list):
+    """An answer as the API stores it; PDF fields get a blob reference."""
+    field_id, type_name = field["field_id"], type_names[field["field_type_id"]]
+    if type_name == "PDF":
+        from blobs import blob_ref
+
+        return [blob_ref(rng.choice(pdf_ids))]
+    if type_name == "Select":
+        return rng.choice(field["options"])
+    if type_name == "Email":
+        return f"{rng.choice(FIRST_NAMES).lower()}.{rng.randint(1, 99999)}@{rng.choice(DOMAINS)}"
+    if type_name == "LargeText":
+        return " ".join(rng.choice(SKILLS) for _ in range(rng.randint(30, 200)))
+    if field_id == "full_name":
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    if field_id == "phone":
+        return f"+212 6{rng.randint(10000000, 99999999)}"
+    if field_id == "years":
+        return str(rng.randint(0, 25))
+    return rng.choice(["Casablanca", "Rabat", "Paris", "Berlin", "Lisbon", "Remote"])
+
+
+def write_pdfs(rng: random.Random, count: int, size: int) -> list:
+    from blobs import blob_path
+
+    blob_ids = []
+    for index in range(count):
+        content = fake_pdf(rng, index, size)
+        blob_id = hashlib.sha256(content).hexdigest()
+        path = blob_path(blob_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content)
+        blob_ids.append((blob_id, len(content)))
+    return blob_ids
+
+
+def generate(args) -> dict:
+    from collections import Counter
+
+    from sqlalchemy import insert, select
+
+    from database import SessionLocal, engine
+    from migrations import migrate
+    from models import Application, ApplicationAnswer, ApplicationFile, Blob, FieldType, Form, User
+    from passwords import get_password_hash
+    from registry import field_type_registry
+    from search import answer_rows
+    from stats import rebuild_form_stats
+    from validation import FormValidator
+
+    started = time.perf_counter()
+    rng = random.Random(args.seed)
+    migrate(engine)
+    with SessionLocal() as db:
+        type_ids = {name: id for id, name in db.execute(select(FieldType.id, FieldType.name)).all()}
+        field_type_registry.load(db)
+    type_names = {id: name for name, id in type_ids.items()}
+
+    pdfs = write_pdfs(rng, args.pdfs, args.pdf_size)
+    pdf_ids = [blob_id for blob_id, _ in pdfs]
+    now = datetime.datetime.utcnow()
+    hashed = get_password_hash(PASSWORD)
+
+    with engine.begin() as connection:
+        first_user = (connection.scalar(select(User.id).order_by(User.id.desc()).limit(1)) or 0) + 1
+        users = [
+            {"id": first_user + index, "username": f"bench{args.seed}_{index}",
+             "email": f"bench{args.seed}_{index}@example.com", "hashed_password": hashed, "is_active": True,
+             "created_at": now}
+            for index in range(args.users)
+        ]
+        connection.execute(insert(User), users)
+
+        taken = set(connection.scalars(select(Form.id)))
+        forms = []
+        while len(forms) < args.forms:
+            form_id = rng.randint(100000, 999999)
+            if form_id in taken:
+                continue
+            taken.add(form_id)
+            forms.append({
+                "id": form_id,
+                "title": f"Campaign {len(forms)}",
+                "description": "Synthetic hiring campaign",
+                "field_config": field_config_for(rng, type_ids),
+                "creator_id": rng.choice(users)["id"],
+                "created_at": now - datetime.timedelta(days=args.days),
+            })
+        connection.execute(insert(Form), forms)
+        first_application = (connection.scalar(select(Application.id).order_by(Application.id.desc()).limit(1)) or 0) + 1
+
+    # Campaign sizes follow a long tail: a few forms get most applications
+    weights = [1 / (rank + 1) for rank in range(len(forms))]
+    references = Counter()
+    samples = {form["id"]: [] for form in forms}
+    next_id = first_application
+    remaining = args.applications
+    while remaining > 0:
+        batch = min(BATCH_SIZE, remaining)
+        applications, answers, files = [], [], []
+        for form in rng.choices(forms, weights, k=batch):
+            form_data = {field["field_id"]: answer_for(rng, field, type_names, pdf_ids) for field in form["field_config"]}
+            created_at = now - datetime.timedelta(seconds=rng.randint(0, args.days * 86400))
+            applications.append({
+                "id": next_id, "form_id": form["id"], "form_data": form_data,
+                "status": rng.choice(["pending", "pending", "pending", "reviewed", "accepted", "rejected"]),
+                "created_at": created_at,
+            })
+            if not args.skip_answers:
+                answers.extend(answer_rows(next_id, form["id"], form_data, form["field_config"]))
+            for field_id, value in form_data.items():
+                if isinstance(value, list):
+                    blob_id = value[0].split(":", 1)[1]
+                    references[blob_id] += 1
+                    files.append({"application_id": next_id, "field_id": field_id, "blob_id": blob_id,
+                                  "filename": f"{field_id}.pdf"})
+            sample = samples[form["id"]]
+            if len(sample) < SAMPLE_SIZE:
+                sample.append(next_id)
+            next_id += 1
+        with engine.begin() as connection:
+            connection.execute(insert(Application), applications)
+            if answers:
+                connection.execute(insert(ApplicationAnswer), answers)
+            if files:
+                connection.execute(insert(ApplicationFile), files)
+        remaining -= batch
+        print(f"\r{args.applications - remaining}/{args.applications} applications", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    sizes = dict(pdfs)
+    with engine.begin() as connection:
+        connection.execute(insert(Blob), [
+            {"id": blob_id, "size": sizes[blob_id], "content_type": "application/pdf", "refcount": count,
+             "created_at": now}
+            for blob_id, count in references.items()
+        ])
+    with SessionLocal() as db:
+        for form in forms:
+            option_fields = FormValidator(form["field_config"], field_type_registry.by_id).option_fields
+            rebuild_form_stats(db, form["id"], option_fields)
+        db.commit()
+
+    fixtures = {
+        "seed": args.seed,
+        "password": PASSWORD,
+        "field_types": type_ids,
+        "users": [{"id": user["id"], "username": user["username"]} for user in users],
+        "forms": [
+            {"id": form["id"], "creator_id": form["creator_id"], "field_config": form["field_config"],
+             "applications": samples[form["id"]]}
+            for form in forms
+        ],
+        "applications": args.applications,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    with open("fixtures.json", "w") as file:
+        json.dump(fixtures, file)
+    return fixtures
+
+
+def main(args):
+    sys.path.insert(0, BACKEND_DIR)
+    os.makedirs("static", exist_ok=True)
+    fixtures = generate(args)
+    print(json.dumps({key: fixtures[key] for key in ("seed", "applications", "seconds")}
+                     | {"users": len(fixtures["users"]), "forms": len(fixtures["forms"])}))
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--forms", type=int, default=100)
+    parser.add_argument("--applications", type=int, default=100000)
+    parser.add_argument("--pdfs", type=int, default=200, help="distinct fake PDFs shared by all applications")
+    parser.add_argument("--pdf-size", type=int, default=100 * 1024, help="approximate bytes per fake PDF")
+    parser.add_argument("--days", type=int, default=365, help="spread creation dates over this many days")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-answers", action="store_true", help="don't fill the searchable answers index")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    main(parser.parse_args())
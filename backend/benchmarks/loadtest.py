@@ -0,0 +1,208 @@
+"""Load test of the login, submit, list, get and download paths, with regression checks.
+
+Generate data first (``benchmarks/datagen.py`` writes ``fixtures.json``), then
+either drive the app in-process, with nothing listening::
+
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/loadtest.py --output results.json
+
+or a running server over HTTP, started with the submission limiter off
+(``SUBMIT_RATE_PER_IP=0 SUBMIT_RATE_PER_FORM=0``) so it measures the app, not
+the limiter::
+
+    python benchmarks/loadtest.py --base-url http://localhost:8000 --output results.json
+
+Each scenario sends ``--requests`` requests with ``--concurrency`` in flight and
+reports throughput and latency percentiles. Pass a previous output as
+``--baseline``: the run fails (exit status 1) when a scenario's throughput drops
+or its p95 rises by more than ``--tolerance`` (default 20%).
+Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("login", "submit", "list", "get", "download")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed, statuses):
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p90_ms": round(percentile(samples, 90) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+class Scenarios:
+    """Builds one request of each kind from the fixtures; ``rng`` keeps runs reproducible."""
+
+    def __init__(self, fixtures, rng):
+        self.fixtures = fixtures
+        self.rng = rng
+        self.forms = [form for form in fixtures["forms"] if form["applications"]]
+        self.type_names = {id: name for name, id in fixtures["field_types"].items()}
+        self.pdf_type_id = fixtures["field_types"]["PDF"]
+        self.tokens = {}
+        self.pdf = None
+
+    async def authenticate(self, client):
+        for user in self.fixtures["users"]:
+            response = await client.post(
+                "/token", data={"username": user["username"], "password": self.fixtures["password"]}
+            )
+            response.raise_for_status()
+            self.tokens[user["id"]] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def login(self, client):
+        user = self.rng.choice(self.fixtures["users"])
+        return client.post("/token", data={"username": user["username"], "password": self.fixtures["password"]})
+
+    def submit(self, client):
+        from datagen import answer_for, fake_pdf
+
+        if self.pdf is None:
+            self.pdf = fake_pdf(self.rng, 0, 64 * 1024)
+        form = self.rng.choice(self.forms)
+        form_data, files = {}, []
+        for field in form["field_config"]:
+            if field["field_type_id"] == self.pdf_type_id:
+                files.append(("files", (f"{field['field_id']}___cv.pdf", self.pdf, "application/pdf")))
+            else:
+                form_data[field["field_id"]] = answer_for(self.rng, field, self.type_names, [])
+        return client.post(f"/applications/submit/{form['id']}", data={"form_data": json.dumps(form_data)}, files=files)
+
+    def list(self, client):
+        form = self.rng.choice(self.forms)
+        return client.get(f"/applications/form/{form['id']}", headers=self.tokens[form["creator_id"]])
+
+    def get(self, client):
+        form = self.rng.choice(self.forms)
+        application_id = self.rng.choice(form["applications"])
+        return client.get(f"/applications/{application_id}", headers=self.tokens[form["creator_id"]])
+
+    def download(self, client):
+        form = self.rng.choice(self.forms)
+        application_id = self.rng.choice(form["applications"])
+        field_id = next(field["field_id"] for field in form["field_config"]
+                        if field["field_type_id"] == self.pdf_type_id)
+        return client.get(f"/applications/{application_id}/download-file/{field_id}",
+                          headers=self.tokens[form["creator_id"]])
+
+
+async def run_scenario(client, make_request, requests, concurrency):
+    samples, statuses = [], {}
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            started = time.perf_counter()
+            response = await make_request(client)
+            samples.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started, statuses)
+
+
+@contextlib.asynccontextmanager
+async def open_client(base_url):
+    import httpx
+
+    timeout = httpx.Timeout(60)
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            yield client
+        return
+    # In-process: the real app and its startup, without sockets; the limiter would only measure itself
+    os.environ.setdefault("SUBMIT_RATE_PER_IP", "0")
+    os.environ.setdefault("SUBMIT_RATE_PER_FORM", "0")
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://loadtest", timeout=timeout
+    ) as client:
+        yield client
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if result["rps"] < previous["rps"] * (1 - tolerance):
+            found.append(f"{name}: {result['rps']} req/s, baseline {previous['rps']}")
+        if result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {result['p95_ms']} ms, baseline {previous['p95_ms']}")
+    return found
+
+
+async def run(args):
+    with open(args.fixtures) as file:
+        fixtures = json.load(file)
+    scenarios = Scenarios(fixtures, random.Random(args.seed))
+    results = {}
+    async with open_client(args.base_url) as client:
+        await scenarios.authenticate(client)
+        for name in args.scenarios:
+            # A short warm-up so caches and pools are in their steady state
+            await run_scenario(client, getattr(scenarios, name), min(args.requests, args.concurrency * 2), args.concurrency)
+            results[name] = await run_scenario(client, getattr(scenarios, name), args.requests, args.concurrency)
+            print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    return results
+
+
+def main(args):
+    results = asyncio.run(run(args))
+    report = {
+        "mode": "http" if args.base_url else "in-process",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default="fixtures.json")
+    parser.add_argument("--base-url", help="test a running server instead of the app in-process")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results here as JSON")
+    parser.add_argument("--baseline", help="results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+"""Benchmark: logins/sec per core through POST /token, in-process.
+
+    python benchmarks/login_bench.py [--logins 200] [--concurrency 32]
+
+Each mode runs in a fresh interpreter against a throw-away SQLite database:
+
+* ``threadpool``: bcrypt runs in the event loop's thread pool (the previous path)
+* ``pool``: bcrypt runs in the bounded process pool from passwords.py
+
+Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_logins(logins, concurrency):
+    import httpx
+    import main
+    from migrations import migrate
+
+    migrate()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post(
+            "/register", json={"email": "bench@example.com", "username": "bench", "password": "secret"}
+        )
+        response.raise_for_status()
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = {}
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/token", data={"username": "bench", "password": "secret"})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+    return elapsed, statuses
+
+
+def child(args):
+    os.chdir(tempfile.mkdtemp(prefix="login-bench-"))
+    os.makedirs("static", exist_ok=True)
+    sys.path.insert(0, BACKEND_DIR)
+    elapsed, statuses = asyncio.run(run_logins(args.logins, args.concurrency))
+    cores = int(os.environ["PASSWORD_HASH_WORKERS"]) or os.cpu_count() or 1
+    print(json.dumps({
+        "mode": args.mode,
+        "logins": args.logins,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(args.logins / elapsed, 2),
+        "logins_per_sec_per_core": round(args.logins / elapsed / cores, 2),
+    }))
+
+
+def parent(args):
+    cores = os.cpu_count() or 1
+    results = []
+    for mode, workers in (("threadpool", 0), ("pool", cores)):
+        env = dict(
+            os.environ,
+            PASSWORD_HASH_WORKERS=str(workers),
+            PASSWORD_HASH_MAX_PENDING=str(args.logins),
+            BCRYPT_ROUNDS=str(args.rounds),
+            DATABASE_URL="sqlite:///./bench.db",
+        )
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--mode", mode,
+             "--logins", str(args.logins), "--concurrency", str(args.concurrency)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({"cores": cores, "bcrypt_rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--mode", default="pool")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.child:
+        child(arguments)
+    else:
+        parent(arguments)
@@ -0,0 +1,55 @@
+"""Benchmark: overhead SubmitLimitMiddleware adds to an accepted submission.
+
+    python benchmarks/ratelimit_bench.py [--requests 100000] [--clients 1000]
+
+Drives the middleware directly with a no-op inner app, so the numbers are the
+limiter alone: both token buckets, the admission slot and the pass-through.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def inner_app(scope, receive, send):
+    pass
+
+
+async def run(requests, clients, wrapped):
+    scopes = [
+        {"type": "http", "method": "POST", "path": f"/applications/submit/{number % 50}", "client": (f"10.0.{number // 256}.{number % 256}", 1234)}
+        for number in range(clients)
+    ]
+    started = time.perf_counter()
+    for number in range(requests):
+        await wrapped(scopes[number % clients], None, None)
+    return time.perf_counter() - started
+
+
+def main(args):
+    os.environ.pop("CACHE_URL", None)
+    os.environ.pop("RATE_LIMIT_URL", None)
+    import ratelimit
+
+    # Generous buckets so every request takes the accepted (slowest) path
+    ratelimit.SUBMIT_BURST_PER_IP = ratelimit.SUBMIT_BURST_PER_FORM = args.requests
+    limiter = ratelimit.SubmitLimiter(buckets=ratelimit.MemoryBuckets())
+    bare = asyncio.run(run(args.requests, args.clients, inner_app))
+    limited = asyncio.run(run(args.requests, args.clients, ratelimit.SubmitLimitMiddleware(inner_app, limiter)))
+    print(json.dumps({
+        "requests": args.requests,
+        "clients": args.clients,
+        "accepted": limiter.accepted,
+        "overhead_us_per_request": round((limited - bare) / args.requests * 1e6, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=1000)
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+"""Benchmark: rows/sec of list_form_applications pages, ORM + Pydantic vs columns + orjson.
+
+    python benchmarks/serialization_bench.py [--rows 2000] [--page 100] [--fields 12]
+
+Runs against a throw-away SQLite database. Both paths include the query:
+
+* ``pydantic``: ORM objects validated into ``ApplicationResponse`` and rendered
+  the way FastAPI's JSONResponse does (the previous path)
+* ``columns``: a column-only select encoded by ``serialization.encode_rows``
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(rows, fields):
+    from database import SessionLocal
+    from models import Application, Form
+
+    with SessionLocal() as db:
+        form = Form(title="bench", field_config=[
+            {"field_id": f"f{index}", "field_type_id": 1, "label": f"Field {index}", "required": False, "options": None}
+            for index in range(fields)
+        ])
+        db.add(form)
+        db.flush()
+        started = datetime.datetime(2024, 1, 1)
+        db.add_all(
+            Application(
+                form_id=form.id,
+                form_data={f"f{index}": f"answer {number} to question {index} " * 3 for index in range(fields)},
+                created_at=started + datetime.timedelta(seconds=number),
+            )
+            for number in range(rows)
+        )
+        db.commit()
+        return form.id
+
+
+async def run(form_id, page):
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from database import AsyncSessionLocal, async_engine
+    from models import Application
+    from pagination import keyset_page, split_page
+    from schemas import ApplicationResponse
+    from serialization import APPLICATION_COLUMNS, encode_rows
+
+    adapter = TypeAdapter(list[ApplicationResponse])
+
+    async def pydantic_page(db, cursor):
+        statement = keyset_page(select(Application).where(Application.form_id == form_id), Application, page, cursor)
+        items, next_cursor = split_page((await db.scalars(statement)).all(), page)
+        body = json.dumps(adapter.dump_python(adapter.validate_python(items), mode="json")).encode()
+        return body, next_cursor
+
+    async def columns_page(db, cursor):
+        statement = keyset_page(select(*APPLICATION_COLUMNS).where(Application.form_id == form_id), Application, page, cursor)
+        items, next_cursor = split_page((await db.execute(statement)).all(), page)
+        return encode_rows(items), next_cursor
+
+    results = {}
+    bodies = {}
+    for name, render in (("pydantic", pydantic_page), ("columns", columns_page)):
+        async with AsyncSessionLocal() as db:
+            await render(db, None)  # Warm up
+            started = time.perf_counter()
+            cursor, pages = None, []
+            while True:
+                body, cursor = await render(db, cursor)
+                pages.append(body)
+                if not cursor:
+                    break
+            elapsed = time.perf_counter() - started
+        bodies[name] = [item for body in pages for item in json.loads(body)]
+        results[name] = {
+            "seconds": round(elapsed, 4),
+            "rows_per_sec": round(len(bodies[name]) / elapsed),
+            "bytes": sum(len(body) for body in pages),
+        }
+    await async_engine.dispose()
+    results["same_output"] = bodies["pydantic"] == bodies["columns"]
+    results["speedup"] = round(results["columns"]["rows_per_sec"] / results["pydantic"]["rows_per_sec"], 2)
+    return results
+
+
+def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="serialization-bench-"))
+    os.makedirs("static", exist_ok=True)
+    os.environ["DATABASE_URL"] = "sqlite:///./bench.db"
+    sys.path.insert(0, BACKEND_DIR)
+    import models  # noqa: F401  Registers the tables
+    from database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    form_id = seed(args.rows, args.fields)
+    results = asyncio.run(run(form_id, args.page))
+    print(json.dumps({"rows": args.rows, "page": args.page, "fields": args.fields, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--fields", type=int, default=12)
+    main(parser.parse_args())
@@ -0,0 +1,111 @@
+"""Load test: latency of GET /forms/{id} while multi-MB submissions stream in.
+
+Run against a live server with an existing form. The burst comes from one
+address, so start the server with the submission limiter off, or the default
+per-IP limit answers most of it with 429::
+
+    SUBMIT_RATE_PER_IP=0 SUBMIT_RATE_PER_FORM=0 python main.py
+    python benchmarks/upload_load.py --base-url http://localhost:8000 --form-id 123456
+
+The script first measures GET latency on an idle server, then again while a
+burst of concurrent uploads is in flight, and prints p50/p95/p99 for both
+phases. With a non-blocking upload path the two p99 figures should stay close.
+Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, samples):
+    return {
+        "phase": name,
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+async def poll_form(client, form_id, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(f"/forms/{form_id}")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+
+
+async def measure_gets(client, form_id, readers, duration, during=None):
+    samples = []
+    stop = asyncio.Event()
+    pollers = [asyncio.create_task(poll_form(client, form_id, stop, samples)) for _ in range(readers)]
+    if during is not None:
+        await during
+    else:
+        await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*pollers)
+    return samples
+
+
+async def submit_burst(client, form_id, field_id, uploads, concurrency, payload):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit_one(index):
+        async with semaphore:
+            files = [("files", (f"{field_id}___load_{index}.pdf", payload, "application/pdf"))]
+            data = {"form_data": json.dumps({field_id: ""})}
+            response = await client.post(f"/applications/submit/{form_id}", data=data, files=files)
+            if response.status_code == 429:
+                raise SystemExit("Rate limited: restart the server with SUBMIT_RATE_PER_IP=0 SUBMIT_RATE_PER_FORM=0")
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(submit_one(i) for i in range(uploads)))
+    return time.perf_counter() - started
+
+
+async def main(args):
+    payload = b"%PDF-1.4\n" + os.urandom(args.size_mb * 1024 * 1024)
+    limits = httpx.Limits(max_connections=args.readers + args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        idle = await measure_gets(client, args.form_id, args.readers, args.duration)
+        burst = submit_burst(client, args.form_id, args.field_id, args.uploads, args.concurrency, payload)
+        busy_task = asyncio.ensure_future(burst)
+        busy = await measure_gets(client, args.form_id, args.readers, args.duration, during=busy_task)
+        upload_seconds = busy_task.result()
+
+    report = {
+        "idle": summarize("idle", idle),
+        "burst": summarize("burst", busy),
+        "uploads": args.uploads,
+        "upload_size_mb": args.size_mb,
+        "upload_seconds": round(upload_seconds, 2),
+        "upload_mb_per_s": round(args.uploads * args.size_mb / upload_seconds, 2),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--form-id", type=int, required=True)
+    parser.add_argument("--field-id", default="cv", help="PDF field id of the form")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent GET /forms/{id} clients")
+    parser.add_argument("--uploads", type=int, default=40, help="submissions in the burst")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent submissions")
+    parser.add_argument("--size-mb", type=int, default=5, help="size of each uploaded PDF")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of idle measurement")
+    asyncio.run(main(parser.parse_args()))
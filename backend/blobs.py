@@ -0,0 +1,287 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import delete, func, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from compression import compress, decompress
+from database import SessionLocal, dialect_insert
+from models import (
+    Application, ApplicationFile, ArchivedApplication, ArchivedApplicationFile, Blob, BlobText, FieldType, Form,
+)
+from uploads import CHUNK_SIZE, UPLOAD_DIR, UPLOAD_TMP_DIR, StagedUpload, is_upload_path
+from validation import FormValidator
+
+# Content-addressed store: blobs/ab/cd/<sha256>, one file per distinct content
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+# Same layout for files only archived applications reference; may be on cheaper storage
+COLD_BLOB_DIR = os.getenv("COLD_UPLOAD_DIR", os.path.join(UPLOAD_DIR, "cold"))
+# form_data values reference stored files as "blob:<sha256>"
+BLOB_REF_PREFIX = "blob:"
+# Files of deleted blobs are removed by background jobs of this many blobs each
+UNLINK_BATCH_SIZE = 500
+DELETED_SUFFIX = ".deleted"
+# Applications rewritten per query when adopting files of the pre-blob upload code
+ADOPT_BATCH_SIZE = 500
+# Longer than any submission takes between publishing its files and committing
+PUBLISH_GRACE_SECONDS = 600
+
+
+def blob_path(blob_id: str) -> str:
+    return os.path.join(BLOB_DIR, blob_id[:2], blob_id[2:4], blob_id)
+
+
+def cold_blob_path(blob_id: str) -> str:
+    return os.path.join(COLD_BLOB_DIR, blob_id[:2], blob_id[2:4], blob_id)
+
+
+def stored_blob_path(blob_id: str) -> str:
+    """Where a blob's file is: the hot store, else the cold one (same content may be in both)."""
+    path = blob_path(blob_id)
+    if not os.path.exists(path):
+        cold = cold_blob_path(blob_id)
+        if os.path.exists(cold):
+            return cold
+    return path
+
+
+def blob_ref(blob_id: str) -> str:
+    return BLOB_REF_PREFIX + blob_id
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX) and len(value) == len(BLOB_REF_PREFIX) + 64
+
+
+def original_filename(filename: str) -> str:
+    # Uploads arrive as "<field_id>___<name>"; keep only the applicant's name
+    return os.path.basename(filename.split("___", 1)[-1]) or "file"
+
+
+async def add_references(db: AsyncSession, application_id: int, files: List[Tuple[str, StagedUpload]]):
+    """Record ``(field_id, staged)`` uploads of an application and bump blob refcounts."""
+    counts = Counter(staged.sha256 for _, staged in files)
+    insert = dialect_insert(db.bind.dialect.name)
+    for field_id, staged in files:
+        db.add(ApplicationFile(
+            application_id=application_id,
+            field_id=field_id,
+            blob_id=staged.sha256,
+            filename=original_filename(staged.filename),
+        ))
+    for staged in {staged.sha256: staged for _, staged in files}.values():
+        content_type = staged.content_type or mimetypes.guess_type(staged.filename)[0]
+        statement = insert(Blob).values(
+            id=staged.sha256, size=staged.size, content_type=content_type, refcount=counts[staged.sha256]
+        )
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[Blob.id],
+            set_={"refcount": Blob.refcount + counts[staged.sha256]},
+        ))
+
+
+async def release_references(db: AsyncSession, application_ids, files=ApplicationFile) -> List[str]:
+    """Drop the file references of deleted applications and collect unreferenced blobs.
+
+    ``application_ids`` is a list or a ``select()`` of application ids; every
+    step is one statement whatever its size. ``files`` is ApplicationFile, or
+    ArchivedApplicationFile for archived applications. Rows of blobs that
+    reach a zero refcount are deleted here and their ids returned: hand them
+    to ``unlink_blobs`` once the transaction has committed.
+    """
+    selected = files.application_id.in_(application_ids)
+    released = select(files.blob_id).where(selected)
+    dropped = (
+        select(func.count())
+        .select_from(files)
+        .where(files.blob_id == Blob.id, selected)
+        .scalar_subquery()
+    )
+    await db.execute(update(Blob).where(Blob.id.in_(released)).values(refcount=Blob.refcount - dropped))
+    orphaned = (await db.scalars(select(Blob.id).where(Blob.id.in_(released), Blob.refcount <= 0))).all()
+    await db.execute(delete(files).where(selected))
+    for start in range(0, len(orphaned), UNLINK_BATCH_SIZE):
+        batch = orphaned[start:start + UNLINK_BATCH_SIZE]
+        # Their extracted text leaves the CV index with them
+        await db.execute(delete(BlobText).where(BlobText.blob_id.in_(batch)))
+        await db.execute(delete(Blob).where(Blob.id.in_(batch)))
+    return orphaned
+
+
+class Unlinked(NamedTuple):
+    removed: int  # Files removed
+    deferred: List[str]  # Blobs whose file was published too recently to tell; unlink them again later
+
+
+def unlink_blobs(blob_ids: Iterable[str], grace_seconds: int = PUBLISH_GRACE_SECONDS) -> Unlinked:
+    """Remove the files (hot and cold) of deleted blobs, unless the same content was stored again meanwhile.
+
+    Each file is first renamed aside, then checked. Submissions publish their
+    files before committing, and publishing touches a file that already
+    exists, so a file modified within ``grace_seconds`` may belong to a
+    submission not committed yet: it is moved back and its blob deferred.
+    Otherwise the blob table decides. A submission publishing after the
+    rename finds the path free and stores a fresh copy.
+    """
+    aside = []
+    for blob_id in blob_ids:
+        for path in (blob_path(blob_id), cold_blob_path(blob_id)):
+            try:
+                os.replace(path, path + DELETED_SUFFIX)
+            except FileNotFoundError:
+                continue
+            aside.append((blob_id, path))
+    if not aside:
+        return Unlinked(0, [])
+    recent = time.time() - grace_seconds
+    deferred = {blob_id for blob_id, path in aside if os.path.getmtime(path + DELETED_SUFFIX) > recent}
+    with SessionLocal() as db:
+        alive = set(db.scalars(select(Blob.id).where(Blob.id.in_({blob_id for blob_id, _ in aside}))))
+    removed = 0
+    for blob_id, path in aside:
+        if blob_id in alive or blob_id in deferred:
+            os.replace(path + DELETED_SUFFIX, path)
+        else:
+            os.remove(path + DELETED_SUFFIX)
+            removed += 1
+    return Unlinked(removed, sorted(deferred - alive))
+
+
+def move_to_cold(blob_ids: Iterable[str]) -> int:
+    """Move blob files from the hot store to the cold one; returns how many moved.
+
+    Readers go through ``stored_blob_path``, which sees the hot file until it
+    is gone, so a copy across filesystems is never read half written.
+    """
+    moved = 0
+    for blob_id in blob_ids:
+        path, cold = blob_path(blob_id), cold_blob_path(blob_id)
+        if not os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(cold), exist_ok=True)
+        try:
+            shutil.move(path, cold)
+        except FileNotFoundError:
+            continue  # Unlinked meanwhile
+        moved += 1
+    return moved
+
+
+def file_references(form_id: int, field_ids, application_ids=None):
+    """``(application_id, field_id, blob_id, filename)`` of a form's stored files, hot and archived, oldest first.
+
+    Files are only ever found through these rows, restricted to ``field_ids``
+    (the form's file fields): answers are never read as paths or references.
+    """
+    statements = []
+    for applications, files in ((Application, ApplicationFile), (ArchivedApplication, ArchivedApplicationFile)):
+        statement = (
+            select(files.application_id, files.field_id, files.blob_id, files.filename,
+                   applications.created_at, files.id.label("file_id"))
+            .join(applications, applications.id == files.application_id)
+            .where(applications.form_id == form_id, files.field_id.in_(list(field_ids)))
+        )
+        if application_ids is not None:
+            statement = statement.where(files.application_id.in_(application_ids))
+        statements.append(statement)
+    statement = union_all(*statements)
+    columns = statement.selected_columns
+    return statement.order_by(columns.created_at, columns.application_id, columns.file_id)
+
+
+def _store_legacy_file(path: str) -> Optional[Tuple[str, int]]:
+    """Copy a file stored by the pre-blob upload code into the blob store; ``(blob_id, size)``, None if missing."""
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        return None
+    blob_id = hasher.hexdigest()
+    destination = blob_path(blob_id)
+    if not os.path.exists(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, destination)
+    return blob_id, os.path.getsize(destination)
+
+
+def adopt_legacy_uploads(db: Session) -> int:
+    """Move files the pre-blob upload code kept as paths in answers into the blob store.
+
+    Only answers of file fields are read. Each file gets a blob, a file row
+    and a ``blob:`` reference in place of its path, so it is served like any
+    other upload; ``reconcile`` later removes the original as unreferenced.
+    Missing files keep their path. Returns how many files were adopted.
+    Runs as migration 5, so it reads and writes only the columns that existed then.
+    """
+    field_types = {
+        field_type.id: field_type
+        for field_type in db.execute(select(FieldType.id, FieldType.name, FieldType.has_options))
+    }
+    insert = dialect_insert(db.bind.dialect.name)
+    adopted = 0
+    for form in db.execute(select(Form.id, Form.field_config)).all():
+        file_fields = FormValidator(form.field_config, field_types).file_fields
+        if not file_fields:
+            continue
+        for applications, files in ((Application, ApplicationFile), (ArchivedApplication, ArchivedApplicationFile)):
+            answers = (applications.form_data,) if applications is Application else (applications.codec, applications.data)
+            last_id = 0
+            while True:
+                batch = db.execute(
+                    select(applications.id, *answers)
+                    .where(applications.form_id == form.id, applications.id > last_id)
+                    .order_by(applications.id).limit(ADOPT_BATCH_SIZE)
+                ).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                for application in batch:
+                    if applications is Application:
+                        form_data = dict(application.form_data or {})
+                    else:
+                        form_data = orjson.loads(decompress(application.codec, application.data))
+                    changed = False
+                    for field_id in file_fields:
+                        value = form_data.get(field_id)
+                        items = []
+                        stored_any = False
+                        for item in value if isinstance(value, list) else [value]:
+                            stored = None if is_blob_ref(item) or not is_upload_path(item) else _store_legacy_file(item)
+                            if stored is None:
+                                items.append(item)
+                                continue
+                            blob_id, size = stored
+                            db.execute(files.__table__.insert().values(
+                                application_id=application.id, field_id=field_id, blob_id=blob_id,
+                                filename=original_filename(item),
+                            ))
+                            db.execute(insert(Blob).values(
+                                id=blob_id, size=size, content_type=mimetypes.guess_type(item)[0], refcount=1
+                            ).on_conflict_do_update(index_elements=[Blob.id], set_={"refcount": Blob.refcount + 1}))
+                            items.append(blob_ref(blob_id))
+                            adopted += 1
+                            stored_any = changed = True
+                        if stored_any:
+                            form_data[field_id] = items if isinstance(value, list) else items[0]
+                    if not changed:
+                        continue
+                    if applications is Application:
+                        values = {"form_data": form_data}
+                    else:
+                        codec, data = compress(orjson.dumps(form_data))
+                        values = {"codec": codec, "data": data}
+                    db.execute(update(applications).where(applications.id == application.id).values(**values))
+                db.flush()
+    return adopted
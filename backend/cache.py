@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+# Set CACHE_URL=redis://host:6379/0 to share caches between workers (needs the redis package)
+CACHE_URL = os.getenv("CACHE_URL")
+# session.info key of the (cache, key) pairs to drop once the session commits
+PENDING_DELETES = "cache_pending_deletes"
+
+
+class MemoryBackend:
+    """Bounded in-process LRU store with per-entry expiry.
+
+    Locked rather than loop-bound: ORM event listeners invalidate entries from
+    job worker threads too.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self.delete_sync(key)
+
+    def delete_sync(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared store; values must be JSON-serializable.
+
+    Requests await the asyncio client, so a round trip never blocks the event loop.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._url = url
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._sync_client = None  # Only for delete_sync outside the event loop
+
+    async def get(self, key: str):
+        raw = await self._client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._client.set(key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    def delete_sync(self, key: str):
+        """Delete before returning, from synchronous code."""
+        deleting = self.delete(key)
+        try:
+            # Inside an AsyncSession commit: await the asyncio client on the event loop
+            await_only(deleting)
+            return
+        except MissingGreenlet:
+            deleting.close()
+        # Plain synchronous code (manage.py, job threads): no loop to await on
+        if self._sync_client is None:
+            import redis
+
+            self._sync_client = redis.Redis.from_url(self._url)
+        self._sync_client.delete(key)
+
+    def clear(self):
+        pass  # Entries expire on their own; never flush a shared server
+
+    def __len__(self):
+        return 0
+
+
+def create_backend(maxsize: int):
+    if CACHE_URL:
+        return RedisBackend(CACHE_URL)
+    return MemoryBackend(maxsize)
+
+
+class Cache:
+    """Namespaced TTL cache with hit/miss counters on top of a backend.
+
+    ``get``, ``set`` and ``delete`` are awaited. ORM event listeners fire at
+    flush, before the commit, so they call ``delete_after_commit`` instead:
+    dropping the entry earlier would let a concurrent request cache the old
+    row again until the TTL runs out.
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int = 10000, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend if backend is not None else create_backend(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str):
+        value = await self.backend.get(self._key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl > 0:
+            await self.backend.set(self._key(key), value, ttl)
+
+    async def delete(self, key: str):
+        await self.backend.delete(self._key(key))
+
+    def delete_sync(self, key: str):
+        self.backend.delete_sync(self._key(key))
+
+    def delete_after_commit(self, session: Optional[Session], key: str):
+        if session is None:
+            self.delete_sync(key)
+            return
+        session.info.setdefault(PENDING_DELETES, set()).add((self, key))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self.backend),
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_committed(session):
+    # The commit only returns once every entry is gone, on every worker sharing the backend
+    for cache, key in session.info.pop(PENDING_DELETES, ()):
+        cache.delete_sync(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop(PENDING_DELETES, None)
@@ -0,0 +1,276 @@
+import importlib.util
+import mimetypes
+import os
+import re
+import stat
+import zlib
+from typing import Optional, Sequence, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# zstd needs the optional zstandard package, brotli the brotli package; zlib is always there
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+# Responses sent in one piece below this size go out uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+# Content codings offered to clients, preferred first when they accept several equally
+COMPRESS_ENCODINGS = [
+    coding.strip() for coding in os.getenv("COMPRESS_ENCODINGS", "zstd,br,gzip").split(",") if coding.strip()
+]
+# Levels for on-the-fly compression: most of the size reduction for little CPU
+GZIP_RESPONSE_LEVEL = 6
+BROTLI_RESPONSE_QUALITY = 4
+ZSTD_RESPONSE_LEVEL = 3
+# Larger chunks are compressed in a worker thread, off the event loop
+COMPRESS_THREAD_SIZE = 256 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "application/problem+json", "application/manifest+json", "image/svg+xml",
+)
+# Events must reach the client as they happen; they are tiny anyway
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """``(codec, compressed)``, with zstd when installed; store the codec next to the data."""
+    if ZSTD_AVAILABLE:
+        import zstandard
+
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+# Incremental encoders for HTTP content codings. ``encode(data, final)`` flushes
+# after every chunk, so streamed responses reach the client as they are produced.
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_RESPONSE_LEVEL, zlib.DEFLATED, 31)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliEncoder:
+    def __init__(self):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=BROTLI_RESPONSE_QUALITY)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class ZstdEncoder:
+    def __init__(self):
+        import zstandard
+
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._flush_finish = zstandard.COMPRESSOBJ_FLUSH_FINISH
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_RESPONSE_LEVEL).compressobj()
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(self._flush_finish if final else self._flush_block)
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if BROTLI_AVAILABLE:
+    ENCODERS["br"] = BrotliEncoder
+if ZSTD_AVAILABLE:
+    ENCODERS["zstd"] = ZstdEncoder
+
+
+def negotiate(accept_encoding: str, offered: Sequence[str]) -> Optional[str]:
+    """The coding of ``offered`` the client ranks highest in ``Accept-Encoding``; ties go to the earlier one."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding.strip():
+            weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in offered:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").lower()
+    return (
+        content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(UNCOMPRESSED_TYPES)
+        and "content-encoding" not in headers
+        and "content-range" not in headers
+        and "no-transform" not in headers.get("cache-control", "")
+    )
+
+
+def vary_on_encoding(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the best coding the client accepts (zstd, br, gzip).
+
+    Bodies sent in one piece are compressed from ``minimum_size`` bytes on;
+    streamed ones (``StreamingResponse``) chunk by chunk. Already encoded,
+    ranged and binary responses (PDFs, ZIPs, images) pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, encodings: Sequence[str] = COMPRESS_ENCODINGS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [coding for coding in encodings if coding in ENCODERS]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not self.encodings:
+            return await self.app(scope, receive, send)
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None  # False once the response is known to pass through
+
+        async def compressing_send(message):
+            nonlocal start, encoder
+            if encoder is False:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if status < 200 or status in (204, 206, 304) or not compressible(Headers(raw=message["headers"])):
+                    encoder = False
+                    return await send(message)
+                start = message  # Held until the first body chunk shows whether compressing pays
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                start = {**start, "headers": headers.raw}
+                declared = headers.get("content-length")
+                if (not more_body and len(body) < self.minimum_size) or (
+                    declared is not None and declared.isdigit() and int(declared) < self.minimum_size
+                ):
+                    encoder = False
+                    await send(start)
+                    return await send(message)
+                encoder = ENCODERS[coding]()
+                headers["Content-Encoding"] = coding
+                vary_on_encoding(headers)
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # Same validator semantics as nginx: the bytes differ, the resource does not
+                    headers["ETag"] = f"W/{etag}"
+                encoded = await self.encode(encoder, body, not more_body)
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    headers["Content-Length"] = str(len(encoded))
+                await send(start)
+            else:
+                encoded = await self.encode(encoder, body, not more_body)
+            if encoded or not more_body:
+                await send({"type": "http.response.body", "body": encoded, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    @staticmethod
+    async def encode(encoder, body: bytes, final: bool) -> bytes:
+        if len(body) >= COMPRESS_THREAD_SIZE:
+            return await anyio.to_thread.run_sync(encoder.encode, body, final)
+        return encoder.encode(body, final)
+
+
+# Vite names bundled assets assets/<name>-<hash>.<ext>: their content never changes
+HASHED_ASSET = re.compile(r"(^|/)assets/[^/]+-[A-Za-z0-9_-]{8,}\.\w+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Siblings written by the frontend build (frontend/scripts/precompress.js)
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles sending the ``.br``/``.gz`` sibling of a file as-is when the client accepts it.
+
+    Hashed asset names are cached for a year, everything else (``index.html``)
+    is revalidated on every load. With ``spa``, paths without a file extension
+    that match no file get ``index.html``, so client-side routes load directly.
+    """
+
+    def __init__(self, *args, spa: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spa = spa
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as exc:
+            if not self.spa or exc.status_code != 404 or "." in path.rsplit("/", 1)[-1]:
+                raise
+        return await super().get_response("index.html", scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if HASHED_ASSET.search(relative) else "no-cache",
+        }
+        siblings = {}
+        for coding, suffix in PRECOMPRESSED:
+            try:
+                sibling_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            if stat.S_ISREG(sibling_stat.st_mode):
+                siblings[coding] = (f"{full_path}{suffix}", sibling_stat)
+        if siblings:
+            headers["Vary"] = "Accept-Encoding"
+        coding = negotiate(request_headers.get("accept-encoding", ""), list(siblings))
+        if coding is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        else:
+            # The type is that of the original file; the ETag comes from the sibling, so it differs per coding
+            sibling_path, sibling_stat = siblings[coding]
+            response = FileResponse(
+                sibling_path, status_code=status_code, stat_result=sibling_stat,
+                media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+                headers={**headers, "Content-Encoding": coding},
+            )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,132 @@
+import importlib.util
+import multiprocessing
+import os
+from concurrent.futures import Executor
+from typing import Optional
+
+from sqlalchemy import column, func, literal_column, select, table, text
+
+from blobs import stored_blob_path
+from database import SessionLocal
+from models import ApplicationFile, Blob, BlobText
+from processes import process_pool
+from search import FTS_ENABLED, fts_query
+
+# Optional: without pypdf, CVs are stored but not searchable. Imported where it
+# is used, so API workers that never extract text don't pay for it at startup.
+PYPDF_AVAILABLE = importlib.util.find_spec("pypdf") is not None
+
+# Processes extracting PDF text; 0 extracts inside the job worker itself
+PDF_TEXT_WORKERS = int(os.getenv("PDF_TEXT_WORKERS", os.cpu_count() or 1))
+CV_TEXT_MAX_CHARS = 200000
+CV_TEXT_MAX_PAGES = 50
+
+_pool: Optional[Executor] = None
+
+# The FTS5 table is created by the baseline migration; this is just enough to query it
+cv_text_fts = table("cv_text_fts", column("rowid"), column("rank"))
+
+
+def extract_pdf_text(path: str) -> dict:
+    """Text of the first pages of a PDF; runs in a worker process."""
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(path)
+        parts, length = [], 0
+        for page in reader.pages[:CV_TEXT_MAX_PAGES]:
+            part = page.extract_text() or ""
+            parts.append(part)
+            length += len(part)
+            if length >= CV_TEXT_MAX_CHARS:
+                break
+        return {"text": "\n".join(parts)[:CV_TEXT_MAX_CHARS], "pages": len(reader.pages), "error": None}
+    except Exception as error:  # Broken or encrypted files are recorded, not retried
+        return {"text": "", "pages": 0, "error": f"{type(error).__name__}: {error}"[:500]}
+
+
+def _extract(path: str) -> dict:
+    global _pool
+    # Already inside a process-mode job worker: don't start a pool per process
+    if PDF_TEXT_WORKERS <= 0 or multiprocessing.parent_process() is not None:
+        return extract_pdf_text(path)
+    if _pool is None:
+        _pool = process_pool(PDF_TEXT_WORKERS)
+    return _pool.submit(extract_pdf_text, path).result()
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def index_blob_text(blob_id: str) -> dict:
+    """Extract and index a blob's text once; later uploads of the same file reuse it."""
+    if not PYPDF_AVAILABLE:
+        return {"indexed": False, "reason": "pypdf is not installed"}
+    with SessionLocal() as db:
+        if db.scalar(select(BlobText.id).where(BlobText.blob_id == blob_id)) is not None:
+            return {"indexed": True, "cached": True}
+    path = stored_blob_path(blob_id)
+    if not os.path.exists(path):
+        # Removed or moved to cold storage meanwhile; the job is retried
+        raise FileNotFoundError(path)
+    extracted = _extract(path)
+    with SessionLocal() as db:
+        # The blob may have been collected while the text was extracted
+        if db.get(Blob, blob_id) is None:
+            return {"indexed": False, "reason": "deleted"}
+        if db.scalar(select(BlobText.id).where(BlobText.blob_id == blob_id)) is None:
+            db.add(BlobText(blob_id=blob_id, **extracted))
+            db.commit()
+    return {"indexed": extracted["error"] is None, "cached": False, "pages": extracted["pages"], "error": extracted["error"]}
+
+
+def cv_search_statement(application_ids, q: str):
+    """Matching files among ``application_ids`` as (application_id, field_id, score, snippet), best first.
+
+    SQLite ranks with FTS5's bm25 (higher scores are better); other databases
+    fall back to a substring match with a constant score. FTS5 functions can't
+    be used in aggregates, so ``best_per_application`` picks one row each.
+    """
+    if FTS_ENABLED:
+        return (
+            select(
+                ApplicationFile.application_id,
+                ApplicationFile.field_id,
+                (-cv_text_fts.c.rank).label("score"),
+                literal_column("snippet(cv_text_fts, 0, '[', ']', '...', 12)").label("snippet"),
+            )
+            .select_from(cv_text_fts)
+            .join(BlobText, BlobText.id == cv_text_fts.c.rowid)
+            .join(ApplicationFile, ApplicationFile.blob_id == BlobText.blob_id)
+            .where(
+                text("cv_text_fts MATCH :cv_query").bindparams(cv_query=fts_query(q)),
+                ApplicationFile.application_id.in_(application_ids),
+            )
+            .order_by(cv_text_fts.c.rank, ApplicationFile.application_id)
+        )
+    return (
+        select(
+            ApplicationFile.application_id,
+            ApplicationFile.field_id,
+            literal_column("0.0").label("score"),
+            func.substr(BlobText.text, 1, 200).label("snippet"),
+        )
+        .join(BlobText, BlobText.blob_id == ApplicationFile.blob_id)
+        .where(
+            ApplicationFile.application_id.in_(application_ids),
+            *(BlobText.text.ilike(f"%{term}%") for term in q.split()),
+        )
+        .order_by(ApplicationFile.application_id)
+    )
+
+
+def best_per_application(rows, offset: int, limit: int):
+    """The first (best) row of every application, then one page of those."""
+    best = {}
+    for row in rows:
+        best.setdefault(row.application_id, row)
+    return list(best.values())[offset:offset + limit]
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import tasks  # noqa: F401  Registers remove_blobs
+from blobs import UNLINK_BATCH_SIZE, release_references
+from jobs import enqueue
+from models import Application, ArchivedApplication, ArchivedApplicationFile, Form, Job
+from registry import field_type_registry
+from search import delete_answers
+from stats import count_applications
+from validation import form_validators
+
+
+async def _uncount(db: AsyncSession, applications):
+    # Take deleted applications (anything with form_id, created_at and form_data) out of their forms' counters
+    by_form: Dict[int, list] = defaultdict(list)
+    for application in applications:
+        by_form[application.form_id].append(application)
+    if by_form:
+        await field_type_registry.ensure_fresh(db)
+        forms = await db.scalars(select(Form).where(Form.id.in_(list(by_form))))
+        for form in forms:
+            option_fields = form_validators.get(form).option_fields
+            await count_applications(db, form.id, by_form[form.id], option_fields, sign=-1)
+
+
+def _enqueue_unlinks(db: AsyncSession, orphaned):
+    for start in range(0, len(orphaned), UNLINK_BATCH_SIZE):
+        enqueue(db, "remove_blobs", payload={"blob_ids": orphaned[start:start + UNLINK_BATCH_SIZE]})
+
+
+async def delete_applications(db: AsyncSession, criteria, update_stats: bool = True):
+    """Delete the applications matching ``criteria`` with everything hanging off them.
+
+    ``criteria`` is a filter on ``Application``, e.g. ``Application.form_id == 7``
+    or ``Application.id.in_(ids)``. Answers index rows, jobs, file references
+    and the applications go with one statement each, in the caller's
+    transaction, and the applications leave the form counters. Files nobody
+    references anymore are unlinked by ``remove_blobs`` jobs after the commit.
+    """
+    selection = select(Application.id).where(criteria)
+    if update_stats:
+        await _uncount(db, (await db.execute(
+            select(Application.form_id, Application.created_at, Application.form_data).where(criteria)
+        )).all())
+    await db.execute(delete_answers(selection))
+    await db.execute(delete(Job).where(Job.application_id.in_(selection)))
+    orphaned = await release_references(db, selection)
+    _enqueue_unlinks(db, orphaned)
+    await db.execute(delete(Application).where(criteria))
+    return len(orphaned)
+
+
+async def delete_archived_applications(db: AsyncSession, criteria, update_stats: bool = True):
+    """``delete_applications`` for archived applications; ``criteria`` filters ``ArchivedApplication``."""
+    if update_stats:
+        await _uncount(db, (await db.scalars(select(ArchivedApplication).where(criteria))).all())
+    orphaned = await release_references(db, select(ArchivedApplication.id).where(criteria), ArchivedApplicationFile)
+    _enqueue_unlinks(db, orphaned)
+    await db.execute(delete(ArchivedApplication).where(criteria))
+    return len(orphaned)
@@ -1,12 +1,17 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import os
+import time
 
-from database import get_db
+from cache import Cache
+from database import get_async_db
 from models import User
 from schemas import TokenData
 
@@ -15,15 +20,12 @@ SECRET_KEY = "YOUR_SECRET_KEY_HERE"  # In production, use a secure key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Decoded tokens and user rows are cached to skip jwt.decode and the user query
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))  # seconds, also capped by token expiry
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+auth_cache = Cache("auth", ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -35,23 +37,70 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _user_snapshot(user: User) -> dict:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "is_active": user.is_active,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+    }
+
+def _user_from_snapshot(snapshot: dict) -> User:
+    # A detached, read-only copy; the password hash is never cached
+    created_at = snapshot["created_at"]
+    return User(
+        id=snapshot["id"],
+        email=snapshot["email"],
+        username=snapshot["username"],
+        is_active=snapshot["is_active"],
+        created_at=datetime.fromisoformat(created_at) if created_at else None,
+    )
+
+def invalidate_cached_user(username: str, session=None):
+    auth_cache.delete_after_commit(session, f"user:{username}")
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    # Drop cached copies once a change to the user row (deactivation, rename, ...) is committed
+    history = inspect(target).attrs.username.history
+    for username in {target.username, *(history.deleted or ())}:
+        if username:
+            invalidate_cached_user(username, object_session(target))
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    token_key = "token:" + hashlib.sha256(token.encode()).hexdigest()
+    claims = await auth_cache.get(token_key)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+        claims = {"sub": token_data.username, "exp": payload.get("exp")}
+        if claims["exp"] is not None:
+            await auth_cache.set(token_key, claims, ttl=claims["exp"] - time.time())
+    elif claims["exp"] is not None and claims["exp"] <= time.time():
         raise credentials_exception
-    user = db.query(User).filter(User.username == token_data.username).first()
+
+    # Never keep a user cached for longer than the token that resolved it is valid
+    token_ttl = claims["exp"] - time.time() if claims["exp"] is not None else None
+    snapshot = await auth_cache.get(f"user:{claims['sub']}")
+    if snapshot is not None:
+        return _user_from_snapshot(snapshot)
+    user = await db.scalar(select(User).where(User.username == claims["sub"]))
     if user is None:
         raise credentials_exception
+    await auth_cache.set(f"user:{user.username}", _user_snapshot(user), ttl=token_ttl)
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,59 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator derived from the exact response bytes
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def http_date(moment: datetime.datetime) -> str:
+    # Naive datetimes in this app are UTC (datetime.utcnow)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return format_datetime(moment.astimezone(datetime.timezone.utc), usegmt=True)
+
+
+def not_modified_since(request: Request, last_modified: str) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.1.3)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or request.headers.get("if-none-match"):
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def etag_response(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None,
+    headers: Optional[dict] = None,
+    last_modified: Optional[str] = None,
+) -> Response:
+    """JSON response for pre-serialized ``body``, or a bodiless 304 if the client copy is current."""
+    etag = etag or make_etag(body)
+    response_headers = {"ETag": etag, **(headers or {})}
+    if cache_control:
+        response_headers["Cache-Control"] = cache_control
+    if last_modified:
+        response_headers["Last-Modified"] = last_modified
+    if etag_matches(request, etag) or (last_modified and not_modified_since(request, last_modified)):
+        return Response(status_code=304, headers=response_headers)
+    return Response(content=body, media_type="application/json", headers=response_headers)
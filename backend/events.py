@@ -0,0 +1,259 @@
+"""Live change feed of a form's applications, streamed to the admin page as Server-Sent Events.
+
+Submitting, deleting and changing the status of applications publish small
+events after their transaction commits. Each event holds only ids, so the page
+fetches just the rows it is missing through ``POST /applications/batch/get``.
+Event ids are ``<epoch>-<sequence>``. A reconnecting client sends the last one
+it saw as ``Last-Event-ID``, and the events it missed are replayed from a
+per-form ring buffer. When that is impossible the client gets a ``reset`` event
+and reloads the list: the buffer no longer reaches back far enough, or the
+broker restarted and changed its epoch.
+
+Events stay in the process by default, so with several workers each one only
+sees its own. Set EVENTS_URL (defaults to CACHE_URL) to a Redis server to fan
+them out to every worker.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Dict, NamedTuple, Optional, Set
+
+import orjson
+
+from cache import CACHE_URL
+
+logger = logging.getLogger("uvicorn.error")
+
+# Redis server fanning events out between workers (needs the redis package)
+EVENTS_URL = os.getenv("EVENTS_URL", CACHE_URL)
+# Events kept per form for clients resuming after a disconnect, and how many forms keep a buffer
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", 1000))
+EVENT_BUFFER_FORMS = int(os.getenv("EVENT_BUFFER_FORMS", 10000))
+# Streams end after this long; the client reconnects with Last-Event-ID and its token is checked again
+EVENT_STREAM_SECONDS = int(os.getenv("EVENT_STREAM_SECONDS", 300))
+# A comment line on idle streams, so proxies do not time them out
+EVENT_KEEPALIVE_SECONDS = 15
+# Events a slow client may fall behind by before it is sent a reset instead
+EVENT_QUEUE_SIZE = 256
+EVENT_RETRY_MS = 3000
+
+EPOCH_KEY = "events:epoch"
+
+
+class Event(NamedTuple):
+    sequence: int
+    kind: str
+    data: bytes  # JSON
+
+
+class EventBroker:
+    """Per-form ring buffers and subscriber queues of this process.
+
+    Only touched from the event loop, so no lock is needed. ``publish``
+    delivers in-process; ``RedisEventBroker`` routes it through Redis.
+    """
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE, max_forms: int = EVENT_BUFFER_FORMS):
+        self.buffer_size = buffer_size
+        self.max_forms = max_forms
+        self.epoch = secrets.token_hex(4)
+        self._buffers = OrderedDict()
+        self._sequences: Dict[int, int] = {}  # Latest sequence seen per form, kept when its buffer is evicted
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.overflowed = 0  # Subscribers reset for falling behind
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, form_id: int, kind: str, **data):
+        sequence = self._sequences.get(form_id, 0) + 1
+        self.deliver(form_id, Event(sequence, kind, orjson.dumps(data)))
+
+    def deliver(self, form_id: int, event: Event):
+        self.published += 1
+        self._sequences[form_id] = max(event.sequence, self._sequences.get(form_id, 0))
+        buffer = self._buffers.get(form_id)
+        if buffer is None:
+            buffer = self._buffers[form_id] = deque(maxlen=self.buffer_size)
+            while len(self._buffers) > self.max_forms:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(form_id)
+        buffer.append(event)
+        for queue in self._subscribers.get(form_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed += 1
+                self._reset_queue(queue)
+
+    @staticmethod
+    def _reset_queue(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def reset_all(self):
+        """Forget every buffer and tell every subscriber to reload, after events may have been lost."""
+        self._buffers.clear()
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._reset_queue(queue)
+
+    def subscribe(self, form_id: int):
+        queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        self._subscribers.setdefault(form_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, form_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(form_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[form_id]
+
+    def replay(self, form_id: int, last_event_id: Optional[str]):
+        """The buffered events after ``last_event_id``, or None when some of them are gone."""
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.rpartition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        latest = self._sequences.get(form_id, 0)
+        if sequence == latest:
+            return []
+        buffer = self._buffers.get(form_id)
+        if sequence > latest or not buffer or buffer[0].sequence > sequence + 1:
+            return None
+        return [event for event in buffer if event.sequence > sequence]
+
+    def event_id(self, form_id: int, sequence: Optional[int] = None) -> bytes:
+        if sequence is None:
+            sequence = self._sequences.get(form_id, 0)
+        return f"{self.epoch}-{sequence}".encode()
+
+
+# Number and publish in one round trip, so every worker sees the sequences in order
+_PUBLISH_SCRIPT = """
+local sequence = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], sequence .. ' ' .. ARGV[2] .. ' ' .. ARGV[3])
+return sequence
+"""
+
+
+class RedisEventBroker(EventBroker):
+    """Publishes through Redis; every worker's listener fills its own buffers from the channel."""
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        import redis.asyncio
+
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._publish = self._client.register_script(_PUBLISH_SCRIPT)
+        self._listener = None
+
+    async def start(self):
+        # One epoch for all workers, so a client may resume on any of them
+        await self._client.set(EPOCH_KEY, self.epoch, nx=True)
+        self.epoch = (await self._client.get(EPOCH_KEY)).decode()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self._client.aclose()
+
+    async def publish(self, form_id: int, kind: str, **data):
+        try:
+            await self._publish(keys=[f"events:sequence:{form_id}"],
+                                args=[f"events:form:{form_id}", kind, orjson.dumps(data)])
+        except Exception:
+            # The change itself is committed; open pages only miss the notification
+            logger.warning("Could not publish %s event of form %s", kind, form_id, exc_info=True)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._client.pubsub() as pubsub:
+                    await pubsub.psubscribe("events:form:*")
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        form_id = int(message["channel"].rsplit(b":", 1)[1])
+                        sequence, kind, data = message["data"].split(b" ", 2)
+                        self.deliver(form_id, Event(int(sequence), kind.decode(), data))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Event subscription lost, reconnecting", exc_info=True)
+                # Whatever was published meanwhile never reached this worker
+                self.reset_all()
+                await asyncio.sleep(1)
+
+
+def create_broker():
+    if EVENTS_URL:
+        return RedisEventBroker(EVENTS_URL)
+    return EventBroker()
+
+
+event_broker = create_broker()
+
+
+async def publish_changes(rows, kind: str, **data):
+    """Publish one ``kind`` event per form for ``(id, form_id)`` rows."""
+    by_form = {}
+    for application_id, form_id in rows:
+        by_form.setdefault(form_id, []).append(application_id)
+    for form_id, ids in by_form.items():
+        await event_broker.publish(form_id, kind, ids=ids, **data)
+
+
+def format_event(event_id: bytes, kind: str, data: bytes) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id, kind.encode(), data)
+
+
+async def event_stream(form_id: int, last_event_id: Optional[str] = None, broker: EventBroker = None):
+    """The Server-Sent Events body of a form's feed: missed events first, then live ones until the stream expires."""
+    broker = broker if broker is not None else event_broker
+    # Subscribing and reading the buffer with no await in between: nothing is missed or sent twice
+    queue = broker.subscribe(form_id)
+    backlog = broker.replay(form_id, last_event_id)
+    try:
+        yield b"retry: %d\n\n" % EVENT_RETRY_MS
+        if backlog is None:
+            yield format_event(broker.event_id(form_id), "reset", b'{"ids":[]}')
+        for event in backlog or ():
+            yield format_event(broker.event_id(form_id, event.sequence), event.kind, event.data)
+        deadline = time.monotonic() + EVENT_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), min(EVENT_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                yield format_event(broker.event_id(form_id), "reset", b'{"ids":[]}')
+            else:
+                yield format_event(broker.event_id(form_id, event.sequence), event.kind, event.data)
+    finally:
+        broker.unsubscribe(form_id, queue)
@@ -0,0 +1,216 @@
+import csv
+import datetime
+import io
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from archive import TieredRow, decode_tiered, tiered_applications
+from blobs import file_references
+from database import AsyncSessionLocal
+from models import Form
+from registry import field_type_registry
+from streaming_zip import ZipStream
+from validation import form_validators
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def export_columns(field_config: List[Dict[str, Any]]):
+    """(key, header) pairs: fixed columns first, then the form's fields in order."""
+    columns = [("id", "id"), ("created_at", "created_at")]
+    columns += [(field["field_id"], field.get("label") or field["field_id"]) for field in field_config or []]
+    return columns
+
+
+def flatten_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "; ".join(flatten_value(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def flatten_row(row, columns) -> List[str]:
+    form_data = row.form_data or {}
+    values = [str(row.id), flatten_value(row.created_at)]
+    values += [flatten_value(form_data.get(key)) for key, _ in columns[2:]]
+    return values
+
+
+async def with_filenames(db, form_id: int, file_fields, batch) -> list:
+    """``batch`` with the answers of file fields replaced by the original names of the files stored there.
+
+    Names come from the file rows, so stored ``blob:`` references never reach an export.
+    """
+    names = {}
+    rows = await db.execute(file_references(form_id, file_fields, [row.id for row in batch]))
+    for application_id, field_id, _, filename, *_ in rows:
+        names.setdefault((application_id, field_id), []).append(filename or "file")
+    return [
+        TieredRow(row.id, row.created_at, {
+            **(row.form_data or {}),
+            **{field_id: names.get((row.id, field_id), []) for field_id in file_fields},
+        })
+        for row in batch
+    ]
+
+
+async def iter_application_batches(form_id: int) -> AsyncIterator[list]:
+    """Stream a form's applications, hot and archived, in batches without loading them all.
+
+    Uses its own session: the request's session is closed before a streaming
+    response body is produced.
+    """
+    async with AsyncSessionLocal() as db:
+        form = await db.scalar(select(Form).where(Form.id == form_id))
+        if form is None:
+            return
+        await field_type_registry.ensure_fresh(db)
+        file_fields = form_validators.get(form).file_fields
+        result = await db.stream(
+            tiered_applications(form_id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            batch = decode_tiered(batch)
+            if file_fields:
+                batch = await with_filenames(db, form_id, file_fields, batch)
+            yield batch
+
+
+def _csv_safe(value: str) -> str:
+    # Keep spreadsheet apps from evaluating answers as formulas
+    if value and value[0] in "=+-@\t\r":
+        return "'" + value
+    return value
+
+
+async def export_csv(form_id: int, columns) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header in columns])
+    yield ("\ufeff" + buffer.getvalue()).encode()  # BOM so Excel detects UTF-8
+    async for batch in iter_application_batches(form_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_safe(value) for value in flatten_row(row, columns)] for row in batch)
+        yield buffer.getvalue().encode()
+
+
+async def export_ndjson(form_id: int, columns) -> AsyncIterator[bytes]:
+    keys = [key for key, _ in columns]
+    async for batch in iter_application_batches(form_id):
+        lines = []
+        for row in batch:
+            form_data = row.form_data or {}
+            record = {"id": row.id, "created_at": flatten_value(row.created_at)}
+            record.update((key, form_data.get(key)) for key in keys[2:])
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Applications" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number: int, values: List[str]) -> str:
+    cells = []
+    for index, value in enumerate(values):
+        text = escape(_ILLEGAL_XML_CHARS.sub("", value))
+        cells.append(
+            f'<c r="{_column_letter(index)}{number}" t="inlineStr">'
+            f'<is><t xml:space="preserve">{text}</t></is></c>'
+        )
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+async def export_xlsx(form_id: int, columns) -> AsyncIterator[bytes]:
+    # A minimal SpreadsheetML package with inline strings, so the sheet can be
+    # written row by row without a shared-strings table held in memory
+    archive = ZipStream()
+    archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES.encode())
+    archive.writestr("_rels/.rels", _XLSX_ROOT_RELS.encode())
+    archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.encode())
+    archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS.encode())
+    sheet = archive.open("xl/worksheets/sheet1.xml")
+    sheet.write(
+        b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+    )
+    sheet.write(_xlsx_row(1, [header for _, header in columns]).encode())
+    yield archive.drain()
+    number = 1
+    async for batch in iter_application_batches(form_id):
+        rows = []
+        for row in batch:
+            number += 1
+            rows.append(_xlsx_row(number, flatten_row(row, columns)))
+        sheet.write("".join(rows).encode())
+        yield archive.drain()
+    sheet.write(b"</sheetData></worksheet>")
+    sheet.close()
+    yield archive.close()
+
+
+EXPORTERS = {
+    "csv": export_csv,
+    "ndjson": export_ndjson,
+    "xlsx": export_xlsx,
+}
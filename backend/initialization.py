@@ -1,6 +1,31 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import Session
+from database import Base
 from models import FieldType
 
+def create_missing_indexes(connection, metadata=Base.metadata):
+    # create_all() only creates indexes together with new tables, so add
+    # indexes introduced later to databases that already exist
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+def add_missing_columns(connection, metadata=Base.metadata):
+    # create_all() never alters existing tables, so add columns introduced later.
+    # New columns must be nullable or carry a server_default for existing rows.
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
 def create_default_field_types(db: Session):
     # Check if field types already exist
     if db.query(FieldType).count() > 0:
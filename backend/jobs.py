@@ -0,0 +1,207 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Job
+from processes import process_pool
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at most this many at a time per process; 0 leaves them to `manage.py worker`
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# "thread" for I/O-bound handlers, "process" to spread CPU-heavy ones over cores
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+# Running jobs whose worker went silent for this long are handed out again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 600))
+JOB_RETRY_DELAY = 5  # seconds, doubled on every attempt
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobHandler:
+    def __init__(self, function: Callable, concurrency: int, max_attempts: int, priority: int):
+        self.function = function
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+
+handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str, concurrency: int = 1, max_attempts: int = 3, priority: int = 0):
+    """Register ``function(application_id, payload)`` as the handler of a job kind.
+
+    ``concurrency`` caps how many jobs of this kind one worker runs at once.
+    The handler's JSON-serializable return value is stored in ``Job.result``.
+    """
+    def register(function):
+        handlers[kind] = JobHandler(function, concurrency, max_attempts, priority)
+        return function
+    return register
+
+
+def enqueue(
+    db: Union[Session, AsyncSession],
+    kind: str,
+    application_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+    priority: Optional[int] = None
+) -> Job:
+    """Add a job in the caller's transaction, so it exists exactly when the caller's data does."""
+    handler = handlers[kind]
+    job = Job(
+        kind=kind,
+        application_id=application_id,
+        payload=payload or {},
+        priority=handler.priority if priority is None else priority,
+        max_attempts=handler.max_attempts,
+        run_after=datetime.datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+def run_job(kind: str, application_id: Optional[int], payload: dict):
+    # Entry point inside the executor; importing tasks registers the handlers
+    # in process workers that were not forked from an initialized parent
+    import tasks  # noqa: F401
+    return handlers[kind].function(application_id, payload)
+
+
+class JobWorker:
+    """Claims runnable jobs from the jobs table and runs them in a thread or process pool.
+
+    Claiming is an UPDATE guarded by ``status = 'queued'``, so several workers
+    (or processes) can share one table. Failed jobs are retried with
+    exponential backoff until their ``max_attempts`` are used up.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, mode: str = JOB_WORKER_MODE):
+        self.workers = workers
+        self.mode = mode
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Counter = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor = None
+
+    def start(self):
+        if self.workers <= 0 or self._thread is not None:
+            return
+        if self.mode == "process":
+            self._executor = process_pool(self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._thread = None
+
+    def wake(self):
+        """Look for new jobs now instead of at the next poll."""
+        self._wake.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            claimed = []
+            try:
+                claimed = self.claim()
+            except Exception:
+                logger.exception("Claiming jobs failed")
+            for job_id, kind, application_id, payload in claimed:
+                future = self._executor.submit(run_job, kind, application_id, payload)
+                future.add_done_callback(
+                    lambda future, job_id=job_id, kind=kind: self._finished(job_id, kind, future)
+                )
+            if not claimed:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+
+    def claim(self) -> List[tuple]:
+        with self._lock:
+            free = self.workers - sum(self.running.values())
+            if free <= 0:
+                return []
+            busy = [kind for kind, handler in handlers.items() if self.running[kind] >= handler.concurrency]
+        now = datetime.datetime.utcnow()
+        claimed = []
+        with SessionLocal() as db:
+            # Hand out jobs again whose worker died while running them
+            db.execute(
+                update(Job)
+                .where(Job.status == RUNNING, Job.locked_at < now - datetime.timedelta(seconds=JOB_LEASE_SECONDS))
+                .values(status=QUEUED, locked_by=None)
+            )
+            candidates = db.execute(
+                select(Job.id, Job.kind, Job.application_id, Job.payload)
+                .where(Job.status == QUEUED, Job.run_after <= now, Job.kind.in_(list(handlers)), Job.kind.notin_(busy))
+                .order_by(Job.priority.desc(), Job.id)
+                .limit(free * 4)
+            ).all()
+            for job_id, kind, application_id, payload in candidates:
+                with self._lock:
+                    if len(claimed) >= free or self.running[kind] >= handlers[kind].concurrency:
+                        continue
+                    taken = db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == QUEUED)
+                        .values(status=RUNNING, locked_by=self.name, locked_at=now, attempts=Job.attempts + 1)
+                    ).rowcount
+                    if taken:
+                        self.running[kind] += 1
+                        claimed.append((job_id, kind, application_id, payload))
+            db.commit()
+        return claimed
+
+    def _finished(self, job_id: int, kind: str, future):
+        with self._lock:
+            self.running[kind] -= 1
+        error = future.exception() if not future.cancelled() else None
+        now = datetime.datetime.utcnow()
+        try:
+            with SessionLocal() as db:
+                job = db.get(Job, job_id)
+                if job is None:
+                    pass  # The application was deleted while its job ran
+                elif future.cancelled():
+                    job.status, job.locked_by = QUEUED, None
+                elif error is None:
+                    job.status, job.finished_at, job.last_error = DONE, now, None
+                    job.result = future.result()
+                else:
+                    job.last_error = "".join(traceback.format_exception(error))[-4000:]
+                    if job.attempts < job.max_attempts:
+                        job.status, job.locked_by = QUEUED, None
+                        job.run_after = now + datetime.timedelta(seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+                    else:
+                        job.status, job.finished_at = FAILED, now
+                db.commit()
+        except Exception:
+            logger.exception("Recording the result of job %s failed", job_id)
+        self._wake.set()
+
+
+job_worker = JobWorker()
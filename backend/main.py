@@ -1,32 +1,104 @@
+import time
+
+# Measured from here, so the reported cold start covers importing the app
+IMPORT_STARTED = time.perf_counter()
+IMPORT_STARTED_WALL = time.time()
+
+import hmac
+import logging
 import os
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
+
+from compression import CompressionMiddleware, PrecompressedStaticFiles
 
-from database import engine, Base, SessionLocal
+from database import engine, async_engine, AsyncSessionLocal
+from dependencies import auth_cache
+from events import event_broker
 import models
 from routers import auth, forms, applications, field_types
-from initialization import create_default_field_types
+from pagination import NEXT_CURSOR_HEADER
+from jobs import job_worker
+from metrics import METRICS_TOKEN, MetricsMiddleware, instrument_engine, local_request, registry
+from migrations import LATEST_VERSION, current_version
+from passwords import password_hasher
+from profiling import slow_request_profiler
+from ratelimit import SubmitLimitMiddleware, submit_limiter
+from registry import field_type_registry
+import cv_text
+import tasks  # Registers the job handlers
+
+logger = logging.getLogger("uvicorn.error")
+
+# The built frontend (`npm run build`), served from / when present
+FRONTEND_DIST_DIR = os.getenv(
+    "FRONTEND_DIST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "dist")
+)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Seconds this worker spent importing the app and warming up, reported in the log and /metrics
+startup_timings = {}
 
-# Initialize default data
-db = SessionLocal()
-create_default_field_types(db)
-db.close()
+# Time and count every SQL statement for /metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
 
-app = FastAPI(title="Application Form System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only cheap warm-up here: the schema is created and seeded by `python manage.py migrate`
+    imported = time.perf_counter()
+    async with async_engine.connect() as connection:  # Opens the pool
+        version = await connection.run_sync(current_version)
+        await connection.execute(text("SELECT 1"))
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {LATEST_VERSION}: run `python manage.py migrate`"
+        )
+    async with AsyncSessionLocal() as db:
+        await field_type_registry.refresh(db)
+    if not cv_text.PYPDF_AVAILABLE:
+        logger.warning("pypdf is not installed: uploaded PDFs are stored but not indexed for CV search")
+    job_worker.start()
+    await event_broker.start()
+    startup_timings["import_seconds"] = imported - IMPORT_STARTED
+    startup_timings["warmup_seconds"] = time.perf_counter() - imported
+    logger.info(
+        "Worker %s ready: import %.3fs, warm-up %.3fs",
+        os.getpid(), startup_timings["import_seconds"], startup_timings["warmup_seconds"],
+    )
+    yield
+    await event_broker.stop()
+    job_worker.stop()
+    if slow_request_profiler is not None:
+        slow_request_profiler.stop()
+    cv_text.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
-# CORS middleware
+app = FastAPI(title="Application Form System API", lifespan=lifespan)
+
+# Throttle public submissions before their bodies are read
+app.add_middleware(SubmitLimitMiddleware)
+
+# CORS middleware (added last so it also wraps the limiter's 429/503 responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify your frontend domain
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Content-Disposition", "Content-Range", "Accept-Ranges", "Retry-After"],
 )
 
+# Compresses JSON pages and exports; inside the metrics, so response sizes are the bytes sent
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so latency includes everything above and shed requests are counted too
+app.add_middleware(MetricsMiddleware, profiler=slow_request_profiler)
+
 # Mount static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -36,10 +108,55 @@ app.include_router(forms.router)
 app.include_router(applications.router)
 app.include_router(field_types.router)
 
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to Application Form System API"}
+@registry.collector
+def app_metrics():
+    limiter = submit_limiter.stats()
+    values = {
+        "submit_accepted_total": limiter["accepted"],
+        'submit_rejected_total{reason="ip"}': limiter["rejected_ip"],
+        'submit_rejected_total{reason="form"}': limiter["rejected_form"],
+        'submit_rejected_total{reason="busy"}': limiter["rejected_busy"],
+        'submit_rejected_total{reason="timeout"}': limiter["rejected_timeout"],
+        "submit_in_flight": limiter["in_flight"],
+        "submit_waiting": limiter["waiting"],
+        "password_hash_pending": password_hasher.pending,
+        "password_hash_rejected_total": password_hasher.rejected,
+        "event_subscribers": event_broker.subscribers,
+        "events_published_total": event_broker.published,
+        "event_subscribers_reset_total": event_broker.overflowed,
+        "db_pool_checked_out": engine.pool.checkedout(),
+        "db_async_pool_checked_out": async_engine.pool.checkedout(),
+    }
+    for name, seconds in startup_timings.items():
+        values[f"worker_{name}"] = seconds
+    for name, cache in (("auth", auth_cache), ("form", forms.form_cache)):
+        values[f'cache_hits_total{{cache="{name}"}}'] = cache.hits
+        values[f'cache_misses_total{{cache="{name}"}}'] = cache.misses
+    return values
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    # Prometheus text format; counters are per worker process
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    elif not local_request(request):
+        # Without a token only a scraper on this host may read it, not requests relayed by a local proxy
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to scrape /metrics from another host")
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+if os.path.isdir(FRONTEND_DIST_DIR):
+    # Mounted last so the API routes take precedence; client-side routes get index.html
+    app.mount("/", PrecompressedStaticFiles(directory=FRONTEND_DIST_DIR, html=True, spa=True), name="frontend")
+else:
+    @app.get("/")
+    def read_root():
+        return {"message": "Welcome to Application Form System API"}
 
 if __name__ == "__main__":
+    # Development server with auto-reload; production runs `python manage.py serve --workers N`
     import uvicorn
+    from migrations import migrate
+
+    migrate()
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""Maintenance commands, run from the backend directory:
+
+    python manage.py migrate [--status]
+    python manage.py serve [--workers N] [--host HOST] [--port PORT] [--reload]
+    python manage.py reindex-answers [--form-id ID]
+    python manage.py rebuild-stats [--form-id ID]
+    python manage.py index-cvs [--rebuild]
+    python manage.py worker [--workers N] [--mode thread|process]
+    python manage.py reconcile [--dry-run]
+    python manage.py archive [--dry-run] [--older-than-days N] [--closed-after-days N] [--form-id ID]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from sqlalchemy import func, or_, select, text
+
+from database import SessionLocal, engine
+from migrations import migrate
+from models import Application, ApplicationFile, Blob, BlobText, Form
+from search import build_answers, delete_answers
+
+BATCH_SIZE = 1000
+
+
+def migrate_schema(args):
+    # Apply pending schema migrations; API workers refuse to start until this ran
+    from migrations import LATEST_VERSION, MIGRATIONS, current_version
+
+    if args.status:
+        with engine.connect() as connection:
+            version = current_version(connection)
+        for migration in MIGRATIONS:
+            print(f"{'applied' if migration.version <= version else 'pending'} {migration.version}: {migration.description}")
+        return
+    applied = migrate(engine)
+    for migration in applied:
+        print(f"applied {migration.version}: {migration.description}")
+    print(f"schema at version {LATEST_VERSION}")
+
+
+def serve(args):
+    # Production launcher: migrate once here, then start the API workers
+    import uvicorn
+
+    migrate(engine)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else args.workers,
+        reload=args.reload,
+        timeout_graceful_shutdown=30,
+    )
+
+
+def reindex_answers(args):
+    # Rebuild the answers index (and its FTS table through the triggers) form by form
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        forms = select(Form.id, Form.field_config)
+        if args.form_id:
+            forms = forms.where(Form.id == args.form_id)
+        for form_id, field_config in db.execute(forms).all():
+            application_ids = select(Application.id).where(Application.form_id == form_id)
+            db.execute(delete_answers(application_ids))
+            indexed = 0
+            applications = db.execute(
+                select(Application).where(Application.form_id == form_id).execution_options(yield_per=BATCH_SIZE)
+            ).scalars()
+            for application in applications:
+                db.add_all(build_answers(application, field_config))
+                indexed += 1
+                if indexed % BATCH_SIZE == 0:
+                    db.flush()
+            db.commit()
+            print(f"form {form_id}: indexed {indexed} applications")
+    finally:
+        db.close()
+
+
+def rebuild_stats(args):
+    # Recompute the /forms/{id}/stats counters from scratch, form by form
+    from registry import field_type_registry
+    from stats import rebuild_form_stats
+    from validation import FormValidator
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        field_type_registry.load(db)
+        forms = select(Form.id, Form.field_config)
+        if args.form_id:
+            forms = forms.where(Form.id == args.form_id)
+        for form_id, field_config in db.execute(forms).all():
+            option_fields = FormValidator(field_config, field_type_registry.by_id).option_fields
+            total = rebuild_form_stats(db, form_id, option_fields)
+            db.commit()
+            print(f"form {form_id}: counted {total} applications")
+    finally:
+        db.close()
+
+
+def index_cvs(args):
+    # Queue text extraction for uploaded PDFs that have none yet; already
+    # extracted files are cached by content hash and cost nothing
+    import tasks  # noqa: F401  Registers the job handlers
+    from jobs import enqueue
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        if args.rebuild and engine.dialect.name == "sqlite":
+            db.execute(text("INSERT INTO cv_text_fts(cv_text_fts) VALUES ('rebuild')"))
+        missing = db.execute(
+            select(Blob.id, func.min(ApplicationFile.application_id))
+            .join(ApplicationFile, ApplicationFile.blob_id == Blob.id)
+            .outerjoin(BlobText, BlobText.blob_id == Blob.id)
+            .where(
+                BlobText.id.is_(None),
+                or_(Blob.content_type == "application/pdf", ApplicationFile.filename.ilike("%.pdf")),
+            )
+            .group_by(Blob.id)
+        ).all()
+        for blob_id, application_id in missing:
+            enqueue(db, "extract_text", application_id, {"blob_id": blob_id})
+        db.commit()
+        print(f"queued text extraction for {len(missing)} files")
+    finally:
+        db.close()
+
+
+def worker(args):
+    # Run queued jobs in this process; start the API with JOB_WORKERS=0 to leave them all here
+    import tasks  # noqa: F401  Registers the job handlers
+    from jobs import JobWorker
+
+    logging.basicConfig(level=logging.INFO)
+    migrate(engine)
+    job_worker = JobWorker(workers=args.workers, mode=args.mode)
+    job_worker.start()
+    print(f"worker {job_worker.name}: {args.workers} {args.mode} workers, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_worker.stop()
+
+
+def reconcile(args):
+    # Remove orphaned rows and files; see reconcile.py for what counts as orphaned
+    from database import async_engine
+    from reconcile import reconcile as run_reconcile
+
+    async def run():
+        try:
+            return await run_reconcile(dry_run=args.dry_run)
+        finally:
+            await async_engine.dispose()
+
+    migrate(engine)
+    report = asyncio.run(run())
+    print(json.dumps({"dry_run": args.dry_run, **report}, indent=2))
+
+
+def archive(args):
+    # Move old applications and those of closed forms to cold storage; see archive.py
+    from archive import archive as run_archive
+    from database import async_engine
+
+    # Unset options fall back to ARCHIVE_AFTER_DAYS / ARCHIVE_CLOSED_AFTER_DAYS
+    policy = {
+        name: value for name, value in
+        (("older_than_days", args.older_than_days), ("closed_after_days", args.closed_after_days))
+        if value is not None
+    }
+
+    async def run():
+        try:
+            return await run_archive(args.dry_run, form_id=args.form_id, **policy)
+        finally:
+            await async_engine.dispose()
+
+    migrate(engine)
+    report = asyncio.run(run())
+    print(json.dumps({"dry_run": args.dry_run, **report}, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Application Form System maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_command = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate_command.add_argument("--status", action="store_true", help="list migrations without applying them")
+    migrate_command.set_defaults(handler=migrate_schema)
+
+    serve_command = commands.add_parser("serve", help="migrate, then run the API with several worker processes")
+    serve_command.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    serve_command.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    serve_command.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    serve_command.add_argument("--reload", action="store_true", help="single auto-reloading process, for development")
+    serve_command.set_defaults(handler=serve)
+
+    reindex = commands.add_parser("reindex-answers", help="rebuild the searchable answers index")
+    reindex.add_argument("--form-id", type=int, help="only reindex this form")
+    reindex.set_defaults(handler=reindex_answers)
+
+    stats = commands.add_parser("rebuild-stats", help="recompute the per-form statistics counters")
+    stats.add_argument("--form-id", type=int, help="only rebuild this form")
+    stats.set_defaults(handler=rebuild_stats)
+
+    cvs = commands.add_parser("index-cvs", help="queue text extraction for uploaded PDFs not yet indexed")
+    cvs.add_argument("--rebuild", action="store_true", help="also rebuild the CV full-text index from stored text")
+    cvs.set_defaults(handler=index_cvs)
+
+    run_worker = commands.add_parser("worker", help="process queued post-submission jobs")
+    run_worker.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run_worker.add_argument("--mode", choices=["thread", "process"], default="process")
+    run_worker.set_defaults(handler=worker)
+
+    clean = commands.add_parser("reconcile", help="remove orphaned rows and upload files")
+    clean.add_argument("--dry-run", action="store_true", help="only count what would be removed")
+    clean.set_defaults(handler=reconcile)
+
+    archive_command = commands.add_parser("archive", help="move old applications and closed forms' to cold storage")
+    archive_command.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    archive_command.add_argument("--older-than-days", type=int, help="archive applications older than this (0: none)")
+    archive_command.add_argument("--closed-after-days", type=int, help="archive forms closed for this long")
+    archive_command.add_argument("--form-id", type=int, help="archive all of this form's applications now")
+    archive_command.set_defaults(handler=archive)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
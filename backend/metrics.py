@@ -0,0 +1,276 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# Bearer token required to read /metrics; without one only this host may read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+THROUGHPUT_BUCKETS = (65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456, 1073741824)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *label_values):
+        self.inc(-amount, *label_values)
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; observations are binned with one bisect."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), then sum
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics of this process plus callbacks reading gauges from other modules at scrape time."""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], Dict[str, float]]):
+        """Register ``func`` returning ``{metric_name: value}``; usable as a decorator.
+
+        Names ending in ``_total`` are exposed as counters, the rest as gauges.
+        """
+        self.collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        families: Dict[str, List[str]] = {}
+        for collect in self.collectors:
+            for name, value in collect().items():
+                # Names may carry labels, e.g. 'submit_rejected_total{reason="ip"}'
+                families.setdefault(name.split("{", 1)[0], []).append(f"{name} {_format_value(value)}")
+        for base, samples in families.items():
+            lines.append(f"# TYPE {base} {'counter' if base.endswith('_total') else 'gauge'}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests handled, by route template and status code", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ("method", "route")))
+http_request_size = registry.register(Histogram(
+    "http_request_size_bytes", "Request body size", ("method", "route"), SIZE_BUCKETS))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests being handled right now"))
+db_queries = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement kind", ("engine", "operation"), QUERY_BUCKETS))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed while handling one request", ("method", "route"), COUNT_BUCKETS))
+upload_bytes = registry.register(Counter(
+    "upload_bytes_total", "Bytes of uploaded files staged to disk"))
+upload_seconds = registry.register(Counter(
+    "upload_seconds_total", "Time spent staging uploaded files; upload bytes/sec is the ratio of the two rates"))
+upload_throughput = registry.register(Histogram(
+    "upload_throughput_bytes_per_second", "Staging throughput of individual uploaded files", (), THROUGHPUT_BUCKETS))
+
+# Statement counter of the request being handled, shared with the threads and greenlets it runs queries in
+_request_queries: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_queries", default=None)
+
+
+OPERATIONS = frozenset({"select", "insert", "update", "delete"})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany, engine_label="sync"):
+    elapsed = time.perf_counter() - context._metrics_started
+    operation = statement.lstrip()[:6].lower()
+    db_queries.observe(elapsed, engine_label, operation if operation in OPERATIONS else "other")
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrument_engine(engine, label: str):
+    """Time every statement ``engine`` (a sync Engine, or an AsyncEngine's ``sync_engine``) runs."""
+    def after(*args):
+        _after_cursor_execute(*args, engine_label=label)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after)
+
+
+def record_upload(size: int, seconds: float):
+    upload_bytes.inc(size)
+    upload_seconds.inc(seconds)
+    if seconds > 0:
+        upload_throughput.observe(size / seconds)
+
+
+def local_request(request) -> bool:
+    """A request made on this host itself, not relayed by a reverse proxy running here."""
+    client = request.client
+    return (
+        client is not None and client.host in LOOPBACK_ADDRESSES
+        and "x-forwarded-for" not in request.headers and "forwarded" not in request.headers
+    )
+
+
+def route_label(scope, root_path: str) -> str:
+    # Route templates keep the label set small; mounts (static files) report their prefix
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    return scope.get("root_path", "")[len(root_path):] or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, sizes, in-flight requests and queries per request."""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        received = [0]
+        sent = [0]
+        status = [500]
+        queries = [0]
+        token = _request_queries.set(queries)
+        profile = self.profiler.begin() if self.profiler is not None else None
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                received[0] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent[0] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            http_in_flight.dec()
+            _request_queries.reset(token)
+            elapsed = time.perf_counter() - started
+            method = scope["method"]
+            route = route_label(scope, root_path)
+            http_requests.inc(1, method, route, status[0])
+            http_request_duration.observe(elapsed, method, route)
+            http_request_size.observe(received[0], method, route)
+            http_response_size.observe(sent[0], method, route)
+            db_queries_per_request.observe(queries[0], method, route)
+            if profile is not None:
+                self.profiler.end(profile, elapsed, f"{method} {route}")
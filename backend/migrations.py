@@ -0,0 +1,339 @@
+"""Versioned schema migrations, applied by ``python manage.py migrate`` (or ``serve``).
+
+Each migration runs once, in order, and is recorded in the ``schema_version``
+table. API workers never change the schema: at startup they only compare
+that table with ``LATEST_VERSION`` and refuse to start when it is behind.
+SQLite does not run DDL transactionally, so a migration must be safe to run
+again after being interrupted half way (``checkfirst``, ``IF NOT EXISTS``...).
+
+To change the schema, edit the models and append a ``@migration`` that brings
+existing databases there; never edit one that has been released. Migrations
+spell out the tables and columns they add instead of reading the models,
+which only describe the latest schema.
+"""
+import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import (
+    JSON, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table, Text,
+    func, inspect, select, text,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from blobs import adopt_legacy_uploads
+from database import engine as default_engine
+from initialization import add_missing_columns, create_default_field_types, create_missing_indexes
+
+# Kept out of Base.metadata so create_all() never creates it behind the migrations' back
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.datetime.utcnow),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(function):
+        assert not MIGRATIONS or MIGRATIONS[-1].version == version - 1, "migrations must be numbered in order"
+        MIGRATIONS.append(Migration(version, description, function))
+        return function
+    return register
+
+
+def _add_column(connection, table_name: str, column: Column):
+    if column.name not in {existing["name"] for existing in inspect(connection).get_columns(table_name)}:
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+
+
+def _applications_table(metadata: MetaData, name: str = "applications", **kwargs) -> Table:
+    # Shared by the baseline and the AUTOINCREMENT rebuild of migration 4
+    return Table(
+        name,
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("form_id", Integer, ForeignKey("forms.id")),
+        Column("form_data", JSON),
+        Column("status", String, nullable=False, server_default="pending"),
+        Column("created_at", DateTime),
+        Index("ix_applications_form_id_created_at_id", "form_id", "created_at", "id"),
+        Index("ix_applications_form_id_status", "form_id", "status"),
+        **kwargs,
+    )
+
+
+# The schema as it stood when migrations were introduced
+baseline_schema = MetaData()
+
+Table(
+    "users",
+    baseline_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("username", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+)
+Table(
+    "field_types",
+    baseline_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+    Column("description", String, nullable=True),
+    Column("has_options", Boolean),
+    Column("created_at", DateTime),
+    Index("ix_field_types_created_at_id", "created_at", "id"),
+)
+Table(
+    "forms",
+    baseline_schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True),
+    Column("description", Text, nullable=True),
+    Column("field_config", JSON),
+    Column("creator_id", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime),
+    Index("ix_forms_creator_id_created_at_id", "creator_id", "created_at", "id"),
+)
+_applications_table(baseline_schema)
+Table(
+    "blobs",
+    baseline_schema,
+    Column("id", String(64), primary_key=True),
+    Column("size", Integer, nullable=False),
+    Column("content_type", String, nullable=True),
+    Column("refcount", Integer, nullable=False),
+    Column("created_at", DateTime),
+)
+Table(
+    "application_files",
+    baseline_schema,
+    Column("id", Integer, primary_key=True),
+    Column("application_id", Integer, ForeignKey("applications.id"), nullable=False, index=True),
+    Column("field_id", String, nullable=False),
+    Column("blob_id", String(64), ForeignKey("blobs.id"), nullable=False, index=True),
+    Column("filename", String),
+)
+Table(
+    "application_answers",
+    baseline_schema,
+    Column("id", Integer, primary_key=True),
+    Column("application_id", Integer, ForeignKey("applications.id"), nullable=False, index=True),
+    Column("form_id", Integer, nullable=False),
+    Column("field_id", String, nullable=False),
+    Column("value", Text),
+    Column("value_norm", String),
+    Column("value_rev", String),
+    Index("ix_application_answers_lookup", "form_id", "field_id", "value_norm", "application_id"),
+    Index("ix_application_answers_suffix", "form_id", "field_id", "value_rev", "application_id"),
+)
+Table(
+    "blob_texts",
+    baseline_schema,
+    Column("id", Integer, primary_key=True),
+    Column("blob_id", String(64), ForeignKey("blobs.id"), nullable=False, unique=True),
+    Column("text", Text),
+    Column("pages", Integer),
+    Column("error", String, nullable=True),
+    Column("extracted_at", DateTime),
+)
+Table(
+    "jobs",
+    baseline_schema,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String, nullable=False),
+    Column("application_id", Integer, ForeignKey("applications.id"), nullable=True, index=True),
+    Column("payload", JSON),
+    Column("status", String, nullable=False),
+    Column("priority", Integer, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("run_after", DateTime),
+    Column("locked_by", String, nullable=True),
+    Column("locked_at", DateTime, nullable=True),
+    Column("last_error", Text, nullable=True),
+    Column("result", JSON, nullable=True),
+    Column("created_at", DateTime),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_jobs_status_priority_run_after", "status", "priority", "run_after"),
+)
+Table(
+    "form_stats",
+    baseline_schema,
+    Column("form_id", Integer, ForeignKey("forms.id"), primary_key=True),
+    Column("total", Integer, nullable=False),
+)
+Table(
+    "form_daily_counts",
+    baseline_schema,
+    Column("form_id", Integer, ForeignKey("forms.id"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+Table(
+    "form_option_counts",
+    baseline_schema,
+    Column("form_id", Integer, ForeignKey("forms.id"), primary_key=True),
+    Column("field_id", String, primary_key=True),
+    Column("option", String, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+
+# SQLite FTS5 indexes over answers and extracted CV text, kept in sync with triggers
+BASELINE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS application_answers_fts "
+    "USING fts5(value, content='application_answers', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS application_answers_ai AFTER INSERT ON application_answers BEGIN "
+    "INSERT INTO application_answers_fts(rowid, value) VALUES (new.id, new.value); END",
+    "CREATE TRIGGER IF NOT EXISTS application_answers_ad AFTER DELETE ON application_answers BEGIN "
+    "INSERT INTO application_answers_fts(application_answers_fts, rowid, value) "
+    "VALUES ('delete', old.id, old.value); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cv_text_fts "
+    "USING fts5(text, content='blob_texts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS blob_texts_ai AFTER INSERT ON blob_texts BEGIN "
+    "INSERT INTO cv_text_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS blob_texts_ad AFTER DELETE ON blob_texts BEGIN "
+    "INSERT INTO cv_text_fts(cv_text_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+)
+
+
+@migration(1, "Create the baseline tables, columns and indexes")
+def baseline(connection):
+    # Also brings databases created before migrations existed up to date
+    baseline_schema.create_all(bind=connection)
+    add_missing_columns(connection, baseline_schema)
+    create_missing_indexes(connection, baseline_schema)
+    if connection.dialect.name == "sqlite":
+        for statement in BASELINE_FTS:
+            connection.execute(text(statement))
+
+
+@migration(2, "Seed the default field types")
+def seed_field_types(connection):
+    with Session(bind=connection) as db:
+        create_default_field_types(db)
+
+
+@migration(3, "Add the archive tables and forms.closed_at")
+def archive_tables(connection):
+    schema = MetaData()  # The new tables, and the ones their foreign keys point to
+    for table in baseline_schema.sorted_tables:
+        table.to_metadata(schema)
+    archived = Table(
+        "archived_applications",
+        schema,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("form_id", Integer, ForeignKey("forms.id"), nullable=False),
+        Column("data", LargeBinary, nullable=False),
+        Column("codec", String, nullable=False),
+        Column("status", String, nullable=False),
+        Column("created_at", DateTime),
+        Column("archived_at", DateTime),
+        Index("ix_archived_applications_form_id_created_at_id", "form_id", "created_at", "id"),
+    )
+    archived_files = Table(
+        "archived_application_files",
+        schema,
+        Column("id", Integer, primary_key=True),
+        Column("application_id", Integer, ForeignKey("archived_applications.id"), nullable=False, index=True),
+        Column("field_id", String, nullable=False),
+        Column("blob_id", String(64), ForeignKey("blobs.id"), nullable=False, index=True),
+        Column("filename", String),
+    )
+    schema.create_all(bind=connection, tables=[archived, archived_files])
+    _add_column(connection, "forms", Column("closed_at", DateTime, nullable=True))
+
+
+@migration(4, "Never reuse application ids on SQLite")
+def application_autoincrement(connection):
+    # Without AUTOINCREMENT SQLite numbers a new row max(id) + 1, which can be
+    # the id of an archived application. Other databases use sequences that never go back.
+    if connection.dialect.name != "sqlite":
+        return
+    table = baseline_schema.tables["applications"]
+    rebuild = "applications_rebuild"
+    tables = set(inspect(connection).get_table_names())
+    if table.name in tables:
+        ddl = connection.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                {"name": table.name})
+        if "AUTOINCREMENT" not in ddl.upper():
+            # SQLite cannot alter a primary key: copy the rows into a new table and swap it in
+            connection.execute(text(f"DROP TABLE IF EXISTS {rebuild}"))
+            scratch = MetaData()  # Holds the copy and the tables its foreign keys point to
+            for other in baseline_schema.sorted_tables:
+                if other is not table:
+                    other.to_metadata(scratch)
+            connection.execute(CreateTable(_applications_table(scratch, rebuild, sqlite_autoincrement=True)))
+            columns = ", ".join(column.name for column in table.columns)
+            connection.execute(text(f"INSERT INTO {rebuild} ({columns}) SELECT {columns} FROM {table.name}"))
+            connection.execute(text(f"DROP TABLE {table.name}"))
+            tables.discard(table.name)
+    if table.name not in tables:
+        connection.execute(text(f"ALTER TABLE {rebuild} RENAME TO {table.name}"))
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+    # Continue numbering after every id handed out so far, archived ones included
+    highest = connection.scalar(text(
+        "SELECT max(coalesce((SELECT max(id) FROM applications), 0), "
+        "coalesce((SELECT max(id) FROM archived_applications), 0))"
+    ))
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'applications'"))
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('applications', :seq)"), {"seq": highest})
+
+
+@migration(5, "Move files stored as paths in answers into the blob store")
+def adopt_legacy_files(connection):
+    # Files are only served through file rows now; give the old ones theirs
+    with Session(bind=connection) as db:
+        adopt_legacy_uploads(db)
+        db.flush()
+
+
+@migration(6, "Add forms.updated_at")
+def form_updated_at(connection):
+    _add_column(connection, "forms", Column("updated_at", DateTime, nullable=True))
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection) -> int:
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.scalar(select(func.max(schema_version.c.version))) or 0
+
+
+def _lock(connection):
+    # Serialize concurrent `migrate` runs; SQLite writers are serialized anyway
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(724201)"))
+
+
+def migrate(engine=default_engine) -> List[Migration]:
+    """Apply pending migrations in order; returns the ones applied."""
+    schema_version.create(bind=engine, checkfirst=True)
+    applied = []
+    for pending in MIGRATIONS:
+        with engine.begin() as connection:
+            _lock(connection)
+            if current_version(connection) >= pending.version:
+                continue
+            pending.apply(connection)
+            connection.execute(
+                schema_version.insert().values(version=pending.version, description=pending.description)
+            )
+        applied.append(pending)
+    return applied
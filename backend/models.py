@@ -1,6 +1,8 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, JSON, Text
+from sqlalchemy import DDL, Boolean, Column, Date, ForeignKey, Index, Integer, LargeBinary, String, DateTime, JSON, Text, event
 from sqlalchemy.orm import relationship
 import datetime
+import orjson
+from compression import decompress
 from database import Base
 import random
 
@@ -25,6 +27,10 @@ class FieldType(Base):
     has_options = Column(Boolean, default=False)  # Whether this field type supports options (like select fields)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_field_types_created_at_id", "created_at", "id"),
+    )
+
 class Form(Base):
     __tablename__ = "forms"
 
@@ -34,10 +40,17 @@ class Form(Base):
     field_config = Column(JSON)  # JSON field to store form configuration
     creator_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    closed_at = Column(DateTime, nullable=True)  # No more applications; they become archivable, see archive.py
+    updated_at = Column(DateTime, nullable=True, onupdate=datetime.datetime.utcnow)  # Last change (close, reopen...)
     
     creator = relationship("User", back_populates="forms")
     applications = relationship("Application", back_populates="form")
 
+    __table_args__ = (
+        # Keyset pagination of a user's forms
+        Index("ix_forms_creator_id_created_at_id", "creator_id", "created_at", "id"),
+    )
+
 class Application(Base):
     __tablename__ = "applications"
 
@@ -46,7 +59,164 @@ class Application(Base):
     # applicant_name = Column(String)
     # applicant_email = Column(String)
     form_data = Column(JSON)  # JSON field to store form responses
+    status = Column(String, nullable=False, default="pending", server_default="pending")  # Review status
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     form = relationship("Form", back_populates="applications")
-    
\ No newline at end of file
+
+    __table_args__ = (
+        # Keyset pagination of a form's applications
+        Index("ix_applications_form_id_created_at_id", "form_id", "created_at", "id"),
+        # Selecting a form's applications by review status
+        Index("ix_applications_form_id_status", "form_id", "status"),
+        # Never hand out an id again, archived applications keep theirs (see migration 4)
+        {"sqlite_autoincrement": True},
+    )
+
+# Cold tier: applications moved out of the hot table by archive.py, keeping their id
+class ArchivedApplication(Base):
+    __tablename__ = "archived_applications"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    form_id = Column(Integer, ForeignKey("forms.id"), nullable=False)
+    data = Column(LargeBinary, nullable=False)  # form_data as compressed JSON text
+    codec = Column(String, nullable=False)  # See compression.py
+    status = Column(String, nullable=False, default="pending")
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archived_applications_form_id_created_at_id", "form_id", "created_at", "id"),
+    )
+
+    @property
+    def form_data(self):
+        return orjson.loads(decompress(self.codec, self.data))
+
+# Content-addressed file store; one row per distinct uploaded content
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    id = Column(String(64), primary_key=True)  # sha256 of the content
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=True)
+    refcount = Column(Integer, nullable=False, default=0)  # application_files rows (hot or archived) pointing here
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# A file attached to one field of an application
+class ApplicationFile(Base):
+    __tablename__ = "application_files"
+
+    id = Column(Integer, primary_key=True)
+    application_id = Column(Integer, ForeignKey("applications.id"), nullable=False, index=True)
+    field_id = Column(String, nullable=False)
+    blob_id = Column(String(64), ForeignKey("blobs.id"), nullable=False, index=True)
+    filename = Column(String)  # Name the applicant uploaded the file with
+
+# File references of archived applications; they still count in Blob.refcount
+class ArchivedApplicationFile(Base):
+    __tablename__ = "archived_application_files"
+
+    id = Column(Integer, primary_key=True)
+    application_id = Column(Integer, ForeignKey("archived_applications.id"), nullable=False, index=True)
+    field_id = Column(String, nullable=False)
+    blob_id = Column(String(64), ForeignKey("blobs.id"), nullable=False, index=True)
+    filename = Column(String)
+
+# One row per answered field, used for server-side filtering of applications
+class ApplicationAnswer(Base):
+    __tablename__ = "application_answers"
+
+    id = Column(Integer, primary_key=True)
+    application_id = Column(Integer, ForeignKey("applications.id"), nullable=False, index=True)
+    form_id = Column(Integer, nullable=False)
+    field_id = Column(String, nullable=False)
+    value = Column(Text)  # Original answer, full-text indexed
+    value_norm = Column(String)  # Lower-cased and trimmed, for equality/prefix filters
+    value_rev = Column(String)  # value_norm reversed, for suffix filters such as email domains
+
+    __table_args__ = (
+        Index("ix_application_answers_lookup", "form_id", "field_id", "value_norm", "application_id"),
+        Index("ix_application_answers_suffix", "form_id", "field_id", "value_rev", "application_id"),
+    )
+
+# SQLite FTS5 index over answer values, kept in sync with triggers
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS application_answers_fts "
+    "USING fts5(value, content='application_answers', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS application_answers_ai AFTER INSERT ON application_answers BEGIN "
+    "INSERT INTO application_answers_fts(rowid, value) VALUES (new.id, new.value); END",
+    "CREATE TRIGGER IF NOT EXISTS application_answers_ad AFTER DELETE ON application_answers BEGIN "
+    "INSERT INTO application_answers_fts(application_answers_fts, rowid, value) "
+    "VALUES ('delete', old.id, old.value); END",
+):
+    event.listen(ApplicationAnswer.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+# Text extracted from an uploaded PDF; keyed by content, so shared by duplicate uploads
+class BlobText(Base):
+    __tablename__ = "blob_texts"
+
+    id = Column(Integer, primary_key=True)  # rowid of the cv_text_fts index
+    blob_id = Column(String(64), ForeignKey("blobs.id"), nullable=False, unique=True)
+    text = Column(Text)
+    pages = Column(Integer)
+    error = Column(String, nullable=True)  # Set when the file could not be read
+    extracted_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# SQLite FTS5 index over extracted CV text, kept in sync with triggers
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cv_text_fts "
+    "USING fts5(text, content='blob_texts', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS blob_texts_ai AFTER INSERT ON blob_texts BEGIN "
+    "INSERT INTO cv_text_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS blob_texts_ad AFTER DELETE ON blob_texts BEGIN "
+    "INSERT INTO cv_text_fts(cv_text_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+):
+    event.listen(BlobText.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+# Durable queue of post-submission work, processed by jobs.JobWorker
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # Handler name registered in jobs.py
+    application_id = Column(Integer, ForeignKey("applications.id"), nullable=True, index=True)
+    payload = Column(JSON)
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow)  # Backoff between retries
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)  # Whatever the handler returned
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claiming the next runnable jobs
+        Index("ix_jobs_status_priority_run_after", "status", "priority", "run_after"),
+    )
+
+# Incrementally maintained per-form counters behind /forms/{id}/stats
+class FormStat(Base):
+    __tablename__ = "form_stats"
+
+    form_id = Column(Integer, ForeignKey("forms.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+class FormDailyCount(Base):
+    __tablename__ = "form_daily_counts"
+
+    form_id = Column(Integer, ForeignKey("forms.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day of Application.created_at
+    count = Column(Integer, nullable=False, default=0)
+
+class FormOptionCount(Base):
+    __tablename__ = "form_option_counts"
+
+    form_id = Column(Integer, ForeignKey("forms.id"), primary_key=True)
+    field_id = Column(String, primary_key=True)
+    option = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,85 @@
+import base64
+import datetime
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+# Response header carrying the opaque cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Deepest the deprecated ``skip`` parameter pages; beyond it clients follow the cursor
+MAX_SKIP = 1000
+# Documented on every list endpoint that still accepts ``skip``
+SKIP_DESCRIPTION = f"Deprecated, at most {MAX_SKIP}: pass the {NEXT_CURSOR_HEADER} response header back as ?cursor="
+
+
+def encode_cursor(created_at: datetime.datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(
+    statement,
+    model,
+    limit: int,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+):
+    """Restrict ``statement`` to one page ordered by ``(created_at, id)``.
+
+    Seeking past the cursor instead of using OFFSET lets the composite
+    ``created_at, id`` index jump straight to the page, so deep pages cost the
+    same as the first one. One extra row is fetched to detect a next page.
+    """
+    if created_after is not None:
+        statement = statement.where(model.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(model.created_at < created_before)
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        statement = statement.where(tuple_(model.created_at, model.id) > tuple_(created_at, id))
+    return statement.order_by(model.created_at, model.id).limit(limit + 1)
+
+
+def keyset_page_in_memory(
+    items,
+    limit: int,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+):
+    """Same paging as ``keyset_page`` for items already sorted by ``(created_at, id)``."""
+    after = decode_cursor(cursor) if cursor else None
+    page = []
+    for item in items:
+        if created_after is not None and item.created_at < created_after:
+            continue
+        if created_before is not None and item.created_at >= created_before:
+            continue
+        if after is not None and (item.created_at, item.id) <= after:
+            continue
+        page.append(item)
+        if len(page) > limit:
+            break
+    return page
+
+
+def split_page(rows, limit: int):
+    """Trim the look-ahead row; returns the page and the next cursor, if any."""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
@@ -0,0 +1,12 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Pools are started from a process already running the event loop, the anyio thread
+# pool and the job worker. Forking it could copy a lock another thread holds into a
+# child, which then deadlocks on it: start workers from a clean process instead.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """A process pool whose workers never inherit this process's threads."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(START_METHOD))
@@ -0,0 +1,115 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+# Requests slower than this get a flamegraph written to PROFILE_DIR (0 turns the profiler off)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 100))
+# Samples older than this are dropped, so it also bounds how much of a very slow request is captured
+PROFILE_WINDOW_SECONDS = 60
+
+# Leaf frames of threads parked on a lock, queue or selector: idle workers and event loop, not work
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(thread_name: str, frame) -> Optional[str]:
+    """One stack in the collapsed ``root;caller;callee`` format, or None for an idle thread."""
+    if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SlowRequestProfiler:
+    """Statistical profiler writing collapsed stacks for requests slower than a threshold.
+
+    While any request is in flight a background thread samples every thread's
+    stack each ``interval_ms``. When a request ends over ``threshold_ms`` the
+    samples taken during it are written to ``directory`` as a ``.folded`` file,
+    which flamegraph.pl, speedscope or inferno render as a flamegraph. Requests
+    overlapping the slow one show up in it too: the event loop thread is shared.
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_REQUEST_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.max_files = max_files
+        self.written = 0
+        self._samples = deque(maxlen=max(1, int(PROFILE_WINDOW_SECONDS / self.interval)))
+        self._active = 0
+        self._lock = threading.Lock()
+        self._sampling = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> float:
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+            self._sampling.set()
+        return time.perf_counter()
+
+    def end(self, started: float, elapsed: float, name: str):
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._sampling.clear()
+        if elapsed < self.threshold:
+            return
+        stacks = Counter(stack for taken, sample in list(self._samples) if taken >= started for stack in sample)
+        if stacks:
+            self._write(stacks, elapsed, name)
+
+    def _write(self, stacks: Counter, elapsed: float, name: str):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{slug}.folded"
+        with open(os.path.join(self.directory, filename), "w") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+        self.written += 1
+        profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith(".folded"))
+        for old in profiles[:-self.max_files]:
+            os.remove(os.path.join(self.directory, old))
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._sampling.wait()
+            if self._stopped:
+                return
+            taken = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sample = []
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = fold_stack(names.get(ident, str(ident)), frame)
+                    if stack is not None:
+                        sample.append(stack)
+            self._samples.append((taken, sample))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stopped = True
+        self._sampling.set()
+
+
+slow_request_profiler = SlowRequestProfiler() if PROFILE_SLOW_REQUEST_MS > 0 else None
@@ -0,0 +1,272 @@
+import asyncio
+import ipaddress
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+from cache import CACHE_URL
+
+# Token buckets for the public submit endpoint: sustained submissions per second and burst size
+SUBMIT_RATE_PER_IP = float(os.getenv("SUBMIT_RATE_PER_IP", 0.2))
+SUBMIT_BURST_PER_IP = int(os.getenv("SUBMIT_BURST_PER_IP", 10))
+SUBMIT_RATE_PER_FORM = float(os.getenv("SUBMIT_RATE_PER_FORM", 20))
+SUBMIT_BURST_PER_FORM = int(os.getenv("SUBMIT_BURST_PER_FORM", 100))
+# Submissions processed at once per worker, how many may wait for a slot and for how long
+SUBMIT_MAX_CONCURRENT = int(os.getenv("SUBMIT_MAX_CONCURRENT", 16))
+SUBMIT_MAX_QUEUE = int(os.getenv("SUBMIT_MAX_QUEUE", 64))
+SUBMIT_QUEUE_TIMEOUT = float(os.getenv("SUBMIT_QUEUE_TIMEOUT", 2))
+# Buckets are shared between workers through Redis when set (defaults to CACHE_URL)
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", CACHE_URL)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Reverse proxies (addresses or networks) whose X-Forwarded-For names the client. Without
+# the right list every applicant behind the proxy shares the proxy's per-IP bucket.
+RATE_LIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if entry.strip()
+]
+
+SUBMIT_PATH = re.compile(r"^/applications/submit/(\d+)/?$")
+
+
+class MemoryBuckets:
+    """Token buckets kept in this process, least recently used keys evicted first.
+
+    Only touched from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 when allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = burst
+            if len(self._buckets) >= self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            self._buckets.move_to_end(key)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Refill and take in one round trip so concurrent workers cannot both spend the last token
+_TAKE_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(bucket[1]) or burst
+if bucket[2] then tokens = math.min(burst, tokens + (now - tonumber(bucket[2])) * rate) end
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker using the same Redis server.
+
+    Uses the asyncio client: the middleware awaits the round trip instead of
+    blocking the event loop for it.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()]))
+
+    def __len__(self):
+        return 0
+
+
+def create_buckets():
+    if RATE_LIMIT_URL:
+        return RedisBuckets(RATE_LIMIT_URL)
+    return MemoryBuckets()
+
+
+class AdmissionControl:
+    """Caps concurrent requests with a bounded, time-limited wait queue.
+
+    Up to ``limit`` requests run at once and up to ``queue_size`` wait for a
+    slot in arrival order. Anything beyond that, or waiting longer than
+    ``queue_timeout``, is turned away instead of piling up on the database.
+    """
+
+    def __init__(self, limit: int = SUBMIT_MAX_CONCURRENT, queue_size: int = SUBMIT_MAX_QUEUE,
+                 queue_timeout: float = SUBMIT_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.shed = 0  # Turned away because the queue was full
+        self.timed_out = 0  # Gave up waiting for a slot
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            return True
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(error, asyncio.TimeoutError):
+                self.timed_out += 1
+                return False
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next waiter, so active stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def _trusted_proxy(address: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_address(scope, proxies=None) -> str:
+    """The submitting client's address, read through the trusted proxies in front of this server.
+
+    X-Forwarded-For is only believed when it comes from a trusted proxy. Its
+    entries are then walked from the right, past every trusted proxy, so a
+    client cannot pick its own bucket by sending a forged header.
+    """
+    proxies = RATE_LIMIT_TRUSTED_PROXIES if proxies is None else proxies
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not _trusted_proxy(address, proxies):
+        return address
+    forwarded = []
+    for name, value in scope.get("headers") or ():
+        if name == b"x-forwarded-for":
+            forwarded += [entry.strip() for entry in value.decode("latin-1").split(",") if entry.strip()]
+    for entry in reversed(forwarded):
+        address = entry
+        if not _trusted_proxy(entry, proxies):
+            break
+    return address
+
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class SubmitLimiter:
+    """Per-IP and per-form token buckets plus admission control for public submissions."""
+
+    def __init__(self, buckets=None, admission: Optional[AdmissionControl] = None):
+        self.buckets = buckets if buckets is not None else create_buckets()
+        self.admission = admission if admission is not None else AdmissionControl()
+        self.accepted = 0
+        self.rejected_ip = 0
+        self.rejected_form = 0
+
+    async def check(self, address: str, form_id: str) -> Optional[JSONResponse]:
+        """A 429 response when a bucket is empty, otherwise None."""
+        if SUBMIT_RATE_PER_IP > 0:
+            wait = await self.buckets.take(f"ip:{address}", SUBMIT_RATE_PER_IP, SUBMIT_BURST_PER_IP)
+            if wait:
+                self.rejected_ip += 1
+                return _rejection(429, "Too many submissions, please retry later", wait)
+        if SUBMIT_RATE_PER_FORM > 0:
+            wait = await self.buckets.take(f"form:{form_id}", SUBMIT_RATE_PER_FORM, SUBMIT_BURST_PER_FORM)
+            if wait:
+                self.rejected_form += 1
+                return _rejection(429, "This form is receiving too many submissions, please retry later", wait)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected_ip": self.rejected_ip,
+            "rejected_form": self.rejected_form,
+            "rejected_busy": self.admission.shed,
+            "rejected_timeout": self.admission.timed_out,
+            "in_flight": self.admission.active,
+            "waiting": self.admission.waiting,
+            "tracked_keys": len(self.buckets),
+        }
+
+
+submit_limiter = SubmitLimiter()
+
+
+class SubmitLimitMiddleware:
+    """ASGI middleware applying ``submit_limiter`` to ``POST /applications/submit/{form_id}``.
+
+    Runs before the multipart body is read, so shed requests cost neither disk
+    nor a database connection. Every other request passes straight through.
+    """
+
+    def __init__(self, app, limiter: SubmitLimiter = None):
+        self.app = app
+        self.limiter = limiter if limiter is not None else submit_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        match = SUBMIT_PATH.match(scope["path"])
+        if match is None:
+            return await self.app(scope, receive, send)
+
+        limiter = self.limiter
+        rejection = await limiter.check(client_address(scope), match.group(1))
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        admission = limiter.admission
+        if not await admission.acquire():
+            return await _rejection(503, "Server is busy, please retry", 1)(scope, receive, send)
+
+        limiter.accepted += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
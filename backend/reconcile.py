@@ -0,0 +1,175 @@
+"""Find and remove rows and files left behind by crashes, old code paths or manual edits.
+
+Run through ``python manage.py reconcile [--dry-run]``. Every database step is
+a set-based statement or works in batches, and the upload directories are
+walked once, so it is safe to run on large installations while the API serves.
+"""
+import os
+import time
+from typing import Dict
+
+from sqlalchemy import delete, exists, func, select, update
+
+from blobs import BLOB_DIR, COLD_BLOB_DIR, DELETED_SUFFIX, UNLINK_BATCH_SIZE, is_blob_ref, unlink_blobs
+from database import AsyncSessionLocal
+from deletion import delete_applications, delete_archived_applications
+from models import (
+    Application, ApplicationAnswer, ApplicationFile, ArchivedApplication, ArchivedApplicationFile, Blob, BlobText,
+    Form, FormDailyCount, FormOptionCount, FormStat, Job,
+)
+from uploads import UPLOAD_DIR, UPLOAD_TMP_DIR, field_upload_paths
+
+BATCH_SIZE = 1000
+# Files younger than this may belong to a submission still in flight and are left alone
+RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", 3600))
+
+
+def _old_files(directory: str, cutoff: float):
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    yield path
+            except FileNotFoundError:
+                continue
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+async def reconcile_rows(db, dry_run: bool) -> Dict[str, int]:
+    report = {}
+
+    # Applications of forms that no longer exist, deleted like any other application
+    orphaned_applications = select(Application.id).where(~exists().where(Form.id == Application.form_id))
+    report["applications"] = await db.scalar(select(func.count()).select_from(orphaned_applications.subquery()))
+    while not dry_run:
+        ids = (await db.scalars(orphaned_applications.limit(BATCH_SIZE))).all()
+        if not ids:
+            break
+        await delete_applications(db, Application.id.in_(ids), update_stats=False)
+        await db.commit()
+    orphaned_archived = select(ArchivedApplication.id).where(~exists().where(Form.id == ArchivedApplication.form_id))
+    report["archived_applications"] = await db.scalar(
+        select(func.count()).select_from(orphaned_archived.subquery())
+    )
+    while not dry_run:
+        ids = (await db.scalars(orphaned_archived.limit(BATCH_SIZE))).all()
+        if not ids:
+            break
+        await delete_archived_applications(db, ArchivedApplication.id.in_(ids), update_stats=False)
+        await db.commit()
+
+    # Rows pointing at applications, blobs or forms that are gone
+    dangling = {
+        "answers": delete(ApplicationAnswer).where(~exists().where(Application.id == ApplicationAnswer.application_id)),
+        "file_references": delete(ApplicationFile).where(~exists().where(Application.id == ApplicationFile.application_id)),
+        "archived_file_references": delete(ArchivedApplicationFile).where(
+            ~exists().where(ArchivedApplication.id == ArchivedApplicationFile.application_id)
+        ),
+        "jobs": delete(Job).where(Job.application_id.is_not(None), ~exists().where(Application.id == Job.application_id)),
+        "blob_texts": delete(BlobText).where(~exists().where(Blob.id == BlobText.blob_id)),
+    }
+    for model in (FormStat, FormDailyCount, FormOptionCount):
+        dangling[model.__tablename__] = delete(model).where(~exists().where(Form.id == model.form_id))
+    for name, statement in dangling.items():
+        if dry_run:
+            counted = select(func.count()).select_from(statement.table).where(statement.whereclause)
+            report[name] = await db.scalar(counted)
+        else:
+            report[name] = (await db.execute(statement)).rowcount
+    if not dry_run:
+        await db.commit()
+
+    # Refcounts that drifted from the references actually stored, hot and archived
+    references = (
+        select(func.count()).select_from(ApplicationFile).where(ApplicationFile.blob_id == Blob.id).scalar_subquery()
+        + select(func.count()).select_from(ArchivedApplicationFile)
+        .where(ArchivedApplicationFile.blob_id == Blob.id).scalar_subquery()
+    )
+    if dry_run:
+        report["refcounts"] = await db.scalar(select(func.count()).select_from(Blob).where(Blob.refcount != references))
+    else:
+        report["refcounts"] = (await db.execute(
+            update(Blob).where(Blob.refcount != references).values(refcount=references)
+        )).rowcount
+        await db.commit()
+
+    # Blobs nobody references: drop the rows, then their files
+    unreferenced = select(Blob.id).where(Blob.refcount <= 0)
+    report["blobs"] = await db.scalar(select(func.count()).select_from(unreferenced.subquery()))
+    report["blob_files"] = 0
+    while not dry_run:
+        blob_ids = (await db.scalars(unreferenced.limit(UNLINK_BATCH_SIZE))).all()
+        if not blob_ids:
+            break
+        await db.execute(delete(BlobText).where(BlobText.blob_id.in_(blob_ids)))
+        await db.execute(delete(Blob).where(Blob.id.in_(blob_ids)))
+        await db.commit()
+        report["blob_files"] += unlink_blobs(blob_ids).removed
+    return report
+
+
+async def reconcile_files(db, dry_run: bool) -> Dict[str, int]:
+    cutoff = time.time() - RECONCILE_GRACE_SECONDS
+    report = {"stray_blob_files": 0, "temp_files": 0, "legacy_files": 0}
+
+    # Blob files (hot or cold) without a row; unlink_blobs re-checks the table before removing
+    candidates = set()
+    for directory in (BLOB_DIR, COLD_BLOB_DIR):
+        for path in _old_files(directory, cutoff):
+            name = os.path.basename(path)
+            if name.endswith(DELETED_SUFFIX):
+                # Left behind by an unlink that was interrupted half way
+                report["temp_files"] += dry_run or _remove(path)
+            elif len(name) == 64:
+                candidates.add(name)
+    candidates = sorted(candidates)
+    for start in range(0, len(candidates), UNLINK_BATCH_SIZE):
+        batch = candidates[start:start + UNLINK_BATCH_SIZE]
+        known = set((await db.scalars(select(Blob.id).where(Blob.id.in_(batch)))).all())
+        stray = [blob_id for blob_id in batch if blob_id not in known]
+        report["stray_blob_files"] += len(stray) if dry_run else unlink_blobs(stray).removed
+
+    # Uploads of interrupted submissions
+    for path in _old_files(UPLOAD_TMP_DIR, cutoff):
+        report["temp_files"] += dry_run or _remove(path)
+
+    # Files stored by the pre-blob upload code that no application mentions anymore
+    legacy = [
+        os.path.join(UPLOAD_DIR, name) for name in os.listdir(UPLOAD_DIR)
+        if os.path.isfile(os.path.join(UPLOAD_DIR, name)) and os.path.getmtime(os.path.join(UPLOAD_DIR, name)) < cutoff
+    ]
+    if legacy:
+        referenced = set()
+
+        def collect(form_data):
+            for value in (form_data or {}).values():
+                for item in value if isinstance(value, list) else [value]:
+                    if not is_blob_ref(item):
+                        referenced.update(os.path.realpath(path) for path in field_upload_paths(item))
+
+        stream = await db.stream(select(Application.form_data).execution_options(yield_per=BATCH_SIZE))
+        async for form_data in stream.scalars():
+            collect(form_data)
+        stream = await db.stream(select(ArchivedApplication).execution_options(yield_per=BATCH_SIZE))
+        async for archived in stream.scalars():
+            collect(archived.form_data)
+        for path in legacy:
+            if os.path.realpath(path) not in referenced:
+                report["legacy_files"] += dry_run or _remove(path)
+    return report
+
+
+async def reconcile(dry_run: bool = False) -> Dict[str, int]:
+    """Counts of what was (or with ``dry_run``, would be) removed or fixed, by kind."""
+    async with AsyncSessionLocal() as db:
+        report = await reconcile_rows(db, dry_run)
+        report.update(await reconcile_files(db, dry_run))
+    return report
@@ -0,0 +1,85 @@
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from etags import make_etag
+from models import FieldType
+from schemas import FieldTypeResponse
+
+# Field types are seeded once and almost never change; other workers pick up
+# changes after this many seconds, the worker making the change immediately
+FIELD_TYPE_REGISTRY_TTL = int(os.getenv("FIELD_TYPE_REGISTRY_TTL", 300))
+
+
+class FieldTypeRegistry:
+    """In-memory copy of the field_types table with pre-serialized responses."""
+
+    def __init__(self):
+        self.by_id: Dict[int, FieldTypeResponse] = {}
+        self.ordered: List[FieldTypeResponse] = []
+        self.bodies: Dict[int, bytes] = {}
+        self.etags: Dict[int, str] = {}
+        self.loaded_at: Optional[float] = None
+        self.stale = True
+
+    def _populate(self, field_types):
+        ordered = sorted(
+            (FieldTypeResponse.model_validate(field_type) for field_type in field_types),
+            key=lambda field_type: (field_type.created_at, field_type.id),
+        )
+        bodies = {field_type.id: field_type.model_dump_json().encode() for field_type in ordered}
+        self.ordered = ordered
+        self.by_id = {field_type.id: field_type for field_type in ordered}
+        self.bodies = bodies
+        self.etags = {id: make_etag(body) for id, body in bodies.items()}
+        self.loaded_at = time.monotonic()
+        self.stale = False
+
+    def load(self, db: Session):
+        self._populate(db.scalars(select(FieldType)).all())
+
+    async def refresh(self, db: AsyncSession):
+        self._populate((await db.scalars(select(FieldType))).all())
+
+    async def ensure_fresh(self, db: AsyncSession):
+        expired = self.loaded_at is None or time.monotonic() - self.loaded_at > FIELD_TYPE_REGISTRY_TTL
+        if self.stale or expired:
+            await self.refresh(db)
+
+    def get(self, field_type_id: int) -> Optional[FieldTypeResponse]:
+        return self.by_id.get(field_type_id)
+
+    def validate_field_config(self, fields) -> List[str]:
+        """Check every field of a form at once and return all problems found."""
+        errors = []
+        seen = set()
+        for field in fields:
+            label = field.label or field.field_id or "Unknown"
+            if field.field_id in seen:
+                errors.append(f"Duplicate field_id: {field.field_id}")
+            seen.add(field.field_id)
+            field_type = self.by_id.get(field.field_type_id)
+            if field_type is None:
+                errors.append(f"Invalid field_type_id: {field.field_type_id}")
+            elif field_type.has_options and not field.options:
+                errors.append(f"Field '{label}' requires options for field type '{field_type.name}'")
+            elif not field_type.has_options and field.options:
+                errors.append(f"Field '{label}' does not accept options for field type '{field_type.name}'")
+        return errors
+
+    def page_body(self, field_types: List[FieldTypeResponse]) -> bytes:
+        return b"[" + b",".join(self.bodies[field_type.id] for field_type in field_types) + b"]"
+
+
+field_type_registry = FieldTypeRegistry()
+
+
+@event.listens_for(FieldType, "after_insert")
+@event.listens_for(FieldType, "after_update")
+@event.listens_for(FieldType, "after_delete")
+def _mark_stale(mapper, connection, target):
+    field_type_registry.stale = True
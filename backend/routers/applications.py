@@ -1,37 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Header, Query, Response, status, BackgroundTasks
 from fastapi import Form as FormField  # Renamed to avoid conflict
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Dict, Any
+import datetime
 import json
 import os
-import shutil
 import mimetypes
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
-from database import get_db
-from models import Application, Form, User, FieldType
-from schemas import ApplicationCreate, ApplicationResponse
+from archive import archived_page, find_archived, merge_pages
+from blobs import add_references, blob_path, blob_ref, file_references, stored_blob_path
+from cv_text import best_per_application, cv_search_statement
+from database import get_async_db
+from deletion import delete_applications, delete_archived_applications
+from models import Application, ArchivedApplication, Form, User, FieldType, Job
+from schemas import (
+    ApplicationBatchStatusUpdate, ApplicationCreate, ApplicationResponse, ApplicationSelection,
+    ApplicationStatusUpdate, BatchResult, CvSearchResult, JobResponse,
+)
 from dependencies import get_current_active_user
-import time
-
-# Create directory for file uploads if it doesn't exist
-UPLOAD_DIR = "static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+from downloads import zip_form_uploads
+from events import event_broker, event_stream, publish_changes
+from export import EXPORTERS, EXPORT_MEDIA_TYPES, export_columns
+from jobs import enqueue, job_worker
+from pagination import MAX_SKIP, SKIP_DESCRIPTION, keyset_page, split_page
+from ratelimit import submit_limiter
+from registry import field_type_registry
+from search import answer_filters, build_answers
+from serialization import APPLICATION_COLUMNS, json_page
+from stats import count_applications
+from uploads import UploadBudget, check_request_size, stage_upload, publish_upload, discard_uploads
+from validation import PDF_SIGNATURE, form_validators
 
 router = APIRouter(prefix="/applications", tags=["applications"])
 
-@router.post("/submit/{form_id}", response_model=ApplicationResponse)
+# Most applications one batch fetch returns; deletes and status updates are not capped
+BATCH_FETCH_LIMIT = 1000
+
+@router.post(
+    "/submit/{form_id}",
+    response_model=ApplicationResponse,
+    dependencies=[Depends(check_request_size)]
+)
 async def submit_application(
     form_id: int,
     form_data: str = FormField(...),  # JSON string of form data
     files: List[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(files)
     # Check if form exists
-    db_form = db.query(Form).filter(Form.id == form_id).first()
+    db_form = await db.scalar(select(Form).where(Form.id == form_id))
     if not db_form:
         raise HTTPException(status_code=404, detail="Form not found")
+    if db_form.closed_at is not None:
+        raise HTTPException(status_code=403, detail="This form no longer accepts applications")
     
     # Parse form data
     try:
@@ -39,33 +62,47 @@ async def submit_application(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid form data JSON")
     
+    # Check the answers and the files' fields against the form's compiled validator
+    await field_type_registry.ensure_fresh(db)
+    validator = form_validators.get(db_form)
+    upload_fields = [file.filename.split("___")[0] for file in files or [] if file.filename]
+    errors = validator.validate(form_data_dict, set(upload_fields))
+    for field_id in upload_fields:
+        if field_id not in validator.file_fields:
+            errors.append(f"Field ID {field_id} does not accept files")
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
+    
     # Process uploaded files
-    if files:
-        for file in files:
-            if file.filename:
-                # Extract field ID from the filename (assuming the field ID is part of the filename)
-                field_id = file.filename.split("___")[0]  # Adjust this logic if field ID is stored differently
-                if not field_id:
-                    raise HTTPException(status_code=400, detail="Invalid file naming convention")
-                
-                # Ensure the field_id exists in form_data_dict
-                if field_id not in form_data_dict:
-                    raise HTTPException(status_code=400, detail=f"Field ID {field_id} does not exist in form data")
-                
-                # Create a sanitized filename
-                sanitized_name = f"{form_id}_{int(time.time())}_{file.filename}"
-                file_location = f"{UPLOAD_DIR}/{sanitized_name}"
-                
-                # Save the file
-                with open(file_location, "wb") as file_object:
-                    shutil.copyfileobj(file.file, file_object)
-                
-                # Append the file path to the existing field ID value
-                existing_value = form_data_dict[field_id]
-                if isinstance(existing_value, list):
-                    existing_value.append(file_location)
-                else:
-                    form_data_dict[field_id] = [existing_value, file_location] if existing_value else [file_location]
+    budget = UploadBudget()
+    staged_files = []
+    try:
+        if files:
+            for file in files:
+                if file.filename:
+                    # Extract field ID from the filename (assuming the field ID is part of the filename)
+                    field_id = file.filename.split("___")[0]  # Adjust this logic if field ID is stored differently
+                    
+                    # Stream the file to a temp file in chunks, hashing it and checking size and file type
+                    staged = await stage_upload(file, budget, signature=validator.signature(field_id))
+                    staged_files.append((field_id, staged))
+                    
+                    # Append the blob reference to the existing field ID value
+                    existing_value = form_data_dict.get(field_id)
+                    if isinstance(existing_value, list):
+                        existing_value.append(blob_ref(staged.sha256))
+                    else:
+                        form_data_dict[field_id] = [existing_value, blob_ref(staged.sha256)] if existing_value else [blob_ref(staged.sha256)]
+        
+        # Publish before the commit, so a committed application never lacks its files;
+        # identical content already stored is reused
+        for _, staged in staged_files:
+            await publish_upload(staged, blob_path(staged.sha256))
+    except BaseException:
+        # Don't leave files from a rejected submission behind; published ones are
+        # shared with other applications or collected by reconcile
+        await discard_uploads([staged for _, staged in staged_files])
+        raise
 
     # Create application
     db_application = Application(
@@ -74,115 +111,394 @@ async def submit_application(
     )
     
     db.add(db_application)
-    db.commit()
-    db.refresh(db_application)
+    await db.flush()
+    # Index the answers and reference the blobs in the same transaction
+    db.add_all(build_answers(db_application, db_form.field_config))
+    await count_applications(db, form_id, [db_application], validator.option_fields)
+    await add_references(db, db_application.id, staged_files)
+    # Heavy per-file work is only queued here and runs in the job worker
+    for blob_id in {staged.sha256 for _, staged in staged_files}:
+        enqueue(db, "scan", db_application.id, {"blob_id": blob_id})
+    for blob_id in {staged.sha256 for field_id, staged in staged_files if validator.signature(field_id) == PDF_SIGNATURE}:
+        enqueue(db, "extract_text", db_application.id, {"blob_id": blob_id})
+    enqueue(db, "notify", db_application.id)
+    await db.commit()
+    await db.refresh(db_application)
+    job_worker.wake()
+    await event_broker.publish(form_id, "created", ids=[db_application.id])
     
     return db_application
 
+@router.get("/submit-stats")
+def submit_limit_stats(current_user: User = Depends(get_current_active_user)):
+    # Accepted vs. shed submissions in this worker, see ratelimit.py
+    return submit_limiter.stats()
+
 @router.get("/form/{form_id}", response_model=List[ApplicationResponse])
-def list_form_applications(
+async def list_form_applications(
     form_id: int,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    skip: int = Query(0, ge=0, le=MAX_SKIP, deprecated=True, description=SKIP_DESCRIPTION),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if form belongs to current user
-    form = db.query(Form).filter(Form.id == form_id, Form.creator_id == current_user.id).first()
+    owned = await db.scalar(select(Form.id).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if owned is None:
+        raise HTTPException(status_code=404, detail="Form not found or access denied")
+    
+    # Keyset pagination on (form_id, created_at, id); pass X-Next-Cursor back as ?cursor=
+    skip = skip if not cursor else 0
+    statement = keyset_page(
+        select(*APPLICATION_COLUMNS).where(Application.form_id == form_id),
+        Application, limit + skip, cursor, created_after, created_before
+    )
+    rows = (await db.execute(statement)).all()
+    # Archived applications are paged the same way and merged in
+    archived = await archived_page(db, form_id, limit + skip, cursor, created_after, created_before)
+    rows = merge_pages(rows, archived, limit + skip)[skip:]
+    
+    # Columns straight to JSON; form_data is copied as stored, not parsed and re-validated
+    return json_page(*split_page(rows, limit))
+
+@router.get("/form/{form_id}/search", response_model=List[ApplicationResponse])
+async def search_form_applications(
+    form_id: int,
+    eq: List[str] = Query([], description="field_id:value, exact match (case-insensitive)"),
+    prefix: List[str] = Query([], description="field_id:value, answer starts with value"),
+    suffix: List[str] = Query([], description="field_id:value, answer ends with value (e.g. an email domain)"),
+    q: Optional[str] = Query(None, description="Full-text query over the answers"),
+    q_field: Optional[str] = Query(None, description="Restrict the full-text query to one field"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found or access denied")
+    
+    # All filters are ANDed; each one resolves through the answers index
+    field_ids = {field["field_id"] for field in form.field_config or []}
+    conditions = answer_filters(form_id, field_ids, eq, prefix, suffix, q, q_field)
+    statement = keyset_page(
+        select(*APPLICATION_COLUMNS).where(Application.form_id == form_id, *conditions),
+        Application, limit, cursor
+    )
+    rows = (await db.execute(statement)).all()
+    
+    return json_page(*split_page(rows, limit))
+
+@router.get("/form/{form_id}/cv-search", response_model=List[CvSearchResult])
+async def search_form_cvs(
+    form_id: int,
+    q: str = Query(..., min_length=1, description="Words that must all appear in the uploaded CV"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found or access denied")
+    
+    # Ranked matches over the text extracted from the form's uploaded PDFs
+    rows = (await db.execute(
+        cv_search_statement(select(Application.id).where(Application.form_id == form_id), q)
+    )).all()
+    matches = best_per_application(rows, skip, limit)
+    applications = {
+        application.id: application
+        for application in await db.scalars(
+            select(Application).where(Application.id.in_([match.application_id for match in matches]))
+        )
+    }
+    return [
+        CvSearchResult(
+            application=ApplicationResponse.model_validate(applications[match.application_id]),
+            field_id=match.field_id,
+            score=match.score,
+            snippet=match.snippet or "",
+        )
+        for match in matches
+        if match.application_id in applications
+    ]
+
+@router.get("/form/{form_id}/export")
+async def export_form_applications(
+    form_id: int,
+    export_format: Literal["csv", "ndjson", "xlsx"] = Query("csv", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
     if not form:
         raise HTTPException(status_code=404, detail="Form not found or access denied")
     
-    applications = (
-        db.query(Application)
-        .filter(Application.form_id == form_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
+    # Rows are streamed from a server-side cursor, so memory use does not grow with the form
+    columns = export_columns(form.field_config)
+    return StreamingResponse(
+        EXPORTERS[export_format](form_id, columns),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="form_{form_id}_applications.{export_format}"'}
     )
+
+@router.get("/form/{form_id}/events")
+async def form_application_events(
+    form_id: int,
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    # Server-Sent Events: created, deleted and status with the applications' ids, or reset to reload the list
+    form_id = await db.scalar(select(Form.id).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if form_id is None:
+        raise HTTPException(status_code=404, detail="Form not found or access denied")
     
-    return applications
+    return StreamingResponse(
+        event_stream(form_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/form/{form_id}/files.zip")
+async def download_form_files(
+    form_id: int,
+    ids: List[int] = Query([], description="Only include these applications"),
+    compression: Literal["auto", "stored", "deflated"] = Query(
+        "auto", description="auto stores PDFs and other compressed formats as-is"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found or access denied")
+    
+    # The archive is assembled on the fly while it is being sent
+    return StreamingResponse(
+        zip_form_uploads(form_id, ids, compression),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="form_{form_id}_files.zip"'}
+    )
+
+def owned_applications(selection: ApplicationSelection, current_user: User):
+    """Ids of the selected applications that belong to the user's forms, as one query."""
+    if not selection.ids and selection.form_id is None:
+        raise HTTPException(status_code=400, detail="Select applications by ids or form_id")
+    statement = (
+        select(Application.id)
+        .join(Form, Form.id == Application.form_id)
+        .where(Form.creator_id == current_user.id)
+    )
+    if selection.ids:
+        statement = statement.where(Application.id.in_(selection.ids))
+    if selection.form_id is not None:
+        statement = statement.where(Application.form_id == selection.form_id)
+    if selection.status is not None:
+        statement = statement.where(Application.status == selection.status)
+    if selection.created_after is not None:
+        statement = statement.where(Application.created_at >= selection.created_after)
+    if selection.created_before is not None:
+        statement = statement.where(Application.created_at < selection.created_before)
+    return statement
+
+def missing_ids(selection: ApplicationSelection, matched) -> List[int]:
+    matched = set(matched)
+    return [id for id in selection.ids or [] if id not in matched]
+
+@router.post("/batch/get", response_model=List[ApplicationResponse])
+async def batch_get_applications(
+    selection: ApplicationSelection,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    statement = (
+        select(*APPLICATION_COLUMNS)
+        .where(Application.id.in_(owned_applications(selection, current_user)))
+        .order_by(Application.created_at, Application.id)
+        .limit(BATCH_FETCH_LIMIT)
+    )
+    return json_page((await db.execute(statement)).all())
+
+@router.post("/batch/delete", response_model=BatchResult)
+async def batch_delete_applications(
+    selection: ApplicationSelection,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    # One ownership check and one transaction for the whole selection
+    owned = (await db.execute(owned_applications(selection, current_user).add_columns(Application.form_id))).all()
+    application_ids = [application_id for application_id, _ in owned]
+    await delete_applications(db, Application.id.in_(application_ids))
+    await db.commit()
+    job_worker.wake()
+    await publish_changes(owned, "deleted")
+    return BatchResult(matched=len(application_ids), missing=missing_ids(selection, application_ids))
+
+@router.post("/batch/status", response_model=BatchResult)
+async def batch_update_status(
+    update_request: ApplicationBatchStatusUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    owned = (await db.execute(owned_applications(update_request, current_user).add_columns(Application.form_id))).all()
+    application_ids = [application_id for application_id, _ in owned]
+    if application_ids:
+        await db.execute(
+            update(Application).where(Application.id.in_(application_ids)).values(status=update_request.new_status)
+        )
+        await db.commit()
+        await publish_changes(owned, "status", status=update_request.new_status)
+    return BatchResult(matched=len(application_ids), missing=missing_ids(update_request, application_ids))
 
 @router.get("/{application_id}", response_model=ApplicationResponse)
-def get_application(
+async def get_application(
     application_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get application with form check for ownership
-    application = (
-        db.query(Application)
+    application = await db.scalar(
+        select(Application)
         .join(Form)
-        .filter(
+        .where(
             Application.id == application_id,
             Form.creator_id == current_user.id
         )
-        .first()
     )
     
+    if not application:
+        # Old applications and those of closed forms are read from the archive
+        application = await find_archived(db, application_id, current_user.id)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found or access denied")
     
     return application
 
+@router.patch("/{application_id}", response_model=ApplicationResponse)
+async def update_application_status(
+    application_id: int,
+    update_request: ApplicationStatusUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    application = await db.scalar(
+        select(Application)
+        .join(Form)
+        .where(
+            Application.id == application_id,
+            Form.creator_id == current_user.id
+        )
+    )
+    if not application:
+        application = await find_archived(db, application_id, current_user.id)
+    if not application:
+        raise HTTPException(status_code=404, detail="Application not found or access denied")
+    
+    application.status = update_request.status
+    await db.commit()
+    await event_broker.publish(application.form_id, "status", ids=[application.id], status=application.status)
+    return application
+
+@router.get("/{application_id}/jobs", response_model=List[JobResponse])
+async def list_application_jobs(
+    application_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    owned = await db.scalar(
+        select(Application.id)
+        .join(Form)
+        .where(
+            Application.id == application_id,
+            Form.creator_id == current_user.id
+        )
+    )
+    if owned is None:
+        # Archiving drops an application's finished jobs
+        if await find_archived(db, application_id, current_user.id):
+            return []
+        raise HTTPException(status_code=404, detail="Application not found or access denied")
+    
+    jobs = await db.scalars(select(Job).where(Job.application_id == application_id).order_by(Job.id))
+    return jobs.all()
+
 @router.get("/{application_id}/download-file/{field_id}")
-def download_file(
+async def download_file(
     application_id: int,
     field_id: str,
-    db: Session = Depends(get_db),
+    index: int = Query(0, ge=0, description="Which file, when the field holds several"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get application with form check for ownership
-    application = (
-        db.query(Application)
+    application = await db.scalar(
+        select(Application)
         .join(Form)
-        .filter(
+        .where(
             Application.id == application_id,
             Form.creator_id == current_user.id
         )
-        .first()
     )
     
+    if not application:
+        application = await find_archived(db, application_id, current_user.id)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found or access denied")
     
-    # Get file path from form_data
-    file_path = application.form_data.get(field_id)
-    if not file_path:
+    # Files come from the application's file rows, and only for the form's file fields
+    form = await db.scalar(select(Form).where(Form.id == application.form_id))
+    await field_type_registry.ensure_fresh(db)
+    if field_id not in form_validators.get(form).file_fields:
         raise HTTPException(status_code=404, detail=f"No file found for field {field_id}")
+    files = (await db.execute(
+        file_references(application.form_id, [field_id], [application.id]).offset(index).limit(1)
+    )).first()
+    if files is None:
+        raise HTTPException(status_code=404, detail=f"No file found for field {field_id}")
+    file_path, filename = stored_blob_path(files.blob_id), files.filename or files.blob_id
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Guess content type based on file extension
-    content_type, _ = mimetypes.guess_type(file_path)
+    # Guess content type based on the original file extension
+    content_type, _ = mimetypes.guess_type(filename)
     if not content_type:
         content_type = "application/octet-stream"
     
+    # FileResponse answers Range/If-Range requests, so interrupted downloads can resume
     return FileResponse(
         path=file_path, 
-        filename=os.path.basename(file_path),
+        filename=filename,
         media_type=content_type
     )
 
 @router.delete("/{id}")
-def delete_application(
+async def delete_application(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get application with form check for ownership
-    application = (
-        db.query(Application)
+    application = (await db.execute(
+        select(Application.id, Application.form_id)
         .join(Form)
-        .filter(
+        .where(
             Application.id == id,
             Form.creator_id == current_user.id
         )
-        .first()
-    )
-    if not application:
-        raise HTTPException(status_code=404, detail="Application not found or access denied")
-    
-    db.delete(application)
-    db.commit()
-    
\ No newline at end of file
+    )).first()
+    if application is not None:
+        await delete_applications(db, Application.id == application.id)
+    else:
+        application = await find_archived(db, id, current_user.id)
+        if application is None:
+            raise HTTPException(status_code=404, detail="Application not found or access denied")
+        await delete_archived_applications(db, ArchivedApplication.id == id)
+    await db.commit()
+    job_worker.wake()
+    await event_broker.publish(application.form_id, "deleted", ids=[id])
@@ -1,63 +1,83 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import case, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from database import get_db
+from database import get_async_db
 from models import User
 from schemas import UserCreate, UserResponse, Token
 from dependencies import (
-    get_password_hash, 
-    verify_password,
     create_access_token,
+    get_current_active_user,
+    auth_cache,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from passwords import password_hasher
 
 router = APIRouter(tags=["authentication"])
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # Check if user exists (one query for both the email and the username)
+    existing = (
+        await db.scalars(
+            select(User).where(or_(User.email == user.email, User.username == user.username)).limit(2)
+        )
+    ).all()
+    if any(db_user.email == user.email for db_user in existing):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+    if existing:
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user (bcrypt runs in the bounded hashing pool)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Try to authenticate with username
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user:
-        # Try with email
-        user = db.query(User).filter(User.email == form_data.username).first()
+    # Authenticate with username or email in one query, preferring a username match
+    user = await db.scalar(
+        select(User)
+        .where(or_(User.username == form_data.username, User.email == form_data.username))
+        .order_by(case((User.username == form_data.username, 0), else_=1))
+        .limit(1)
+    )
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username/email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/auth/cache-stats")
+def auth_cache_stats(current_user: User = Depends(get_current_active_user)):
+    # Hit/miss counters of the token/user cache in this worker
+    return auth_cache.stats()
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import datetime
 
-from database import get_db
+from database import get_async_db
 from models import FieldType, User
 from schemas import FieldTypeCreate, FieldTypeResponse
 from dependencies import get_current_active_user
+from etags import etag_response
+from pagination import MAX_SKIP, NEXT_CURSOR_HEADER, SKIP_DESCRIPTION, keyset_page_in_memory, split_page
+from registry import field_type_registry
 
 router = APIRouter(prefix="/field-types", tags=["field-types"])
 
@@ -26,23 +31,43 @@ router = APIRouter(prefix="/field-types", tags=["field-types"])
 #     return db_field_type
 
 @router.get("/", response_model=List[FieldTypeResponse])
-def list_field_types(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+async def list_field_types(
+    request: Request,
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    skip: int = Query(0, ge=0, le=MAX_SKIP, deprecated=True, description=SKIP_DESCRIPTION),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    field_types = db.query(FieldType).offset(skip).limit(limit).all()
-    return field_types
+    # Served from the in-memory registry; the database is only read on refresh
+    await field_type_registry.ensure_fresh(db)
+    items = field_type_registry.ordered
+    if skip and not cursor:
+        items = items[skip:]
+    page, next_cursor = split_page(
+        keyset_page_in_memory(items, limit, cursor, created_after, created_before), limit
+    )
+    return etag_response(
+        request,
+        field_type_registry.page_body(page),
+        headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None,
+    )
 
 @router.get("/{field_type_id}", response_model=FieldTypeResponse)
-def get_field_type(
+async def get_field_type(
     field_type_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    field_type = db.query(FieldType).filter(FieldType.id == field_type_id).first()
-    if field_type is None:
+    await field_type_registry.ensure_fresh(db)
+    if field_type_registry.get(field_type_id) is None:
         raise HTTPException(status_code=404, detail="Field type not found")
-    return field_type
+    return etag_response(
+        request,
+        field_type_registry.bodies[field_type_id],
+        field_type_registry.etags[field_type_id],
+    )
 
 # Initialization function for default field types - initialization.py
 def create_default_field_types(db: Session):
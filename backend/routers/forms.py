@@ -1,83 +1,175 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import object_session
+from typing import List, Optional
+import datetime
+import os
 
-from database import get_db
-from models import Form, User, FieldType
-from schemas import FormCreate, FormResponse
+from cache import Cache
+from database import get_async_db
+from deletion import delete_applications, delete_archived_applications
+from jobs import job_worker
+from models import Application, ArchivedApplication, Form, User
+from schemas import FormCreate, FormResponse, FormStats
 from dependencies import get_current_active_user
+from etags import etag_response, http_date, make_etag
+from pagination import MAX_SKIP, SKIP_DESCRIPTION, keyset_page, split_page
+from registry import field_type_registry
+from serialization import FORM_COLUMNS, json_page
+from stats import delete_form_stats, form_stats
+from validation import form_validators
 
 router = APIRouter(prefix="/forms", tags=["forms"])
 
+# Serialized public form definitions; CACHE_URL shares them between workers. Without it,
+# a change (close, reopen) only clears the cache of the worker that made it: the others
+# serve the previous definition for up to FORM_CACHE_TTL. Submissions always check the database.
+FORM_CACHE_TTL = int(os.getenv("FORM_CACHE_TTL", 300))
+FORM_CACHE_SIZE = int(os.getenv("FORM_CACHE_SIZE", 10000))
+# How long browsers and proxies may reuse a form without revalidating
+FORM_CACHE_MAX_AGE = int(os.getenv("FORM_CACHE_MAX_AGE", 60))
+form_cache = Cache("form", ttl=FORM_CACHE_TTL, maxsize=FORM_CACHE_SIZE)
+
+@event.listens_for(Form, "after_update")
+@event.listens_for(Form, "after_delete")
+def invalidate_cached_form(mapper, connection, target):
+    form_cache.delete_after_commit(object_session(target), str(target.id))
+
 @router.post("/", response_model=FormResponse)
-def create_form(
+async def create_form(
     form: FormCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    # Validate field types
-    for field in form.field_config:
-        field_type = db.query(FieldType).filter(FieldType.id == field.field_type_id).first()
-        if not field_type:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid field_type_id: {field.field_type_id}"
-            )
-        
-        # Validate options for fields that require them
-        if field_type.has_options and not field.options:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Field '{field.label}' requires options for field type '{field_type.name}'"
-            )
-        elif not field_type.has_options and field.options:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Field '{field.label or 'Unknown'}' does not accept options for field type '{field_type.name or 'Unknown'}'"
-            )
+    # Validate every field against the in-memory field-type registry in one pass
+    await field_type_registry.ensure_fresh(db)
+    errors = field_type_registry.validate_field_config(form.field_config)
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
     
     # Create form
     db_form = Form(
         title=form.title,
         description=form.description,
-        field_config=form.dict()["field_config"],
+        field_config=form.model_dump()["field_config"],
         creator_id=current_user.id
     )
     db.add(db_form)
-    db.commit()
-    db.refresh(db_form)
+    await db.commit()
+    await db.refresh(db_form)
     return db_form
 
 @router.get("/", response_model=List[FormResponse])
-def list_forms(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+async def list_forms(
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    skip: int = Query(0, ge=0, le=MAX_SKIP, deprecated=True, description=SKIP_DESCRIPTION),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    forms = db.query(Form).filter(Form.creator_id == current_user.id).offset(skip).limit(limit).all()
-    return forms
+    statement = keyset_page(
+        select(*FORM_COLUMNS).where(Form.creator_id == current_user.id),
+        Form, limit, cursor, created_after, created_before
+    )
+    if skip and not cursor:
+        statement = statement.offset(skip)
+    rows = (await db.execute(statement)).all()
+    
+    return json_page(*split_page(rows, limit))
 
 @router.get("/{form_id}", response_model=FormResponse)
-def get_form(
+async def get_form(
     form_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    form = db.query(Form).filter(Form.id == form_id).first()
+    # Public and hit on every applicant page load: serve the serialized form from cache
+    cached = await form_cache.get(str(form_id))
+    if cached is None:
+        form = await db.scalar(select(Form).where(Form.id == form_id))
+        if form is None:
+            raise HTTPException(status_code=404, detail="Form not found")
+        body = FormResponse.model_validate(form).model_dump_json()
+        # Closing and reopening change the body too, so not just created_at
+        last_modified = http_date(form.updated_at or form.created_at)
+        cached = {"body": body, "etag": make_etag(body.encode()), "last_modified": last_modified}
+        await form_cache.set(str(form_id), cached)
+    return etag_response(
+        request,
+        cached["body"].encode(),
+        cached["etag"],
+        cache_control=f"public, max-age={FORM_CACHE_MAX_AGE}",
+        last_modified=cached["last_modified"],
+    )
+
+@router.get("/{form_id}/stats", response_model=FormStats)
+async def get_form_stats(
+    form_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
     if form is None:
         raise HTTPException(status_code=404, detail="Form not found")
+    
+    # Read from counters kept up to date on submit/delete, not from the applications
+    await field_type_registry.ensure_fresh(db)
+    option_fields = form_validators.get(form).option_fields
+    return await form_stats(db, form_id, form.field_config, option_fields)
+
+@router.post("/{form_id}/close", response_model=FormResponse)
+async def close_form(
+    form_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if form is None:
+        raise HTTPException(status_code=404, detail="Form not found")
+    
+    # Submissions are refused from now on; `manage.py archive` later moves the applications to cold storage
+    if form.closed_at is None:
+        form.closed_at = datetime.datetime.utcnow()
+        await db.commit()
+    return form
+
+@router.post("/{form_id}/reopen", response_model=FormResponse)
+async def reopen_form(
+    form_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
+    if form is None:
+        raise HTTPException(status_code=404, detail="Form not found")
+    
+    # Already archived applications stay archived; they are still listed and readable
+    if form.closed_at is not None:
+        form.closed_at = None
+        await db.commit()
     return form
 
 @router.delete("/{form_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_form(
+async def delete_form(
     form_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    form = db.query(Form).filter(Form.id == form_id, Form.creator_id == current_user.id).first()
+    form = await db.scalar(select(Form).where(Form.id == form_id, Form.creator_id == current_user.id))
     if form is None:
         raise HTTPException(status_code=404, detail="Form not found")
     
-    db.delete(form)
-    db.commit()
+    # Drop the form's applications with it and collect blobs nobody references anymore;
+    # counters are dropped wholesale below instead of being decremented
+    await delete_applications(db, Application.form_id == form_id, update_stats=False)
+    await delete_archived_applications(db, ArchivedApplication.form_id == form_id, update_stats=False)
+    for statement in delete_form_stats(form_id):
+        await db.execute(statement)
+    await db.delete(form)
+    await db.commit()
+    await form_cache.delete(str(form_id))
+    job_worker.wake()
     return None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Dict, List, Optional, Any
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from typing import Dict, List, Literal, Optional, Any
 import datetime
 
 # User schemas
@@ -15,8 +15,7 @@ class UserResponse(UserBase):
     is_active: bool
     created_at: datetime.datetime
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # FieldType Schemas
@@ -32,8 +31,7 @@ class FieldTypeResponse(FieldTypeBase):
     id: int
     created_at: datetime.datetime
     
-    class Config:
-        from_attributes = True  # Using the new Pydantic v2 attribute instead of orm_mode
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Update FormField class in schemas.py
@@ -56,9 +54,19 @@ class FormResponse(FormBase):
     id: int
     creator_id: int
     created_at: datetime.datetime
+    closed_at: Optional[datetime.datetime] = None  # Set once the form stops taking applications
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class DailyCount(BaseModel):
+    day: datetime.date
+    count: int
+
+class FormStats(BaseModel):
+    form_id: int
+    total: int
+    daily: List[DailyCount]
+    options: Dict[str, Dict[str, int]]  # field_id -> option -> applications that chose it
 
 # Application schemas
 class ApplicationCreate(BaseModel):
@@ -66,16 +74,57 @@ class ApplicationCreate(BaseModel):
     # applicant_name: str
     # applicant_email: EmailStr
 
+ApplicationStatus = Literal["pending", "reviewed", "accepted", "rejected"]
+
 class ApplicationResponse(BaseModel):
     id: int
     form_id: int
     # applicant_name: str
     # applicant_email: str
     form_data: Dict[str, Any]
+    status: str = "pending"
+    created_at: datetime.datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class ApplicationSelection(BaseModel):
+    """Applications picked by id, by filter, or both (conditions are ANDed)."""
+    ids: Optional[List[int]] = Field(None, max_length=1000)
+    form_id: Optional[int] = None
+    status: Optional[ApplicationStatus] = None
+    created_after: Optional[datetime.datetime] = None
+    created_before: Optional[datetime.datetime] = None
+
+class ApplicationStatusUpdate(BaseModel):
+    status: ApplicationStatus
+
+class ApplicationBatchStatusUpdate(ApplicationSelection):
+    new_status: ApplicationStatus
+
+class BatchResult(BaseModel):
+    matched: int
+    missing: List[int] = []  # Requested ids that don't exist or belong to someone else
+
+class CvSearchResult(BaseModel):
+    application: ApplicationResponse
+    field_id: str
+    score: float
+    snippet: str
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    application_id: Optional[int] = None
+    status: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    result: Optional[Any] = None
     created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Token schemas
 class Token(BaseModel):
@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, text
+
+from database import engine
+from models import Application, ApplicationAnswer
+
+# Longest value kept in the equality/prefix columns; full values stay searchable through FTS
+MAX_NORM_LENGTH = 255
+
+FTS_ENABLED = engine.dialect.name == "sqlite"
+
+
+def normalize(value: str) -> str:
+    return value.strip().lower()[:MAX_NORM_LENGTH]
+
+
+def answer_rows(application_id: int, form_id: int, form_data, field_config: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Index rows (as dicts) for every scalar answer in ``form_data``.
+
+    Only fields declared in the form's ``field_config`` are indexed. Uploaded
+    files are stored as lists of references and are skipped.
+    """
+    rows = []
+    form_data = form_data or {}
+    for field in field_config or []:
+        value = form_data.get(field["field_id"])
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        if value is None or isinstance(value, (list, dict)):
+            continue
+        value = str(value)
+        if not value.strip():
+            continue
+        norm = normalize(value)
+        rows.append({
+            "application_id": application_id,
+            "form_id": form_id,
+            "field_id": field["field_id"],
+            "value": value,
+            "value_norm": norm,
+            "value_rev": norm[::-1],
+        })
+    return rows
+
+
+def build_answers(application: Application, field_config: List[Dict[str, Any]]) -> List[ApplicationAnswer]:
+    return [
+        ApplicationAnswer(**row)
+        for row in answer_rows(application.id, application.form_id, application.form_data, field_config)
+    ]
+
+
+def delete_answers(application_ids):
+    return delete(ApplicationAnswer).where(ApplicationAnswer.application_id.in_(application_ids))
+
+
+def parse_filter(raw: str, field_ids) -> tuple:
+    field_id, sep, value = raw.partition(":")
+    if not sep or not value:
+        raise HTTPException(status_code=400, detail=f"Filter '{raw}' must look like field_id:value")
+    if field_id not in field_ids:
+        raise HTTPException(status_code=400, detail=f"Unknown field_id: {field_id}")
+    return field_id, normalize(value)
+
+
+def _prefix_range(column, prefix: str):
+    # A range instead of LIKE so SQLite can use the (form_id, field_id, value) index
+    return (column >= prefix, column < prefix + "\uffff")
+
+
+def fts_query(q: str) -> str:
+    # Quote every term so user input cannot inject FTS5 syntax; terms are ANDed
+    terms = [term.replace('"', '""') for term in q.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def answer_filters(
+    form_id: int,
+    field_ids,
+    eq: List[str],
+    prefix: List[str],
+    suffix: List[str],
+    q: Optional[str] = None,
+    q_field: Optional[str] = None,
+):
+    """Return ``Application.id IN (...)`` conditions, one per filter."""
+    conditions = []
+    for raw in eq:
+        field_id, value = parse_filter(raw, field_ids)
+        conditions.append(select(ApplicationAnswer.application_id).where(
+            ApplicationAnswer.form_id == form_id,
+            ApplicationAnswer.field_id == field_id,
+            ApplicationAnswer.value_norm == value,
+        ))
+    for raw in prefix:
+        field_id, value = parse_filter(raw, field_ids)
+        conditions.append(select(ApplicationAnswer.application_id).where(
+            ApplicationAnswer.form_id == form_id,
+            ApplicationAnswer.field_id == field_id,
+            *_prefix_range(ApplicationAnswer.value_norm, value),
+        ))
+    for raw in suffix:
+        field_id, value = parse_filter(raw, field_ids)
+        conditions.append(select(ApplicationAnswer.application_id).where(
+            ApplicationAnswer.form_id == form_id,
+            ApplicationAnswer.field_id == field_id,
+            *_prefix_range(ApplicationAnswer.value_rev, value[::-1]),
+        ))
+    if q and q.strip():
+        if q_field is not None and q_field not in field_ids:
+            raise HTTPException(status_code=400, detail=f"Unknown field_id: {q_field}")
+        statement = select(ApplicationAnswer.application_id).where(ApplicationAnswer.form_id == form_id)
+        if q_field is not None:
+            statement = statement.where(ApplicationAnswer.field_id == q_field)
+        if FTS_ENABLED:
+            statement = statement.where(
+                ApplicationAnswer.id.in_(
+                    select(text("rowid")).select_from(text("application_answers_fts")).where(
+                        text("application_answers_fts MATCH :fts_query").bindparams(fts_query=fts_query(q))
+                    )
+                )
+            )
+        else:
+            for term in q.split():
+                statement = statement.where(ApplicationAnswer.value.ilike(f"%{term}%"))
+        conditions.append(statement)
+    return [Application.id.in_(condition) for condition in conditions]
@@ -0,0 +1,58 @@
+from typing import Optional, Sequence
+
+import orjson
+from fastapi import Response
+from sqlalchemy import Text, type_coerce
+
+from models import Application, Form
+from pagination import NEXT_CURSOR_HEADER
+
+
+def raw_json(column):
+    """Select a JSON column as its stored text, so it can be copied into a response unparsed."""
+    return type_coerce(column, Text).label(column.key)
+
+
+# Column-only selects in the field order of ApplicationResponse / FormResponse
+APPLICATION_COLUMNS = (
+    Application.id, Application.form_id, raw_json(Application.form_data), Application.status, Application.created_at,
+)
+FORM_COLUMNS = (
+    Form.title, Form.description, raw_json(Form.field_config), Form.id, Form.creator_id, Form.created_at,
+    Form.closed_at,
+)
+RAW_JSON_FIELDS = frozenset({"form_data", "field_config"})
+
+
+def _encode_raw(value) -> bytes:
+    if value is None:
+        return b"null"
+    if isinstance(value, str):
+        return value.encode()
+    return orjson.dumps(value)  # Drivers that decode JSON columns themselves
+
+
+def encode_rows(rows: Sequence) -> bytes:
+    """JSON array of ``rows`` (from a column-only select) without building models.
+
+    Columns named in ``RAW_JSON_FIELDS`` hold JSON text and are spliced in as-is;
+    everything else goes through orjson, which formats datetimes like Pydantic.
+    """
+    if not rows:
+        return b"[]"
+    keys = rows[0]._fields
+    prefixes = [orjson.dumps(key) + b":" for key in keys]
+    raw = [key in RAW_JSON_FIELDS for key in keys]
+    dumps = orjson.dumps
+    objects = []
+    for row in rows:
+        objects.append(b"{" + b",".join(
+            prefix + (_encode_raw(value) if is_raw else dumps(value))
+            for prefix, is_raw, value in zip(prefixes, raw, row)
+        ) + b"}")
+    return b"[" + b",".join(objects) + b"]"
+
+
+def json_page(rows: Sequence, next_cursor: Optional[str] = None) -> Response:
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=encode_rows(rows), media_type="application/json", headers=headers)
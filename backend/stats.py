@@ -0,0 +1,136 @@
+import datetime
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Application, ApplicationAnswer, ArchivedApplication, FormDailyCount, FormOptionCount, FormStat
+
+
+def _selected_options(form_data, option_fields: List[str]) -> List[Tuple[str, str]]:
+    form_data = form_data or {}
+    return [
+        (field_id, form_data[field_id])
+        for field_id in option_fields
+        if isinstance(form_data.get(field_id), str) and form_data[field_id]
+    ]
+
+
+def _counter_upserts(dialect_name: str, form_id: int, days: Counter, options: Counter, total: int):
+    insert = dialect_insert(dialect_name)
+    statements = [
+        insert(FormStat).values(form_id=form_id, total=total).on_conflict_do_update(
+            index_elements=[FormStat.form_id], set_={"total": FormStat.total + total}
+        )
+    ]
+    for day, count in days.items():
+        statements.append(
+            insert(FormDailyCount).values(form_id=form_id, day=day, count=count).on_conflict_do_update(
+                index_elements=[FormDailyCount.form_id, FormDailyCount.day],
+                set_={"count": FormDailyCount.count + count},
+            )
+        )
+    for (field_id, option), count in options.items():
+        statements.append(
+            insert(FormOptionCount).values(form_id=form_id, field_id=field_id, option=option, count=count)
+            .on_conflict_do_update(
+                index_elements=[FormOptionCount.form_id, FormOptionCount.field_id, FormOptionCount.option],
+                set_={"count": FormOptionCount.count + count},
+            )
+        )
+    return statements
+
+
+async def count_applications(db, form_id: int, applications: Iterable, option_fields: List[str], sign: int = 1):
+    """Add (``sign=1``) or remove (``sign=-1``) applications from a form's counters.
+
+    ``applications`` need ``created_at`` and ``form_data``. Runs in the caller's
+    transaction, so the counters change exactly when the applications do.
+    """
+    days, options, total = Counter(), Counter(), 0
+    for application in applications:
+        total += sign
+        days[(application.created_at or datetime.datetime.utcnow()).date()] += sign
+        for key in _selected_options(application.form_data, option_fields):
+            options[key] += sign
+    if not total:
+        return
+    for statement in _counter_upserts(db.bind.dialect.name, form_id, days, options, total):
+        await db.execute(statement)
+
+
+def delete_form_stats(form_id: int):
+    return [
+        delete(model).where(model.form_id == form_id)
+        for model in (FormStat, FormDailyCount, FormOptionCount)
+    ]
+
+
+async def form_stats(db, form_id: int, field_config, option_fields: List[str]) -> dict:
+    """Counters of one form; reads O(days + options) rows, never the applications."""
+    total = await db.scalar(select(FormStat.total).where(FormStat.form_id == form_id))
+    daily = (await db.execute(
+        select(FormDailyCount.day, FormDailyCount.count)
+        .where(FormDailyCount.form_id == form_id, FormDailyCount.count > 0)
+        .order_by(FormDailyCount.day)
+    )).all()
+    counted = (await db.execute(
+        select(FormOptionCount.field_id, FormOptionCount.option, FormOptionCount.count)
+        .where(FormOptionCount.form_id == form_id)
+    )).all()
+    # Every configured option appears, including those nobody picked yet
+    options = {
+        field["field_id"]: {option: 0 for option in field.get("options") or []}
+        for field in field_config or []
+        if field["field_id"] in option_fields
+    }
+    for field_id, option, count in counted:
+        if field_id in options and count > 0:
+            options[field_id][option] = count
+    return {
+        "form_id": form_id,
+        "total": total or 0,
+        "daily": [{"day": day, "count": count} for day, count in daily],
+        "options": options,
+    }
+
+
+def rebuild_form_stats(db: Session, form_id: int, option_fields: List[str]):
+    """Recompute a form's counters from its applications (totals) and answers index (options).
+
+    Archived applications count too; they left the answers index, so their
+    options are read from their compressed answers.
+    """
+    for statement in delete_form_stats(form_id):
+        db.execute(statement)
+    days = Counter()
+    for model in (Application, ArchivedApplication):
+        day = func.date(model.created_at)
+        days.update({
+            datetime.date.fromisoformat(str(value)): count
+            for value, count in db.execute(
+                select(day, func.count()).where(model.form_id == form_id).group_by(day)
+            ).all()
+        })
+    options = Counter()
+    if option_fields:
+        options.update({
+            (field_id, value): count
+            for field_id, value, count in db.execute(
+                select(ApplicationAnswer.field_id, ApplicationAnswer.value, func.count())
+                .where(ApplicationAnswer.form_id == form_id, ApplicationAnswer.field_id.in_(option_fields))
+                .group_by(ApplicationAnswer.field_id, ApplicationAnswer.value)
+            ).all()
+        })
+        archived = db.scalars(
+            select(ArchivedApplication).where(ArchivedApplication.form_id == form_id).execution_options(yield_per=1000)
+        )
+        for application in archived:
+            options.update(_selected_options(application.form_data, option_fields))
+    total = sum(days.values())
+    if total:
+        for statement in _counter_upserts(db.bind.dialect.name, form_id, days, options, total):
+            db.execute(statement)
+    return total
@@ -0,0 +1,54 @@
+import time
+import zipfile
+from typing import Optional
+
+
+class _Sink:
+    """Write-only buffer handed to ZipFile.
+
+    It deliberately has no tell()/seek(), so ZipFile writes data descriptors
+    after each member instead of seeking back to patch local headers. That is
+    what lets the archive be produced front to back and streamed as it grows.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """Build a ZIP archive incrementally; call ``drain()`` to take the bytes produced so far."""
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w", allowZip64=True)
+
+    def open(self, name: str, compress_type: int = zipfile.ZIP_DEFLATED, size: Optional[int] = None):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = compress_type
+        info.external_attr = 0o644 << 16
+        force_zip64 = size is not None and size >= zipfile.ZIP64_LIMIT
+        return self._zip.open(info, mode="w", force_zip64=force_zip64)
+
+    def writestr(self, name: str, data: bytes, compress_type: int = zipfile.ZIP_DEFLATED):
+        with self.open(name, compress_type, len(data)) as member:
+            member.write(data)
+
+    def drain(self) -> bytes:
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the remaining bytes."""
+        self._zip.close()
+        return self._sink.drain()
@@ -0,0 +1,92 @@
+"""Post-submission job handlers. They run in the job worker, never in a request."""
+import datetime
+import logging
+import os
+import shlex
+import smtplib
+import subprocess
+from email.message import EmailMessage
+
+from sqlalchemy import select
+
+from blobs import PUBLISH_GRACE_SECONDS, stored_blob_path, unlink_blobs
+from cv_text import index_blob_text
+from database import SessionLocal
+from jobs import enqueue, job_handler
+from models import Application, Form, User
+
+logger = logging.getLogger(__name__)
+
+# e.g. "clamdscan --no-summary --fdpass"; the file path is appended
+VIRUS_SCAN_COMMAND = os.getenv("VIRUS_SCAN_COMMAND")
+VIRUS_SCAN_TIMEOUT = int(os.getenv("VIRUS_SCAN_TIMEOUT", 120))
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
+MAIL_FROM = os.getenv("MAIL_FROM", "no-reply@localhost")
+
+
+@job_handler("scan", concurrency=2, max_attempts=5, priority=10)
+def scan_upload(application_id, payload):
+    """Run the configured virus scanner over one stored upload."""
+    if not VIRUS_SCAN_COMMAND:
+        return {"scanned": False}
+    path = stored_blob_path(payload["blob_id"])
+    if not os.path.exists(path):
+        # Removed or moved to cold storage meanwhile; retried with backoff
+        raise FileNotFoundError(path)
+    completed = subprocess.run(
+        shlex.split(VIRUS_SCAN_COMMAND) + [path],
+        capture_output=True, text=True, timeout=VIRUS_SCAN_TIMEOUT,
+    )
+    # ClamAV convention: 0 clean, 1 infected, anything else is an error worth retrying
+    if completed.returncode not in (0, 1):
+        raise RuntimeError(f"Scanner exited with {completed.returncode}: {completed.stderr.strip()}")
+    infected = completed.returncode == 1
+    if infected:
+        logger.warning("Upload %s of application %s is infected", payload["blob_id"], application_id)
+    return {"scanned": True, "infected": infected, "output": completed.stdout.strip()[-1000:]}
+
+
+@job_handler("extract_text", concurrency=2, max_attempts=5)
+def extract_cv_text(application_id, payload):
+    """Add an uploaded PDF's text to the CV search index (cached by content hash)."""
+    return index_blob_text(payload["blob_id"])
+
+
+@job_handler("remove_blobs", concurrency=1, max_attempts=5, priority=-10)
+def remove_blob_files(application_id, payload):
+    """Unlink the files of a batch of blobs deleted together with their last application."""
+    unlinked = unlink_blobs(payload["blob_ids"])
+    if unlinked.deferred:
+        # Stored again by a submission that may still commit; look at them once it surely has
+        with SessionLocal() as db:
+            job = enqueue(db, "remove_blobs", payload={"blob_ids": unlinked.deferred})
+            job.run_after += datetime.timedelta(seconds=PUBLISH_GRACE_SECONDS)
+            db.commit()
+    return {"removed": unlinked.removed, "deferred": len(unlinked.deferred)}
+
+
+@job_handler("notify", concurrency=1, max_attempts=5)
+def notify_form_owner(application_id, payload):
+    """Email the form's creator about a new application."""
+    with SessionLocal() as db:
+        row = db.execute(
+            select(Form.id, Form.title, User.email)
+            .join(Application, Application.form_id == Form.id)
+            .join(User, User.id == Form.creator_id)
+            .where(Application.id == application_id)
+        ).first()
+    if row is None:
+        return {"sent": False}
+    form_id, title, email = row
+    if not SMTP_HOST:
+        logger.info("New application %s for form %s (SMTP_HOST not set, no email sent)", application_id, form_id)
+        return {"sent": False}
+    message = EmailMessage()
+    message["Subject"] = f"New application for {title}"
+    message["From"] = MAIL_FROM
+    message["To"] = email
+    message.set_content(f"Application #{application_id} was submitted to your form \"{title}\".")
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        smtp.send_message(message)
+    return {"sent": True}
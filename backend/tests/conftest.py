@@ -0,0 +1,75 @@
+"""Shared fixtures: one migrated SQLite database in a scratch directory per test session."""
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings are read, and app.db and static/ resolved, when the app modules are first imported
+WORKDIR = tempfile.mkdtemp(prefix="submissions-manager-tests-")
+os.chdir(WORKDIR)
+os.makedirs("static")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'app.db')}",
+    "BCRYPT_ROUNDS": "4",
+    "PASSWORD_HASH_WORKERS": "0",
+    "PDF_TEXT_WORKERS": "0",
+    "JOB_WORKERS": "0",  # Tests run the jobs they care about themselves
+    "SUBMIT_RATE_PER_IP": "0",  # test_ratelimit.py sets its own limits
+    "SUBMIT_RATE_PER_FORM": "0",
+})
+for name in ("ASYNC_DATABASE_URL", "CACHE_URL", "RATE_LIMIT_URL", "EVENTS_URL", "METRICS_TOKEN"):
+    os.environ.pop(name, None)
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    import migrations
+    from fastapi.testclient import TestClient
+
+    migrations.migrate()
+    import main
+
+    # Entering the client runs the lifespan, which also disposes the async engine at the end
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    client.post("/register", json={"email": "owner@example.com", "username": "owner", "password": "secret"})
+    response = client.post("/token", data={"username": "owner", "password": "secret"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def field_type_ids(client):
+    return {field_type["name"]: field_type["id"] for field_type in client.get("/field-types/").json()}
+
+
+@pytest.fixture
+def make_form(client, auth_headers, field_type_ids):
+    """Create a form with a required ``name`` text field and an optional ``cv`` PDF field."""
+    def make(title="Applications"):
+        response = client.post("/forms/", headers=auth_headers, json={"title": title, "field_config": [
+            {"field_id": "name", "field_type_id": field_type_ids["Text"], "label": "Name", "required": True},
+            {"field_id": "cv", "field_type_id": field_type_ids["PDF"], "label": "CV"},
+        ]})
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return make
+
+
+@pytest.fixture
+def submit(client):
+    """Submit an application to a form made by ``make_form``, optionally with a CV."""
+    def submit(form_id, name="Applicant", cv=None):
+        files = [("files", ("cv___cv.pdf", cv, "application/pdf"))] if cv is not None else None
+        return client.post(
+            f"/applications/submit/{form_id}", data={"form_data": json.dumps({"name": name})}, files=files
+        )
+    return submit
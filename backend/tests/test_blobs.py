@@ -0,0 +1,71 @@
+import datetime
+import os
+import uuid
+
+from sqlalchemy import select
+
+import tasks
+from blobs import blob_path, unlink_blobs
+from database import SessionLocal
+from models import ApplicationFile, Blob, Job
+
+
+def blob_of(application_id):
+    with SessionLocal() as db:
+        return db.scalar(select(ApplicationFile.blob_id).where(ApplicationFile.application_id == application_id))
+
+
+def refcount(blob_id):
+    with SessionLocal() as db:
+        return db.scalar(select(Blob.refcount).where(Blob.id == blob_id))
+
+
+def removal_jobs(blob_id):
+    with SessionLocal() as db:
+        queued = db.scalars(select(Job).where(Job.kind == "remove_blobs", Job.status == "queued")).all()
+        return [job for job in queued if blob_id in job.payload["blob_ids"]]
+
+
+def test_shared_file_is_unlinked_after_its_last_application_is_deleted(client, auth_headers, make_form, submit):
+    form_id = make_form()
+    cv = b"%PDF-1.4 " + uuid.uuid4().hex.encode()
+    first, second = (submit(form_id, cv=cv).json()["id"] for _ in range(2))
+    blob_id = blob_of(first)
+    assert blob_of(second) == blob_id
+    assert refcount(blob_id) == 2
+
+    assert client.delete(f"/applications/{first}", headers=auth_headers).status_code == 200
+    assert refcount(blob_id) == 1
+    assert os.path.exists(blob_path(blob_id))
+    assert removal_jobs(blob_id) == []
+
+    assert client.delete(f"/applications/{second}", headers=auth_headers).status_code == 200
+    assert refcount(blob_id) is None
+    [job] = removal_jobs(blob_id)
+
+    # Just published, so it might belong to a submission about to commit: checked again later
+    assert tasks.remove_blob_files(None, job.payload) == {"removed": 0, "deferred": 1}
+    assert os.path.exists(blob_path(blob_id))
+    [retry] = [later for later in removal_jobs(blob_id) if later.id != job.id]
+    assert retry.run_after > datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+
+    assert unlink_blobs([blob_id], grace_seconds=0).removed == 1
+    assert not os.path.exists(blob_path(blob_id))
+    assert client.get(f"/applications/{second}", headers=auth_headers).status_code == 404
+
+
+def test_file_stored_again_before_the_unlink_is_kept(client, auth_headers, make_form, submit):
+    form_id = make_form()
+    cv = b"%PDF-1.4 " + uuid.uuid4().hex.encode()
+    deleted = submit(form_id, cv=cv).json()["id"]
+    blob_id = blob_of(deleted)
+    assert client.delete(f"/applications/{deleted}", headers=auth_headers).status_code == 200
+
+    resubmitted = submit(form_id, cv=cv).json()["id"]
+    assert blob_of(resubmitted) == blob_id
+
+    assert unlink_blobs([blob_id], grace_seconds=0).removed == 0
+    assert refcount(blob_id) == 1
+    response = client.get(f"/applications/{resubmitted}/download-file/cv", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == cv
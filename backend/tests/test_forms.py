@@ -0,0 +1,28 @@
+def test_unchanged_form_is_not_sent_again(client, make_form):
+    form_id = make_form()
+    first = client.get(f"/forms/{form_id}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"].startswith("public")
+
+    cached = client.get(f"/forms/{form_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    assert client.get(f"/forms/{form_id}", headers={"If-None-Match": '"stale"'}).status_code == 200
+    since = client.get(f"/forms/{form_id}", headers={"If-Modified-Since": first.headers["last-modified"]})
+    assert since.status_code == 304
+
+
+def test_closing_a_form_changes_its_etag(client, auth_headers, make_form):
+    form_id = make_form()
+    etag = client.get(f"/forms/{form_id}").headers["etag"]
+
+    assert client.post(f"/forms/{form_id}/close", headers=auth_headers).status_code == 200
+
+    # The cached body was dropped when the close committed
+    response = client.get(f"/forms/{form_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["closed_at"] is not None
@@ -0,0 +1,88 @@
+import datetime
+import time
+
+import pytest
+from sqlalchemy import update
+
+import jobs
+from database import SessionLocal
+from jobs import DONE, FAILED, JOB_RETRY_DELAY, QUEUED, JobHandler, JobWorker, enqueue
+from models import Job
+
+
+def wait_for(job_id, condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            if condition(job):
+                return job
+        assert time.monotonic() < deadline, f"job {job_id} stuck in {job.status} after {job.attempts} attempts"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def worker(client, monkeypatch):
+    # Only the test's handlers, so jobs queued by other tests are left alone
+    monkeypatch.setattr(jobs, "handlers", {})
+    worker = JobWorker(workers=1, mode="thread")
+    worker.start()
+    yield worker
+    worker.stop()
+
+
+def queue(kind, function, max_attempts):
+    jobs.handlers[kind] = JobHandler(function, concurrency=1, max_attempts=max_attempts, priority=0)
+    with SessionLocal() as db:
+        job = enqueue(db, kind, payload={"value": 21})
+        db.commit()
+        return job.id
+
+
+def run_now(worker, job_id):
+    # Skip the backoff instead of sleeping through it
+    with SessionLocal() as db:
+        db.execute(update(Job).where(Job.id == job_id).values(run_after=datetime.datetime.utcnow()))
+        db.commit()
+    worker.wake()
+
+
+def test_failed_job_is_retried_with_exponential_backoff(worker):
+    calls = []
+
+    def flaky(application_id, payload):
+        calls.append(payload)
+        if len(calls) < 3:
+            raise RuntimeError(f"attempt {len(calls)} failed")
+        return {"doubled": payload["value"] * 2}
+
+    job_id = queue("flaky", flaky, max_attempts=3)
+    worker.wake()
+    for attempt in (1, 2):
+        job = wait_for(job_id, lambda job: job.attempts == attempt and job.status == QUEUED)
+        assert f"attempt {attempt} failed" in job.last_error
+        # Retried after 5s, then 10s...
+        delay = (job.run_after - datetime.datetime.utcnow()).total_seconds()
+        assert JOB_RETRY_DELAY * 2 ** (attempt - 1) - 2 < delay <= JOB_RETRY_DELAY * 2 ** (attempt - 1)
+        run_now(worker, job_id)
+
+    job = wait_for(job_id, lambda job: job.status == DONE)
+    assert job.attempts == 3
+    assert job.result == {"doubled": 42}
+    assert job.last_error is None
+    assert job.finished_at is not None
+
+
+def test_job_fails_once_its_attempts_are_used_up(worker):
+    def broken(application_id, payload):
+        raise ValueError("always broken")
+
+    job_id = queue("broken", broken, max_attempts=2)
+    worker.wake()
+    wait_for(job_id, lambda job: job.attempts == 1 and job.status == QUEUED)
+    run_now(worker, job_id)
+
+    job = wait_for(job_id, lambda job: job.status == FAILED)
+    assert job.attempts == 2
+    assert "ValueError: always broken" in job.last_error
+    assert job.finished_at is not None
@@ -0,0 +1,115 @@
+import json
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import models  # noqa: F401  Registers the tables
+from blobs import blob_path
+from database import Base
+from migrations import LATEST_VERSION, MIGRATIONS, current_version, migrate
+
+# The schema of the app.db shipped before migrations existed, as create_all() made it then
+LEGACY_SCHEMA = (
+    "CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR, username VARCHAR, hashed_password VARCHAR, "
+    "is_active BOOLEAN, created_at DATETIME, PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    "CREATE TABLE forms (id INTEGER NOT NULL, title VARCHAR, description TEXT, field_config JSON, "
+    "creator_id INTEGER, created_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(creator_id) REFERENCES users (id))",
+    "CREATE INDEX ix_forms_id ON forms (id)",
+    "CREATE INDEX ix_forms_title ON forms (title)",
+    "CREATE TABLE applications (id INTEGER NOT NULL, form_id INTEGER, applicant_name VARCHAR, "
+    "applicant_email VARCHAR, form_data JSON, resume_path VARCHAR, created_at DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(form_id) REFERENCES forms (id))",
+    "CREATE INDEX ix_applications_id ON applications (id)",
+    "CREATE TABLE field_types (id INTEGER NOT NULL, name VARCHAR, description VARCHAR, has_options BOOLEAN, "
+    "created_at DATETIME, PRIMARY KEY (id))",
+    "CREATE INDEX ix_field_types_id ON field_types (id)",
+    "CREATE UNIQUE INDEX ix_field_types_name ON field_types (name)",
+)
+
+
+@pytest.fixture
+def database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    yield engine
+    engine.dispose()
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        name: (
+            {column["name"]: (str(column["type"]), column["nullable"]) for column in inspector.get_columns(name)},
+            {index["name"]: (index["column_names"], bool(index["unique"])) for index in inspector.get_indexes(name)},
+        )
+        for name in inspector.get_table_names() if name not in ("schema_version", "sqlite_sequence")
+    }
+
+
+def assert_matches_models(engine):
+    reference = create_engine("sqlite://")
+    Base.metadata.create_all(bind=reference)
+    try:
+        assert schema(engine) == schema(reference)
+    finally:
+        reference.dispose()
+    with engine.connect() as connection:
+        ddl = connection.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'applications'"))
+    assert "AUTOINCREMENT" in ddl
+
+
+def test_fresh_database_gets_the_schema_of_the_models(database):
+    assert [applied.version for applied in migrate(database)] == [pending.version for pending in MIGRATIONS]
+    assert_matches_models(database)
+    assert migrate(database) == []
+
+
+def test_legacy_app_db_is_upgraded(database):
+    upload = f"static/uploads/394065_1743795657_cv___{uuid.uuid4().hex}.pdf"
+    os.makedirs(os.path.dirname(upload), exist_ok=True)
+    with open(upload, "wb") as file:
+        file.write(b"%PDF-1.4 legacy upload")
+    field_config = [
+        {"field_id": "name", "field_type_id": 1, "label": "Name", "required": True},
+        {"field_id": "cv", "field_type_id": 5, "label": "CV"},
+    ]
+    with database.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        for id, name in enumerate(("Text", "LargeText", "Email", "Select", "PDF"), start=1):
+            connection.execute(text("INSERT INTO field_types (id, name, has_options) VALUES (:id, :name, :options)"),
+                               {"id": id, "name": name, "options": name == "Select"})
+        connection.execute(text("INSERT INTO users (id, username, email, is_active) "
+                                "VALUES (1, 'old', 'old@example.com', 1)"))
+        connection.execute(text("INSERT INTO forms (id, title, field_config, creator_id, created_at) "
+                                "VALUES (394065, 'Bootcamp', :config, 1, '2025-04-04 18:00:00')"),
+                           {"config": json.dumps(field_config)})
+        connection.execute(text("INSERT INTO applications (id, form_id, form_data, created_at) "
+                                "VALUES (9, 394065, :data, '2025-04-04 19:54:17')"),
+                           {"data": json.dumps({"name": "Old applicant", "cv": [upload]})})
+
+    with database.connect() as connection:
+        assert current_version(connection) == 0
+    migrate(database)
+
+    with database.connect() as connection:
+        assert current_version(connection) == LATEST_VERSION
+        row = connection.execute(text("SELECT form_data, status FROM applications WHERE id = 9")).one()
+        files = connection.execute(text("SELECT blob_id, filename FROM application_files")).all()
+        field_types = connection.scalar(text("SELECT count(*) FROM field_types"))
+        next_id = connection.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = 'applications'"))
+    form_data = json.loads(row.form_data)
+    assert form_data["name"] == "Old applicant"
+    assert row.status == "pending"
+    # The upload was adopted by the blob store and is referenced by hash now
+    [(blob_id, filename)] = files
+    assert form_data["cv"] == [f"blob:{blob_id}"]
+    assert filename == os.path.basename(upload).split("___", 1)[1]
+    assert os.path.exists(blob_path(blob_id))
+    assert field_types == 5  # Not seeded a second time
+    assert next_id == 9
+    assert_matches_models(database)
@@ -0,0 +1,33 @@
+import datetime
+
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime.datetime(2025, 4, 4, 18, 30, 12, 345678)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_following_cursors_lists_every_application_once(client, auth_headers, make_form, submit):
+    form_id = make_form()
+    submitted = [submit(form_id, name=f"Applicant {number}").json()["id"] for number in range(7)]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/applications/form/{form_id}", headers=auth_headers, params=params)
+        assert response.status_code == 200
+        seen += [application["id"] for application in response.json()]
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert seen == submitted
+    assert pages == 3
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers, make_form):
+    form_id = make_form()
+    response = client.get(f"/applications/form/{form_id}", headers=auth_headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
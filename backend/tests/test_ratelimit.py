@@ -0,0 +1,73 @@
+import ipaddress
+
+import pytest
+
+import ratelimit
+from ratelimit import AdmissionControl, MemoryBuckets, client_address, submit_limiter
+
+PROXIES = [ipaddress.ip_network("10.0.0.0/8")]
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Fresh buckets; the test then sets the limits it exercises."""
+    monkeypatch.setattr(submit_limiter, "buckets", MemoryBuckets())
+
+    def set_limits(per_ip=(0, 0), per_form=(0, 0)):
+        monkeypatch.setattr(ratelimit, "SUBMIT_RATE_PER_IP", per_ip[0])
+        monkeypatch.setattr(ratelimit, "SUBMIT_BURST_PER_IP", per_ip[1])
+        monkeypatch.setattr(ratelimit, "SUBMIT_RATE_PER_FORM", per_form[0])
+        monkeypatch.setattr(ratelimit, "SUBMIT_BURST_PER_FORM", per_form[1])
+    return set_limits
+
+
+def test_client_over_its_burst_gets_429(limits, make_form, submit):
+    limits(per_ip=(0.01, 2))
+    form_id = make_form()
+    assert [submit(form_id).status_code for _ in range(2)] == [200, 200]
+
+    response = submit(form_id)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert "Too many submissions" in response.json()["detail"]
+
+
+def test_busy_form_gets_429(limits, make_form, submit):
+    limits(per_form=(0.01, 1))
+    busy, quiet = make_form(), make_form()
+    assert submit(busy).status_code == 200
+    assert submit(busy).status_code == 429
+    assert submit(quiet).status_code == 200
+
+
+def test_submissions_beyond_the_queue_get_503(limits, monkeypatch, make_form, submit):
+    limits()
+    form_id = make_form()
+    monkeypatch.setattr(submit_limiter, "admission", AdmissionControl(limit=0, queue_size=0))
+    response = submit(form_id)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert submit_limiter.admission.shed == 1
+
+    # Waiting longer than the queue timeout is turned away too
+    monkeypatch.setattr(submit_limiter, "admission", AdmissionControl(limit=0, queue_size=1, queue_timeout=0.05))
+    assert submit(form_id).status_code == 503
+    assert submit_limiter.admission.timed_out == 1
+
+
+def scope(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"client": (peer, 50000), "headers": headers}
+
+
+def test_client_address_is_read_through_trusted_proxies():
+    assert client_address(scope("10.0.0.2", "203.0.113.7"), PROXIES) == "203.0.113.7"
+    # Hops appended by further trusted proxies are skipped
+    assert client_address(scope("10.0.0.2", "203.0.113.7, 10.0.0.9"), PROXIES) == "203.0.113.7"
+
+
+def test_forged_forwarded_for_is_ignored():
+    # Not from a proxy: the header is the client's own claim
+    assert client_address(scope("198.51.100.4", "203.0.113.7"), PROXIES) == "198.51.100.4"
+    # A proxy appends the address it saw, so only the rightmost untrusted entry counts
+    assert client_address(scope("10.0.0.2", "1.2.3.4, 198.51.100.4"), PROXIES) == "198.51.100.4"
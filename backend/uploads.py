@@ -0,0 +1,186 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from metrics import record_upload
+
+# Upload storage configuration
+UPLOAD_DIR = "static/uploads"
+UPLOAD_TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")  # Same filesystem, so publishing is a rename
+CHUNK_SIZE = 1024 * 1024  # 1 MiB per read/write
+MAX_FILE_SIZE = int(os.getenv("MAX_UPLOAD_FILE_SIZE", 10 * 1024 * 1024))
+MAX_REQUEST_SIZE = int(os.getenv("MAX_UPLOAD_REQUEST_SIZE", 25 * 1024 * 1024))
+
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+
+
+class UploadBudget:
+    """Tracks how many upload bytes are left for a single request."""
+
+    def __init__(self, limit: int = MAX_REQUEST_SIZE):
+        self.limit = limit
+        self.used = 0
+
+    def consume(self, size: int):
+        self.used += size
+        if self.used > self.limit:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Uploads exceed the {self.limit} byte limit per request"
+            )
+
+
+def check_request_size(request: Request):
+    # Reject oversized bodies before the multipart parser spools them to disk
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request body exceeds the {MAX_REQUEST_SIZE} byte limit"
+        )
+
+
+class StagedUpload:
+    """A fully received upload sitting in the temp directory, not yet published."""
+
+    def __init__(self, temp_path: str, size: int, sha256: str, filename: str, content_type: Optional[str]):
+        self.temp_path = temp_path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+        self.content_type = content_type
+
+
+def _open_temp(path: str):
+    return open(path, "wb")
+
+
+def _write_chunk(file_object, hasher, chunk: bytes):
+    hasher.update(chunk)
+    file_object.write(chunk)
+
+
+def _finish(file_object):
+    file_object.flush()
+    os.fsync(file_object.fileno())
+    file_object.close()
+
+
+def _discard(file_object, temp_path: str):
+    file_object.close()
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+async def stage_upload(
+    upload: UploadFile,
+    budget: UploadBudget,
+    max_file_size: int = MAX_FILE_SIZE,
+    signature: Optional[bytes] = None,
+    signature_window: int = 1024
+) -> StagedUpload:
+    """Stream an upload into the temp directory without blocking the event loop.
+
+    Chunks are hashed and written in the thread pool, size limits are enforced
+    as bytes arrive, and the file is fsynced before this returns. With
+    ``signature``, the upload is rejected as soon as its first
+    ``signature_window`` bytes are in and don't contain it. The caller
+    publishes it with ``publish_upload`` or drops it with ``discard_uploads``.
+    """
+    started = time.perf_counter()
+    temp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+    file_object = await run_in_threadpool(_open_temp, temp_path)
+    hasher = hashlib.sha256()
+    written = 0
+    header = b""
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if signature is not None and len(header) < signature_window:
+                header += chunk[:signature_window - len(header)]
+                if (not chunk or len(header) >= signature_window) and signature not in header:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"File {upload.filename} does not have the expected file type"
+                    )
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_file_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File {upload.filename} exceeds the {max_file_size} byte limit"
+                )
+            budget.consume(len(chunk))
+            await run_in_threadpool(_write_chunk, file_object, hasher, chunk)
+        await run_in_threadpool(_finish, file_object)
+    except BaseException:
+        await run_in_threadpool(_discard, file_object, temp_path)
+        raise
+    record_upload(written, time.perf_counter() - started)
+    return StagedUpload(temp_path, written, hasher.hexdigest(), upload.filename, upload.content_type)
+
+
+def _sync_directory(directory: str):
+    # Makes a rename durable; not possible (nor needed) on Windows
+    if os.name != "posix":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _publish(temp_path: str, destination: str):
+    try:
+        # Same content is already stored; touching it tells unlink_blobs it is in use again
+        os.utime(destination)
+        os.remove(temp_path)
+        return
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(temp_path, destination)
+    _sync_directory(os.path.dirname(destination))
+
+
+async def publish_upload(staged: StagedUpload, destination: str):
+    """Atomically move a staged upload to ``destination`` unless that file already exists.
+
+    Call it before committing the rows that reference the file: a crash
+    after the commit then never loses it. Files of a transaction that
+    fails are left for ``reconcile`` to collect.
+    """
+    await run_in_threadpool(_publish, staged.temp_path, destination)
+
+
+async def discard_uploads(staged_uploads):
+    await remove_files([staged.temp_path for staged in staged_uploads])
+
+
+async def remove_files(paths):
+    def _remove():
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    await run_in_threadpool(_remove)
+
+
+def is_upload_path(value) -> bool:
+    # Only paths inside UPLOAD_DIR count, so arbitrary answers are never served as files
+    if not isinstance(value, str) or not value:
+        return False
+    upload_root = os.path.realpath(UPLOAD_DIR)
+    return os.path.realpath(value).startswith(upload_root + os.sep)
+
+
+def field_upload_paths(value) -> List[str]:
+    values = value if isinstance(value, list) else [value]
+    return [item for item in values if is_upload_path(item)]
+
@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+
+from models import FieldType, Form
+from registry import field_type_registry
+
+FORM_VALIDATOR_CACHE_SIZE = int(os.getenv("FORM_VALIDATOR_CACHE_SIZE", 1024))
+
+TEXT_MAX_LENGTH = 1000
+LARGE_TEXT_MAX_LENGTH = 20000
+EMAIL_MAX_LENGTH = 254
+# PDF readers accept the header anywhere in the first KiB, see stage_upload
+PDF_SIGNATURE = b"%PDF-"
+
+_EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s.]+(\.[^@\s.]+)+")
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == []
+
+
+def _text_check(max_length: int) -> Callable[[object], Optional[str]]:
+    def check(value):
+        if not isinstance(value, str):
+            return "must be text"
+        if len(value) > max_length:
+            return f"must be at most {max_length} characters"
+        return None
+    return check
+
+
+def _email_check(value) -> Optional[str]:
+    if not isinstance(value, str) or len(value) > EMAIL_MAX_LENGTH or not _EMAIL_PATTERN.fullmatch(value):
+        return "must be a valid email address"
+    return None
+
+
+def _options_check(options) -> Callable[[object], Optional[str]]:
+    allowed = frozenset(options or [])
+
+    def check(value):
+        if not isinstance(value, str) or value not in allowed:
+            return "must be one of the form's options"
+        return None
+    return check
+
+
+def _file_check(value) -> Optional[str]:
+    # Files arrive as uploads; the JSON part may only leave the answer empty
+    return "must be uploaded as a file"
+
+
+# Value checks per field type name, as seeded by create_default_field_types
+_CHECKS = {
+    "Text": lambda field: _text_check(TEXT_MAX_LENGTH),
+    "LargeText": lambda field: _text_check(LARGE_TEXT_MAX_LENGTH),
+    "Email": lambda field: _email_check,
+    "Select": lambda field: _options_check(field.get("options")),
+    "PDF": lambda field: _file_check,
+}
+# Upload signatures per file field type name
+_SIGNATURES = {
+    "PDF": PDF_SIGNATURE,
+}
+
+
+class FormValidator:
+    """A form's field_config compiled into per-field checks.
+
+    Compiling resolves field types and builds the checks once, so validating a
+    submission is a single pass over the answers with no lookups or parsing.
+    """
+
+    def __init__(self, field_config, field_types):
+        self.fields: Dict[str, tuple] = {}
+        self.required: List[tuple] = []
+        self.file_fields: Dict[str, Optional[bytes]] = {}
+        self.option_fields: List[str] = []
+        for field in field_config or []:
+            field_id = field["field_id"]
+            label = field.get("label") or field_id
+            field_type = field_types.get(field["field_type_id"])
+            name = field_type.name if field_type else None
+            if name in _CHECKS:
+                check = _CHECKS[name](field)
+            elif field_type is not None and field_type.has_options:
+                check = _options_check(field.get("options"))
+            else:
+                check = _text_check(LARGE_TEXT_MAX_LENGTH)
+            if name == "Select" or (field_type is not None and field_type.has_options):
+                self.option_fields.append(field_id)
+            if name in _SIGNATURES:
+                self.file_fields[field_id] = _SIGNATURES[name]
+            self.fields[field_id] = (label, check)
+            if field.get("required"):
+                self.required.append((field_id, label))
+
+    def validate(self, form_data, uploaded_fields=()) -> List[str]:
+        """Return every problem with a submission's answers and uploaded file fields."""
+        if not isinstance(form_data, dict):
+            return ["Form data must be a JSON object"]
+        errors = []
+        fields = self.fields
+        for field_id, value in form_data.items():
+            entry = fields.get(field_id)
+            if entry is None:
+                errors.append(f"Unknown field: {field_id}")
+            elif not _is_empty(value):
+                message = entry[1](value)
+                if message:
+                    errors.append(f"Field '{entry[0]}' {message}")
+        for field_id, label in self.required:
+            if field_id in self.file_fields:
+                if field_id not in uploaded_fields:
+                    errors.append(f"Field '{label}' requires a file")
+            elif _is_empty(form_data.get(field_id)):
+                errors.append(f"Field '{label}' is required")
+        return errors
+
+    def signature(self, field_id: str) -> Optional[bytes]:
+        return self.file_fields.get(field_id)
+
+
+class FormValidatorCache:
+    """LRU of compiled validators keyed by form id."""
+
+    def __init__(self, maxsize: int = FORM_VALIDATOR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._validators: "OrderedDict[int, FormValidator]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, form: Form) -> FormValidator:
+        with self._lock:
+            validator = self._validators.get(form.id)
+            if validator is not None:
+                self._validators.move_to_end(form.id)
+                return validator
+        validator = FormValidator(form.field_config, field_type_registry.by_id)
+        with self._lock:
+            self._validators[form.id] = validator
+            while len(self._validators) > self.maxsize:
+                self._validators.popitem(last=False)
+        return validator
+
+    def invalidate(self, form_id: int):
+        with self._lock:
+            self._validators.pop(form_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._validators.clear()
+
+
+form_validators = FormValidatorCache()
+
+
+@event.listens_for(Form, "after_update")
+@event.listens_for(Form, "after_delete")
+def _invalidate_form(mapper, connection, target):
+    form_validators.invalidate(target.id)
+
+
+@event.listens_for(FieldType, "after_insert")
+@event.listens_for(FieldType, "after_update")
+@event.listens_for(FieldType, "after_delete")
+def _invalidate_all(mapper, connection, target):
+    form_validators.clear()
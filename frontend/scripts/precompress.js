@@ -0,0 +1,43 @@
+// Writes .br and .gz siblings of the built assets, which the backend sends as-is
+// to clients accepting them (see PrecompressedStaticFiles in backend/compression.py).
+// Runs after `vite build`; usage: node scripts/precompress.js [dist directory]
+import { readdir, readFile, writeFile } from "node:fs/promises";
+import path from "node:path";
+import { brotliCompressSync, constants, gzipSync } from "node:zlib";
+
+const DIST_DIR = path.resolve(process.argv[2] ?? "dist");
+const COMPRESSIBLE = /\.(html|js|mjs|css|json|map|svg|txt|xml|ico|webmanifest|wasm)$/;
+// Smaller files already fit in a packet or two
+const MIN_SIZE = 1024;
+
+async function* walk(directory) {
+  for (const entry of await readdir(directory, { withFileTypes: true })) {
+    const entryPath = path.join(directory, entry.name);
+    if (entry.isDirectory()) yield* walk(entryPath);
+    else if (entry.isFile()) yield entryPath;
+  }
+}
+
+let files = 0;
+let originalBytes = 0;
+let brotliBytes = 0;
+for await (const file of walk(DIST_DIR)) {
+  if (!COMPRESSIBLE.test(file)) continue;
+  const data = await readFile(file);
+  if (data.length < MIN_SIZE) continue;
+  // Built once, served many times: use the slowest, smallest settings
+  const brotli = brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  });
+  const gzip = gzipSync(data, { level: 9 });
+  // Keep only variants that are actually smaller
+  if (brotli.length < data.length) await writeFile(`${file}.br`, brotli);
+  if (gzip.length < data.length) await writeFile(`${file}.gz`, gzip);
+  files += 1;
+  originalBytes += data.length;
+  brotliBytes += Math.min(brotli.length, data.length);
+}
+console.log(`precompressed ${files} files: ${originalBytes} bytes, ${brotliBytes} with brotli`);
@@ -111,13 +111,7 @@ export function ApplicationDetailsDialog({
                     {field?.field_type_id === 5 ? (
                       <Button
                         variant="outline"
-                        onClick={() => {
-                          const baseUrl = "http://localhost:8000"; // Replace with your backend base URL
-                          const fileUrl = `${baseUrl}/${value as string}`; // Combine base URL with the file path (value)
-                          console.log(fileUrl);
-
-                          window.open(fileUrl, "_blank"); // Open the file in a new tab
-                        }}
+                        onClick={() => handleDownloadFile(key)}
                       >
                         <ExternalLink className="w-4 h-4 mr-2" />
                         Open PDF File
@@ -9,7 +9,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/com
 import { Label } from "@/components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { FormBuilder } from "@/components/FormBuilder";
-import { api, FormResponse, ApplicationResponse, FormCreate } from "@/services/api";
+import { api, FormResponse, ApplicationResponse, ApplicationEvent, FormCreate } from "@/services/api";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "@/contexts/AuthContext";
 import { handleApiError } from "@/services/api";
@@ -86,6 +86,39 @@ const Admin = () => {
     }
   }, [isAuthenticated, selectedFormId, forms]);
 
+  // Keep the selected form's applications current from its live event stream
+  useEffect(() => {
+    if (!isAuthenticated || selectedFormId === "all") return;
+    const formId = parseInt(selectedFormId);
+    const controller = new AbortController();
+
+    const applyEvent = async (event: ApplicationEvent) => {
+      try {
+        if (event.type === "created") {
+          // Only the new applications are fetched
+          const created = await api.applications.batchGet(event.ids);
+          setApplications(current => [
+            ...current,
+            ...created.filter(app => !current.some(existing => existing.id === app.id)),
+          ]);
+        } else if (event.type === "deleted") {
+          setApplications(current => current.filter(app => !event.ids.includes(app.id)));
+        } else if (event.type === "status") {
+          setApplications(current => current.map(app =>
+            event.ids.includes(app.id) ? { ...app, status: event.status } : app
+          ));
+        } else if (event.type === "reset") {
+          setApplications(await api.applications.listByForm(formId));
+        }
+      } catch (error) {
+        handleApiError(error);
+      }
+    };
+
+    api.applications.subscribe(formId, applyEvent, controller.signal);
+    return () => controller.abort();
+  }, [isAuthenticated, selectedFormId]);
+
   const handleCreateForm = async (formData: FormCreate) => {
     try {
       setIsLoading(true);
@@ -139,14 +172,31 @@ const Admin = () => {
     });
   };
 
+  const handleToggleFormClosed = async (formId: number) => {
+    const form = forms.find(form => form.id === formId);
+    if (!form) return;
+    try {
+      const updated = form.closed_at ? await api.forms.reopen(formId) : await api.forms.close(formId);
+      setForms(forms.map(form => form.id === formId ? updated : form));
+      toast({
+        title: updated.closed_at ? "Form Closed" : "Form Reopened",
+        description: updated.closed_at
+          ? "The form no longer accepts applications"
+          : "The form accepts applications again",
+      });
+    } catch (error) {
+      handleApiError(error);
+    }
+  };
+
   const handleViewApplication = (application: ApplicationResponse) => {
     setSelectedApplication(application);
     setIsDialogOpen(true);
   };
 
   const handleMarkApplication = async (applicationId: number) => {
-    // This would typically update the application status in the API
-    // For now, we'll just show a toast notification
+    const updated = await api.applications.updateStatus(applicationId, "reviewed");
+    setApplications(applications.map(app => app.id === applicationId ? { ...app, status: updated.status } : app));
     toast({
       title: "Application Marked",
       description: `Application ${applicationId} has been marked as reviewed`,
@@ -264,6 +314,15 @@ const Admin = () => {
                       Copy Form Link
                     </Button>
                   )}
+                  {selectedFormId !== "all" && (
+                    <Button
+                      variant="outline"
+                      className="mt-6"
+                      onClick={() => handleToggleFormClosed(parseInt(selectedFormId))}
+                    >
+                      {forms.find(form => form.id === parseInt(selectedFormId))?.closed_at ? "Reopen Form" : "Close Form"}
+                    </Button>
+                  )}
                 </div>
 
                 {isLoading ? (
@@ -7,6 +7,7 @@ import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Textarea } from "@/components/ui/textarea";
 import { Checkbox } from "@/components/ui/checkbox";
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { useToast } from "@/hooks/use-toast";
 import { api, FormResponse, FormField } from "@/services/api";
 import { handleApiError } from "@/services/api";
@@ -80,7 +81,7 @@ const ApplicationForm = () => {
       case 1: return 'text';
       case 2: return 'textarea';
       case 3: return 'email';
-      case 4: return 'checkbox';
+      case 4: return 'select';
       case 5: return 'file';
       default: return 'text';
     }
@@ -241,6 +242,26 @@ const ApplicationForm = () => {
           />
         );
       
+      case 'select':
+        return (
+          <Select
+            value={formValues[field.field_id] || undefined}
+            onValueChange={(value) => handleInputChange(field.field_id, value)}
+            required={field.required}
+          >
+            <SelectTrigger id={`field-${field.field_id}`}>
+              <SelectValue placeholder="Select an option" />
+            </SelectTrigger>
+            <SelectContent>
+              {(field.options || []).map((option) => (
+                <SelectItem key={option} value={option}>
+                  {option}
+                </SelectItem>
+              ))}
+            </SelectContent>
+          </Select>
+        );
+      
       case 'checkbox':
         return (
           <div className="flex items-center space-x-2">
@@ -323,6 +344,11 @@ const ApplicationForm = () => {
             )}
           </CardHeader>
           <CardContent>
+            {form.closed_at ? (
+              <p className="text-center text-muted-foreground">
+                This form is no longer accepting applications.
+              </p>
+            ) : (
             <form onSubmit={handleSubmit} className="space-y-6">
               {formFields.map(field => (
                 <div key={field.field_id} className="space-y-2">
@@ -343,6 +369,7 @@ const ApplicationForm = () => {
                 {isSubmitting ? "Submitting..." : "Submit Application"}
               </Button>
             </form>
+            )}
           </CardContent>
           <CardFooter className="flex justify-center border-t pt-6">
             <p className="text-sm text-muted-foreground">
@@ -42,6 +42,7 @@ export interface FormResponse {
   field_config: FormField[];
   creator_id: number;
   created_at: string;
+  closed_at: string | null;
 }
 
 export interface FieldType {
@@ -57,7 +58,14 @@ export interface ApplicationResponse {
   form_id: number;
   form_data: Record<string, any>;
   created_at: string;
-  status?: string; // Added for UI display purposes
+  status?: string; // pending | reviewed | accepted | rejected
+}
+
+// Change to a form's applications, from its live event stream
+export interface ApplicationEvent {
+  type: "created" | "deleted" | "status" | "reset"; // reset: reload the whole list
+  ids: number[];
+  status?: string;
 }
 
 export interface ApplicationSubmit {
@@ -141,6 +149,28 @@ export const api = {
       return handleResponse(response);
     },
 
+    async close(formId: number): Promise<FormResponse> {
+      const response = await fetch(`${API_BASE_URL}/forms/${formId}/close`, {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${getToken()}`,
+        },
+      });
+      
+      return handleResponse(response);
+    },
+
+    async reopen(formId: number): Promise<FormResponse> {
+      const response = await fetch(`${API_BASE_URL}/forms/${formId}/reopen`, {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${getToken()}`,
+        },
+      });
+      
+      return handleResponse(response);
+    },
+
     async delete(formId: number): Promise<void> {
       const response = await fetch(`${API_BASE_URL}/forms/${formId}`, {
         method: "DELETE",
@@ -191,6 +221,70 @@ export const api = {
       return handleResponse(response);
     },
 
+    async batchGet(ids: number[]): Promise<ApplicationResponse[]> {
+      const response = await fetch(`${API_BASE_URL}/applications/batch/get`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${getToken()}`,
+        },
+        body: JSON.stringify({ ids }),
+      });
+      
+      return handleResponse(response);
+    },
+
+    // Follows a form's changes (Server-Sent Events) until `signal` aborts. After a
+    // disconnect it reconnects with Last-Event-ID, so missed events are replayed.
+    // Uses fetch because EventSource cannot send the Authorization header.
+    async subscribe(
+      formId: number,
+      onEvent: (event: ApplicationEvent) => void,
+      signal: AbortSignal
+    ): Promise<void> {
+      let lastEventId = "";
+      let retryMs = 3000;
+      while (!signal.aborted) {
+        try {
+          const headers: Record<string, string> = { Authorization: `Bearer ${getToken()}` };
+          if (lastEventId) headers["Last-Event-ID"] = lastEventId;
+          const response = await fetch(`${API_BASE_URL}/applications/form/${formId}/events`, { headers, signal });
+          if (response.status === 401 || response.status === 404) return;
+          if (!response.ok || !response.body) throw new Error(`Event stream failed with ${response.status}`);
+          
+          const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+          let buffer = "";
+          for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            let end: number;
+            while ((end = buffer.indexOf("\n\n")) >= 0) {
+              const block = buffer.slice(0, end);
+              buffer = buffer.slice(end + 2);
+              let type = "";
+              let data = "";
+              for (const line of block.split("\n")) {
+                const colon = line.indexOf(":");
+                if (colon === 0) continue; // Keep-alive comment
+                const field = colon < 0 ? line : line.slice(0, colon);
+                const fieldValue = colon < 0 ? "" : line.slice(colon + 1).replace(/^ /, "");
+                if (field === "id") lastEventId = fieldValue;
+                else if (field === "event") type = fieldValue;
+                else if (field === "data") data = data ? `${data}\n${fieldValue}` : fieldValue;
+                else if (field === "retry") retryMs = Number(fieldValue) || retryMs;
+              }
+              if (type && data) onEvent({ ...JSON.parse(data), type } as ApplicationEvent);
+            }
+          }
+        } catch (error) {
+          if (signal.aborted) return;
+          console.warn("Application events:", error);
+        }
+        await new Promise(resolve => setTimeout(resolve, retryMs));
+      }
+    },
+
     async get(applicationId: number): Promise<ApplicationResponse> {
       const response = await fetch(`${API_BASE_URL}/applications/${applicationId}`, {
         headers: {
@@ -212,6 +306,19 @@ export const api = {
       return handleResponse(response);
     },
 
+    async updateStatus(applicationId: number, status: string): Promise<ApplicationResponse> {
+      const response = await fetch(`${API_BASE_URL}/applications/${applicationId}`, {
+        method: "PATCH",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${getToken()}`,
+        },
+        body: JSON.stringify({ status }),
+      });
+      
+      return handleResponse(response);
+    },
+
     async submit(formId: number, applicationData: ApplicationSubmit): Promise<ApplicationResponse> {
       const formData = new FormData();
       formData.append("form_data", applicationData.form_data);